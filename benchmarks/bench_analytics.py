@@ -0,0 +1,92 @@
+"""
+Analytics benchmark.
+
+Writes synthetic grading results (CSV files, one per user, or the results
+database) and times analytics.load_results and each statistic, to check
+that millions of rows are summarized in seconds.
+
+Run (from the repository root):
+    python benchmarks/bench_analytics.py
+    python benchmarks/bench_analytics.py --rows 5000000 --users 20 \\
+        --backend sqlite --json analytics.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'pathogradinggui'))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+import analytics  # noqa: E402
+from results_store import HEADERS, ResultsDatabase  # noqa: E402
+
+
+def write_results(folder, rows, users, slides, backend):
+    """Write synthetic results in the layout of the given backend."""
+    rng = np.random.default_rng(0)
+    start = pd.Timestamp('2024-01-01 08:00:00').value // 10 ** 9
+    frame = pd.DataFrame({
+        HEADERS[0]: pd.to_datetime(start + np.sort(rng.integers(0, 90 * 86400, rows)),
+                                   unit='s').strftime(analytics.DATETIME_FORMAT),
+        HEADERS[1]: np.array(['user_%02d' % k for k in range(users)])[
+            rng.integers(0, users, rows)],
+        HEADERS[2]: np.array(['S%05d_A.tif' % k for k in range(slides)])[
+            rng.integers(0, slides, rows)],
+        HEADERS[3]: rng.integers(3, 6, rows).astype(str),
+        HEADERS[4]: rng.integers(3, 6, rows).astype(str),
+        HEADERS[5]: np.round(rng.uniform(0, 1e5, rows), 3).astype(str),
+        HEADERS[6]: np.round(rng.uniform(0, 1e5, rows), 3).astype(str),
+        HEADERS[7]: '',
+    })
+    if backend == 'sqlite':
+        results_db = ResultsDatabase(os.path.join(folder, 'results_database.db'))
+        results_db.write_rows(frame.itertuples(index=False, name=None))
+        results_db.close_connection()
+    else:
+        for user, part in frame.groupby(HEADERS[1]):
+            part.to_csv(os.path.join(folder, 'Grading_result_%s.csv' % user),
+                        index=False)
+
+
+def timed(function, *args):
+    """Return (result, seconds) of one call."""
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--slides', type=int, default=20000)
+    parser.add_argument('--backend', choices=['csv', 'sqlite'], default='csv')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        write_results(folder, args.rows, args.users, args.slides, args.backend)
+        frame, load_seconds = timed(analytics.load_results, folder, args.backend)
+        results = {'rows': len(frame), 'backend': args.backend,
+                   'load_s': load_seconds}
+        for name in ('grade_distribution', 'gleason_sums', 'throughput',
+                     'pairwise_kappa', 'fleiss_kappa'):
+            _, results[name + '_s'] = timed(getattr(analytics, name), frame)
+
+    for name, value in results.items():
+        print('%-22s %s' % (name, '%.3f' % value if isinstance(value, float)
+                            else value))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+Bundle launch benchmark.
+
+Builds the PyInstaller bundle variants of packaging/pathogui.spec and
+compares, from the launch of the executable (with PATHOGUI_STARTUP_PROBE
+set, so it exits once the login dialog is up):
+- login_dialog_ms: until the login dialog is shown,
+- preload_done_ms: until the main window modules are imported in the
+  background,
+each for the first launch of a user (empty cache and config folders, so
+matplotlib has no font list yet) and for the following launches (median
+of --repeat runs), together with the size of the bundle.
+
+Variants:
+    script          python pathogradinggui/user_auth.py, for reference
+    onefile         single executable (PATHOGUI_BUNDLE=onefile PATHOGUI_PRUNE=0)
+    onedir          onedir layout, everything collected (PATHOGUI_PRUNE=0)
+    onedir-pruned   the default build of the spec
+
+Builds are kept in --build-dir and reused; pass --rebuild after changing
+the code or the spec. Building needs PyInstaller (pip install pyinstaller)
+and takes about a minute per variant.
+
+Run (from the repository root):
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_bundle.py
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_bundle.py --variants onedir onedir-pruned --repeat 10 --json bundle.json
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from bench_startup import launch, milestones
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SPEC = os.path.join(ROOT, 'packaging', 'pathogui.spec')
+
+# Build environment of each bundle variant
+VARIANTS = {
+    'onefile': {'PATHOGUI_BUNDLE': 'onefile', 'PATHOGUI_PRUNE': '0'},
+    'onedir': {'PATHOGUI_PRUNE': '0'},
+    'onedir-pruned': {},
+}
+
+
+def folder_size(path):
+    """Return the size in bytes of a file or of the files of a folder."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(folder, name))
+               for folder, _, names in os.walk(path) for name in names
+               if not os.path.islink(os.path.join(folder, name)))
+
+
+def build(variant, build_dir, rebuild=False):
+    """
+    Build a bundle variant (unless already built); return (command to
+    launch it, path of the bundle).
+    """
+    dist = os.path.join(build_dir, 'dist', variant)
+    if variant == 'onefile':
+        bundle = executable = os.path.join(dist, 'PathoGUI')
+    else:
+        bundle = os.path.join(dist, 'PathoGUI')
+        executable = os.path.join(bundle, 'PathoGUI')
+    if rebuild or not os.path.exists(executable):
+        shutil.rmtree(dist, ignore_errors=True)
+        env = {name: value for name, value in os.environ.items()
+               if not name.startswith('PATHOGUI_')}
+        env.update(VARIANTS[variant])
+        print('building %s ...' % variant, flush=True)
+        subprocess.run([sys.executable, '-m', 'PyInstaller', '--noconfirm',
+                        '--log-level', 'WARN', '--distpath', dist,
+                        '--workpath', os.path.join(build_dir, 'work', variant),
+                        SPEC], env=env, check=True)
+    return [executable], bundle
+
+
+def measure(command, cwd, repeat):
+    """
+    Launch command once with fresh user folders, then repeat times with
+    the same ones; return the milestones of the first and following runs.
+    """
+    with tempfile.TemporaryDirectory() as home:
+        env = {name: value for name, value in os.environ.items()
+               if not name.startswith(('PATHOGUI_', 'MPL', 'XDG_'))}
+        env.update(HOME=home, XDG_CACHE_HOME=os.path.join(home, '.cache'),
+                   XDG_CONFIG_HOME=os.path.join(home, '.config'),
+                   PATHOGUI_STARTUP_PROBE='1',
+                   PATHOGUI_CONFIG=os.path.join(home, 'no_settings.json'))
+        env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        first = milestones(*launch(command, env, cwd)[:2])
+        runs = [milestones(*launch(command, env, cwd)[:2]) for _ in range(repeat)]
+    results = {}
+    for name in ('login_dialog_shown', 'preload_done'):
+        key = name.replace('_shown', '')
+        results['first_%s_ms' % key] = first[name]
+        results['%s_ms' % key] = statistics.median(run[name] for run in runs)
+    return results
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--variants', nargs='+', default=['script'] + list(VARIANTS),
+                        choices=['script'] + list(VARIANTS))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--build-dir', default=os.path.join(ROOT, 'build', 'bench_bundle'),
+                        help='where the bundles are built (default: build/bench_bundle)')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='build the bundles again')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    results = {}
+    for variant in args.variants:
+        if variant == 'script':
+            command = [sys.executable, 'user_auth.py']
+            cwd = os.path.join(ROOT, 'pathogradinggui')
+            size = None
+        else:
+            command, bundle = build(variant, os.path.abspath(args.build_dir),
+                                    args.rebuild)
+            cwd = os.path.dirname(command[0])
+            size = folder_size(bundle) / 2 ** 20
+        results[variant] = dict(measure(command, cwd, args.repeat), size_mb=size)
+
+    columns = ('size_mb', 'first_login_dialog_ms', 'login_dialog_ms',
+               'first_preload_done_ms', 'preload_done_ms')
+    print('%-14s' % 'variant' + ''.join('%24s' % column for column in columns))
+    for variant, values in results.items():
+        print('%-14s' % variant + ''.join(
+            '%24s' % ('-' if values[column] is None else '%.1f' % values[column])
+            for column in columns))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
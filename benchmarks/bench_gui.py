@@ -0,0 +1,336 @@
+"""
+GUI latency benchmark.
+
+Runs the real MainWindow offscreen against synthetic slides and reports
+the p50/p95/p99 latency (in ms) of what a grader waits for:
+- load_image: jumping to another slide (as from the thumbnail strip),
+- next_image: pressing Next after looking at a slide for a while (the
+  neighbouring slides have been prefetched),
+- pan_zoom: showing a new viewport, panning and zooming from the whole
+  slide down to 32x, up to the repaint of the viewer,
+- save_coords: pressing Save (the GUI thread's share; save_flushed also
+  waits until the row is written).
+Every timed action is followed by the event processing and repaint it
+triggers. open_window is the first, cold, open of the GUI.
+
+The slides are uncompressed TIFFs written band by band (BigTIFF above
+4 GB), so sizes from 1k x 1k up to 50k x 50k pixels need no more memory
+than one band: uint8 and uint16 slides are RGB, float32 ones grayscale.
+Each size and dtype runs in a fresh interpreter with its own Data,
+Results and cache folders, so nothing outside the temporary folder is
+touched. The slides of a run are hard links of one file.
+
+Results are written as JSON with the commit they were measured at;
+--compare prints the change of every percentile against an earlier
+file, to spot regressions between commits.
+
+Run (from the repository root):
+    python benchmarks/bench_gui.py
+    python benchmarks/bench_gui.py --sizes 1k 10k 50k --dtypes uint8 --json gui.json
+    python benchmarks/bench_gui.py --viewer qt --compare gui.json
+"""
+
+import os
+import sys
+import json
+import time
+import struct
+import argparse
+import platform
+import tempfile
+import subprocess
+
+import numpy as np
+
+PATHOGRADINGGUI = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               '..', 'pathogradinggui')
+sys.path.insert(0, PATHOGRADINGGUI)
+
+# dtype -> (samples per pixel, photometric, TIFF SampleFormat)
+DTYPES = {'uint8': (3, 2, 1), 'uint16': (3, 2, 1), 'float32': (1, 1, 3)}
+METRICS = ('load_image', 'next_image', 'pan_zoom', 'save_coords', 'save_flushed')
+BAND_BYTES = 16 * 2**20
+
+
+def parse_size(text):
+    """Parse a slide side like '4096', '4k' or '50k'."""
+    text = text.lower()
+    if text.endswith('k'):
+        return int(float(text[:-1]) * 1024)
+    return int(text)
+
+
+def pattern(rows, columns, dtype):
+    """Synthetic tissue-like pixels: blocks of texture over a gradient."""
+    y = rows[:, None]
+    x = columns[None, :]
+    value = ((x // 7) ^ (y // 5)) % 64 + (x + y) * 191 // (2 * max(columns[-1], 1) + 1)
+    value = value.astype(np.float32) / 255.0
+    samples = DTYPES[dtype][0]
+    if samples == 3:
+        value = np.stack([value, value[:, ::-1], 1.0 - value], axis=2)
+    if dtype == 'float32':
+        return value.astype(np.float32)
+    return (value * np.iinfo(dtype).max).astype(dtype)
+
+
+def write_synthetic_tiff(path, size, dtype, big=None):
+    """
+    Write a size x size uncompressed, striped TIFF of the given dtype one
+    band of rows at a time, as a BigTIFF if big (by default when it would
+    not fit a classic TIFF).
+    """
+    samples, photometric, sample_format = DTYPES[dtype]
+    itemsize = np.dtype(dtype).itemsize
+    row_bytes = size * samples * itemsize
+    rows_per_strip = max(1, min(size, BAND_BYTES // row_bytes))
+    if big is None:
+        big = row_bytes * size + 2**20 >= 2**32
+    offset_type = 16 if big else 4
+    header = 16 if big else 8
+    counts = [min(rows_per_strip, size - start) * row_bytes
+              for start in range(0, size, rows_per_strip)]
+    offsets = list(np.cumsum([header] + counts[:-1]))
+    entries = [(256, 4, [size]), (257, 4, [size]),
+               (258, 3, [8 * itemsize] * samples), (259, 3, [1]),
+               (262, 3, [photometric]), (273, offset_type, offsets),
+               (277, 3, [samples]), (278, 4, [rows_per_strip]),
+               (279, offset_type, counts), (284, 3, [1]),
+               (339, 3, [sample_format] * samples)]
+    formats = {3: 'H', 4: 'I', 16: 'Q'}
+    inline = 8 if big else 4
+    ifd_offset = header + sum(counts)
+    entry_size = 20 if big else 12
+    count_size = 8 if big else 2
+    extra = ifd_offset + count_size + entry_size * len(entries) + inline
+    ifd, out_of_line = b'', b''
+    for tag, field_type, values in entries:
+        data = struct.pack('<%d%s' % (len(values), formats[field_type]), *values)
+        if len(data) <= inline:
+            value = data.ljust(inline, b'\0')
+        else:
+            value = struct.pack('<' + ('Q' if big else 'I'), extra + len(out_of_line))
+            out_of_line += data
+        ifd += struct.pack('<HHQ' if big else '<HHI', tag, field_type, len(values)) + value
+    with open(path, 'wb') as file:
+        if big:
+            file.write(b'II' + struct.pack('<HHHQ', 43, 8, 0, ifd_offset))
+        else:
+            file.write(b'II' + struct.pack('<HI', 42, ifd_offset))
+        columns = np.arange(size)
+        for start in range(0, size, rows_per_strip):
+            rows = np.arange(start, min(start + rows_per_strip, size))
+            file.write(pattern(rows, columns, dtype).tobytes())
+        file.write(struct.pack('<Q' if big else '<H', len(entries)))
+        file.write(ifd + b'\0' * inline + out_of_line)
+
+
+def percentiles(samples):
+    """Return the p50/p95/p99, mean and count of latencies in ms."""
+    if not samples:
+        return None
+    values = np.asarray(samples)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50': float(p50), 'p95': float(p95), 'p99': float(p99),
+            'mean': float(values.mean()), 'n': len(samples)}
+
+
+def run_worker(args):
+    """Time the GUI in this interpreter; returns the results of one run."""
+    # pylint: disable=import-outside-toplevel
+    from PyQt5.QtWidgets import QApplication
+    from GUI_pyqt5 import MainWindow
+    from settings import load_settings
+
+    app = QApplication.instance() or QApplication([])
+    settings = load_settings(['--viewer', args.viewer,
+                              '--results-backend', args.backend])
+    # The GUI finds Data and Results in the parent of its working directory
+    os.chdir(os.path.join(args.worker, 'gui'))
+    rng = np.random.default_rng(0)
+    samples = {name: [] for name in METRICS}
+
+    start = time.perf_counter()
+    window = MainWindow('bench', settings)
+    window.resize(1280, 800)
+    window.show()
+    app.processEvents()
+    open_window = 1000 * (time.perf_counter() - start)
+    viewer = window.tile_view.viewport() if window.tile_view is not None \
+        else window.canvas
+    count = len(window.image_paths)
+
+    def frame(action, *action_args):
+        begin = time.perf_counter()
+        action(*action_args)
+        app.processEvents()
+        viewer.repaint()
+        return 1000 * (time.perf_counter() - begin)
+
+    def show(index):
+        window.image_index = index
+        window.load_image()
+
+    for _ in range(args.repeat):
+        window.prefetcher.wait(60)
+        index = int(rng.integers(count))
+        samples['load_image'].append(frame(show, index))
+
+    show(0)
+    for _ in range(args.repeat):
+        if window.image_index >= count - 1:
+            show(0)
+        # The grader looks at the slide while its neighbours are prefetched
+        window.prefetcher.wait(60)
+        samples['next_image'].append(frame(window.next_image))
+
+    slide = window.slide
+    for _ in range(args.repeat):
+        zoom = 2.0 ** rng.uniform(0, 5)
+        width, height = slide.width / zoom, slide.height / zoom
+        left = rng.uniform(0, slide.width - width)
+        top = rng.uniform(0, slide.height - height)
+        x_limits = (left - 0.5, left + width - 0.5)
+        y_limits = (top + height - 0.5, top - 0.5)
+        samples['pan_zoom'].append(frame(window.set_viewport, x_limits, y_limits))
+        # Pan by a quarter of the view at the same zoom
+        shift = width / 4 if left + 1.25 * width < slide.width else -width / 4
+        samples['pan_zoom'].append(frame(
+            window.set_viewport, (x_limits[0] + shift, x_limits[1] + shift), y_limits))
+
+    for number in range(args.repeat):
+        window.dropdown1.setCurrentText('3')
+        window.dropdown2.setCurrentText(str(3 + number % 3))
+        begin = time.perf_counter()
+        window.save_coords()
+        samples['save_coords'].append(1000 * (time.perf_counter() - begin))
+        window.results_writer.flush()
+        app.processEvents()
+        samples['save_flushed'].append(1000 * (time.perf_counter() - begin))
+
+    prefetch = window.prefetcher.stats()
+    window.close()
+    app.processEvents()
+    return {'open_window_ms': open_window, 'slides': count, 'prefetch': prefetch,
+            'metrics': {name: percentiles(values) for name, values in samples.items()}}
+
+
+def run_config(args, size, dtype, folder):
+    """Write the slides of one configuration and time them in a subprocess."""
+    work = os.path.join(folder, '%s_%d' % (dtype, size))
+    data = os.path.join(work, 'Data')
+    for path in (data, os.path.join(work, 'Results'), os.path.join(work, 'gui')):
+        os.makedirs(path)
+    first = os.path.join(data, 'S000_A.tif')
+    start = time.perf_counter()
+    write_synthetic_tiff(first, size, dtype)
+    write_seconds = time.perf_counter() - start
+    for number in range(1, args.slides):
+        os.link(first, os.path.join(data, 'S%03d_A.tif' % number))
+    env = dict(os.environ)
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    env['XDG_CACHE_HOME'] = os.path.join(work, 'cache')
+    env['PATHOGUI_CONFIG'] = os.path.join(work, 'no_settings.json')
+    output = os.path.join(work, 'result.json')
+    command = [sys.executable, os.path.abspath(__file__), '--worker', work,
+               '--result', output, '--repeat', str(args.repeat),
+               '--viewer', args.viewer, '--backend', args.backend]
+    process = subprocess.run(command, env=env, capture_output=True, text=True,
+                             check=False)
+    result = {'size': size, 'dtype': dtype, 'file_mb': os.path.getsize(first) / 2**20,
+              'write_s': write_seconds}
+    if process.returncode != 0 or not os.path.exists(output):
+        result['error'] = process.stderr.strip().splitlines()[-1:] or \
+            ['exit code %d' % process.returncode]
+        return result
+    with open(output, 'r', encoding='utf-8') as file:
+        result.update(json.load(file))
+    return result
+
+
+def commit():
+    """Return the commit of the working tree, if it is a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              cwd=PATHOGRADINGGUI, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_run(run):
+    """Print the percentiles of one run."""
+    print('%s %dx%d (%.0f MB)' % (run['dtype'], run['size'], run['size'],
+                                  run['file_mb']))
+    if 'error' in run:
+        print('  failed: %s' % ' '.join(run['error']))
+        return
+    print('  %-14s %9.1f' % ('open_window', run['open_window_ms']))
+    for name in METRICS:
+        stats = run['metrics'][name]
+        print('  %-14s %9.1f %9.1f %9.1f' % (name, stats['p50'], stats['p95'],
+                                             stats['p99']))
+
+
+def compare(results, baseline_path):
+    """Print the change of every percentile against an earlier results file."""
+    with open(baseline_path, 'r', encoding='utf-8') as file:
+        baseline = json.load(file)
+    old = {(run['size'], run['dtype']): run for run in baseline['runs']
+           if 'error' not in run}
+    print('\nChange against %s (commit %s):' % (baseline_path, baseline.get('commit')))
+    for run in results['runs']:
+        before = old.get((run['size'], run['dtype']))
+        if before is None or 'error' in run:
+            continue
+        for name in METRICS:
+            new_stats, old_stats = run['metrics'][name], before['metrics'][name]
+            print('  %-8s %6d %-13s' % (run['dtype'], run['size'], name) + ''.join(
+                ' %s %+6.0f%%' % (key, 100 * (new_stats[key] / old_stats[key] - 1))
+                for key in ('p50', 'p95', 'p99') if old_stats[key] > 0))
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', nargs='+', default=['1k', '4k'],
+                        help='slide sides, e.g. 1k 10k 50k')
+    parser.add_argument('--dtypes', nargs='+', default=list(DTYPES),
+                        choices=list(DTYPES))
+    parser.add_argument('--slides', type=int, default=4,
+                        help='slides in the Data folder of each run')
+    parser.add_argument('--repeat', type=int, default=30,
+                        help='samples of each action')
+    parser.add_argument('--viewer', choices=['matplotlib', 'qt'], default='matplotlib')
+    parser.add_argument('--backend', choices=['csv', 'sqlite'], default='csv')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--compare', help='results file of an earlier commit')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_worker(args)
+        with open(args.result, 'w', encoding='utf-8') as file:
+            json.dump(result, file)
+        return
+
+    results = {'commit': commit(), 'python': platform.python_version(),
+               'platform': platform.platform(), 'viewer': args.viewer,
+               'backend': args.backend, 'repeat': args.repeat, 'runs': []}
+    print('%-16s %9s %9s %9s   (ms)' % ('', 'p50', 'p95', 'p99'))
+    with tempfile.TemporaryDirectory() as folder:
+        for size in [parse_size(text) for text in args.sizes]:
+            for dtype in args.dtypes:
+                run = run_config(args, size, dtype, folder)
+                results['runs'].append(run)
+                print_run(run)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Grading journal benchmark.
+
+Measures the time the GUI thread spends journaling one edit of the
+grading form (an append, with fsyncs batched on the journal thread),
+against an fsync after every edit, and the time to replay and compact a
+journal on startup.
+
+Run (from the repository root):
+    python benchmarks/bench_journal.py
+    python benchmarks/bench_journal.py --edits 20000 --json journal.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'pathogradinggui'))
+
+from grading_journal import GradingJournal, PRIMARY, COMMENT  # noqa: E402
+
+
+def edit(journal, step):
+    """Journal one widget change, cycling through the kinds of edits."""
+    if step % 3 == 0:
+        journal.set_viewport((step, step + 1000.0), (step + 800.0, step))
+    elif step % 3 == 1:
+        journal.set_field(PRIMARY, '345'[step % 3])
+    else:
+        journal.set_field(COMMENT, 'comment %d' % step)
+
+
+def bench(path, edits, fsync_each):
+    """Return the per-edit latencies in microseconds."""
+    journal = GradingJournal(path, compact_bytes=1 << 30)
+    journal.show_image('S001_A.tif')
+    latencies = []
+    for step in range(edits):
+        start = time.perf_counter()
+        edit(journal, step)
+        if fsync_each:
+            journal.sync()
+        latencies.append(1e6 * (time.perf_counter() - start))
+    journal.close()
+    return latencies
+
+
+def summary(latencies):
+    """Return the p50 / p99 / max of a list of latencies."""
+    ordered = sorted(latencies)
+    return {'p50_us': statistics.median(ordered),
+            'p99_us': ordered[int(0.99 * (len(ordered) - 1))],
+            'max_us': ordered[-1]}
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--edits', type=int, default=5000)
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    results = {'edits': args.edits}
+    with tempfile.TemporaryDirectory() as folder:
+        for name, fsync_each in (('batched', False), ('fsync_each', True)):
+            path = os.path.join(folder, name + '.bin')
+            results[name] = summary(bench(path, args.edits, fsync_each))
+            results[name]['journal_kb'] = os.path.getsize(path) / 1024
+        start = time.perf_counter()
+        GradingJournal(os.path.join(folder, 'batched.bin')).close()
+        results['replay_and_compact_ms'] = 1000 * (time.perf_counter() - start)
+
+    for name in ('batched', 'fsync_each'):
+        print('%-11s p50 %8.1f us  p99 %8.1f us  max %9.1f us'
+              % (name, results[name]['p50_us'], results[name]['p99_us'],
+                 results[name]['max_us']))
+    print('replay + compact of %d edits: %.1f ms'
+          % (args.edits, results['replay_and_compact_ms']))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
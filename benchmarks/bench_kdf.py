@@ -0,0 +1,75 @@
+"""
+Password hash cost benchmark.
+
+Measures the median time of one password hash, and the memory it needs,
+for each supported algorithm over a range of parameters, so the
+hash_algorithm / hash_params settings can be chosen for a target login
+latency (a few hundred ms is usual). Users whose stored hash was made
+with other parameters are upgraded on their next login.
+
+Run (from the repository root):
+    python benchmarks/bench_kdf.py
+    python benchmarks/bench_kdf.py --repeat 5 --json kdf.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'pathogradinggui'))
+
+from users.User import DEFAULT_KEY_LENGTH, derive_key, encode_params  # noqa: E402
+
+PASSWORD = 'correct horse battery staple'
+SALT = b'0123456789abcdef'
+
+CANDIDATES = [
+    ('pbkdf2_sha256', {'iterations': 100000}),
+    ('pbkdf2_sha256', {'iterations': 300000}),
+    ('pbkdf2_sha256', {'iterations': 600000}),
+    ('scrypt', {'n': 2 ** 14, 'r': 8, 'p': 1}),
+    ('scrypt', {'n': 2 ** 15, 'r': 8, 'p': 1}),
+    ('scrypt', {'n': 2 ** 16, 'r': 8, 'p': 1}),
+]
+
+
+def bench(algorithm, params, repeat):
+    """Return the measurements for one algorithm and parameter set."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        derive_key(algorithm, PASSWORD, SALT, params, DEFAULT_KEY_LENGTH)
+        times.append(time.perf_counter() - start)
+    memory = 128 * params['r'] * params['n'] if algorithm == 'scrypt' else 0
+    return {'algorithm': algorithm, 'params': encode_params(params),
+            'hash_ms': 1000 * statistics.median(times),
+            'memory_mb': memory / 2 ** 20}
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    results = []
+    print('%-14s %-22s %10s %10s' % ('algorithm', 'params', 'hash ms',
+                                     'memory MB'))
+    for algorithm, params in CANDIDATES:
+        result = bench(algorithm, params, args.repeat)
+        results.append(result)
+        print('%-14s %-22s %10.1f %10.1f'
+              % (algorithm, result['params'], result['hash_ms'],
+                 result['memory_mb']))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
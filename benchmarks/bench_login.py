@@ -0,0 +1,146 @@
+"""
+Login latency benchmark.
+
+Measures, for a range of PBKDF2 iteration counts:
+- verify: median wall time of UserDatabase.verify_user (the hash cost a
+  user waits for at every login),
+- stall_sync: the longest gap between 5 ms Qt timer ticks when the
+  verification runs on the GUI thread (how the dialog used to behave),
+- stall_async: the same gap when LoginDialog runs it on its QThreadPool
+  worker.
+
+The stall columns show whether the work factor can be raised without
+freezing the dialog.
+
+Run (from the repository root):
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_login.py
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_login.py \\
+        --iterations 100000 200000 600000 --repeat 5 --json login.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'pathogradinggui'))
+
+from PyQt5.QtCore import QTimer, QEventLoop  # noqa: E402
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+from users.User import UserDatabase  # noqa: E402
+from login_dialog import LoginDialog  # noqa: E402
+
+USERNAME = 'bench_user'
+PASSWORD = 'correct horse battery staple'
+
+
+class StallMeter:
+    """Record the longest gap between ticks of a 5 ms QTimer."""
+
+    def __init__(self):
+        self.timer = QTimer()
+        self.timer.setInterval(5)
+        self.timer.timeout.connect(self.tick)
+        self.last = None
+        self.max_gap = 0.0
+
+    def tick(self):
+        """Timer callback."""
+        now = time.perf_counter()
+        if self.last is not None:
+            self.max_gap = max(self.max_gap, now - self.last)
+        self.last = now
+
+    def start(self):
+        """Start measuring."""
+        self.last = time.perf_counter()
+        self.max_gap = 0.0
+        self.timer.start()
+
+    def stop(self):
+        """Stop measuring and return the longest gap in seconds."""
+        self.tick()
+        self.timer.stop()
+        return self.max_gap
+
+
+def run_loop(seconds):
+    """Spin the Qt event loop for a while."""
+    loop = QEventLoop()
+    QTimer.singleShot(int(seconds * 1000), loop.quit)
+    loop.exec_()
+
+
+def bench(iterations, repeat, db_dir):
+    """Return the measurements for one iteration count."""
+    user_db = UserDatabase(os.path.join(db_dir, 'bench_%d.db' % iterations),
+                           params={'iterations': iterations})
+    if not user_db._user_exists(USERNAME):  # pylint: disable=protected-access
+        user_db.add_user(USERNAME, PASSWORD)
+
+    verify = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        user_db.verify_user(USERNAME, PASSWORD)
+        verify.append(time.perf_counter() - start)
+
+    meter = StallMeter()
+    sync_stalls, async_stalls = [], []
+    for _ in range(repeat):
+        # Verification on the GUI thread
+        meter.start()
+        run_loop(0.02)
+        QTimer.singleShot(0, lambda: user_db.verify_user(USERNAME, PASSWORD))
+        run_loop(max(verify) + 0.05)
+        sync_stalls.append(meter.stop())
+
+        # Verification on the dialog's worker thread
+        dialog = LoginDialog(user_db)
+        dialog.username_input.setText(USERNAME)
+        dialog.password_input.setText(PASSWORD)
+        loop = QEventLoop()
+        dialog.accepted.connect(loop.quit)
+        meter.start()
+        dialog.authenticate_user()
+        loop.exec_()
+        async_stalls.append(meter.stop())
+        dialog.deleteLater()
+
+    user_db.close_connection()
+    return {'iterations': iterations,
+            'verify_ms': 1000 * statistics.median(verify),
+            'stall_sync_ms': 1000 * statistics.median(sync_stalls),
+            'stall_async_ms': 1000 * statistics.median(async_stalls)}
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, nargs='+',
+                        default=[50000, 100000, 200000, 400000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication([])  # noqa: F841
+    results = []
+    with tempfile.TemporaryDirectory() as db_dir:
+        print('%12s %12s %16s %16s' % ('iterations', 'verify ms',
+                                       'GUI stall (sync)', 'GUI stall (pool)'))
+        for iterations in args.iterations:
+            result = bench(iterations, args.repeat, db_dir)
+            results.append(result)
+            print('%12d %12.1f %16.1f %16.1f'
+                  % (iterations, result['verify_ms'], result['stall_sync_ms'],
+                     result['stall_async_ms']))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
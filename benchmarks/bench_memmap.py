@@ -0,0 +1,107 @@
+"""
+Slide memory benchmark.
+
+Compares, for a synthetic uncompressed RGB TIFF (or a slide given with
+--slide), the time and resident memory of:
+- decode: matplotlib.image.imread of the whole slide (what SlideSource
+  did for level 0 before slides were memory-mapped),
+- mapped: map_tiff plus reading one 1024x1024 viewport from the middle
+  of the slide.
+Each mode runs in a fresh interpreter so the resident set sizes do not
+mix. "file MB" is the part of the slide file resident through the
+mapping, as reported by mapped_tiff.resident_bytes (Linux only).
+
+Run (from the repository root):
+    python benchmarks/bench_memmap.py
+    python benchmarks/bench_memmap.py --size 20000 --json memmap.json
+    python benchmarks/bench_memmap.py --slide Data/S001_D1.tif
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'pathogradinggui'))
+
+VIEW = 1024
+
+
+def write_slide(path, size):
+    """Write a size x size uncompressed RGB TIFF with a gradient."""
+    import numpy as np  # pylint: disable=import-outside-toplevel
+    from PIL import Image  # pylint: disable=import-outside-toplevel
+    ramp = (np.arange(size) % 256).astype(np.uint8)
+    pixels = np.empty((size, size, 3), dtype=np.uint8)
+    pixels[:] = ramp[:, None, None]
+    Image.fromarray(pixels).save(path)
+
+
+def run_mode(mode, path):
+    """Measure one mode in this interpreter and return the results."""
+    from mapped_tiff import map_tiff, resident_bytes  # pylint: disable=import-outside-toplevel
+    import numpy as np  # pylint: disable=import-outside-toplevel
+    import matplotlib.image as mpimg  # pylint: disable=import-outside-toplevel
+
+    before = resident_bytes()
+    start = time.perf_counter()
+    if mode == 'decode':
+        pixels = mpimg.imread(path)
+        checksum = int(pixels[:1].sum())
+    else:
+        pixels = map_tiff(path)
+        if pixels is None:
+            raise ValueError('%s cannot be memory-mapped' % path)
+        row = max(pixels.shape[0] // 2 - VIEW // 2, 0)
+        column = max(pixels.shape[1] // 2 - VIEW // 2, 0)
+        checksum = int(np.asarray(pixels[row:row + VIEW,
+                                         column:column + VIEW]).sum())
+    seconds = time.perf_counter() - start
+    after = resident_bytes()
+    return {'mode': mode, 'ms': 1000 * seconds, 'checksum': checksum,
+            'rss_mb': None if after is None else (after - before) / 2 ** 20,
+            'file_mb': (resident_bytes(path) or 0) / 2 ** 20}
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--size', type=int, default=10000,
+                        help='edge length of the synthetic slide')
+    parser.add_argument('--slide', help='measure this slide instead')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--mode', choices=['decode', 'mapped'],
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.slide)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = args.slide
+        if path is None:
+            path = os.path.join(tmp_dir, 'S000_bench.tif')
+            write_slide(path, args.size)
+        results = []
+        print('%-8s %10s %14s %10s' % ('mode', 'ms', 'RSS delta MB', 'file MB'))
+        for mode in ('decode', 'mapped'):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--mode', mode,
+                 '--slide', path], check=True, capture_output=True, text=True)
+            result = json.loads(output.stdout)
+            results.append(result)
+            print('%-8s %10.1f %14.1f %10.1f'
+                  % (mode, result['ms'], result['rss_mb'] or 0,
+                     result['file_mb']))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
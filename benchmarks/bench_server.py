@@ -0,0 +1,149 @@
+"""
+Grading server benchmark.
+
+Starts a GradingServer on a loopback port over synthetic slides and
+runs 1, 2, 4, ... graders at once, each with its own GradingClient (as
+each workstation has), doing what the thin client does:
+- login: verify the password (PBKDF2 with the default work factor),
+- view: render a random viewport of a random slide for an 800x600
+  canvas (as a pan or zoom of the matplotlib viewer),
+- tile: read a random 512x512 tile (as the Qt tile viewer),
+- save: save one row of grades.
+It reports the p50/p95/p99 latency (in ms) of each and the requests per
+second all graders together got through. The pyramids are built before
+the timing starts.
+
+Run (from the repository root):
+    python benchmarks/bench_server.py
+    python benchmarks/bench_server.py --graders 1 4 16 --actions 100 --json server.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+
+from bench_gui import write_synthetic_tiff, percentiles, parse_size
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'pathogradinggui'))
+
+from grading_server import GradingServer  # noqa: E402
+from grading_client import GradingClient  # noqa: E402
+
+METRICS = ('login', 'view', 'tile', 'save')
+
+
+def grader(url, user, names, actions, seed, timings):
+    """Log in and grade like a thin client; append latencies to timings."""
+    rng = random.Random(seed)
+    client = GradingClient(url)
+    start = time.perf_counter()
+    client.verify_user(user, 'password')
+    timings['login'].append(1000 * (time.perf_counter() - start))
+    slides = {name: client.open_slide(name) for name in names}
+    for number in range(actions):
+        slide = slides[rng.choice(names)]
+        zoom = 2 ** rng.uniform(0, 5)
+        width, height = slide.width / zoom, slide.height / zoom
+        x0 = rng.uniform(0, slide.width - width)
+        y0 = rng.uniform(0, slide.height - height)
+        start = time.perf_counter()
+        slide.render_view((x0 - 0.5, x0 + width - 0.5), (y0 + height - 0.5, y0 - 0.5),
+                          800, 600)
+        timings['view'].append(1000 * (time.perf_counter() - start))
+
+        level = rng.randrange(slide.level_count)
+        rows, columns = slide.level_shapes[level][:2]
+        start = time.perf_counter()
+        slide.read_tile(level, rng.randrange(-(-columns // slide.tile_size)),
+                        rng.randrange(-(-rows // slide.tile_size)))
+        timings['tile'].append(1000 * (time.perf_counter() - start))
+
+        start = time.perf_counter()
+        client.write_rows([[time.strftime('%Y-%m-%d %H:%M:%S'), user,
+                            slide.image_path, '3', '4', '%.3f' % x0, '%.3f' % y0,
+                            'row %d' % number]])
+        timings['save'].append(1000 * (time.perf_counter() - start))
+    client.close_connection()
+
+
+def run_level(url, count, names, actions):
+    """Run count graders at once; return their latencies and throughput."""
+    timings = {metric: [] for metric in METRICS}
+    threads = [threading.Thread(target=grader,
+                                args=(url, 'grader%d' % number, names, actions,
+                                      number, timings))
+               for number in range(count)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    result = {metric: percentiles(values) for metric, values in timings.items()}
+    requests = sum(len(values) for values in timings.values())
+    result['requests_per_s'] = requests / elapsed
+    return result
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--graders', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help='numbers of graders working at once')
+    parser.add_argument('--actions', type=int, default=50,
+                        help='view/tile/save rounds per grader')
+    parser.add_argument('--slides', type=int, default=4)
+    parser.add_argument('--size', type=parse_size, default=parse_size('8k'),
+                        help='slide side in pixels (default 8k)')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--pool-size', type=int, default=4, dest='pool_size')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        os.environ['XDG_CACHE_HOME'] = os.path.join(folder, 'cache')
+        data_path = os.path.join(folder, 'Data')
+        os.makedirs(data_path)
+        first = os.path.join(data_path, 'S000_A.tif')
+        write_synthetic_tiff(first, args.size, 'uint8')
+        names = ['S%03d_A.tif' % number for number in range(args.slides)]
+        for name in names[1:]:
+            os.link(first, os.path.join(data_path, name))
+
+        server = GradingServer(data_path, os.path.join(folder, 'Results'),
+                               os.path.join(folder, 'users.db'), port=0,
+                               workers=args.workers, pool_size=args.pool_size)
+        url = server.start()
+        setup = GradingClient(url)
+        for number in range(max(args.graders)):
+            setup.add_user('grader%d' % number, 'password')
+        setup.verify_user('grader0', 'password')
+        for name in names:
+            setup.open_slide(name)
+        setup.close_connection()
+
+        for count in args.graders:
+            results[count] = run_level(url, count, names, args.actions)
+        server.stop()
+
+    print('%-8s %-6s %9s %9s %9s' % ('graders', '', 'p50', 'p95', 'p99'))
+    for count, result in results.items():
+        for metric in METRICS:
+            stats = result[metric]
+            print('%-8s %-6s %9.1f %9.1f %9.1f' % (count, metric, stats['p50'],
+                                                   stats['p95'], stats['p99']))
+        print('%-8s %-6s %9.0f requests/s' % (count, 'all', result['requests_per_s']))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
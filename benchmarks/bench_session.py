@@ -0,0 +1,85 @@
+"""
+Session resume benchmark.
+
+Fills a sessions database with the graded slides and viewports of one
+user, then times what a login and the "Next ungraded" button cost:
+resuming the last position, reading a slide's viewport, and finding the
+next ungraded slide. For comparison, it also times finding the graded
+slides by reading the user's results CSV file, which is what had to be
+done before.
+
+Run (from the repository root):
+    python benchmarks/bench_session.py
+    python benchmarks/bench_session.py --slides 100000 --json session.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'pathogradinggui'))
+
+from session_store import SessionStore, is_graded  # noqa: E402
+from results_store import CsvResultsSink  # noqa: E402
+
+
+def timed_ms(function, *args):
+    """Return (result, milliseconds) of one call."""
+    start = time.perf_counter()
+    result = function(*args)
+    return result, 1000 * (time.perf_counter() - start)
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--slides', type=int, default=10000)
+    parser.add_argument('--graded', type=float, default=0.8,
+                        help='fraction of the slides already graded')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    names = ['S%06d_A.tif' % number for number in range(args.slides)]
+    done = int(args.graded * args.slides)
+    results = {'slides': args.slides, 'graded': done}
+    with tempfile.TemporaryDirectory() as folder:
+        db_path = os.path.join(folder, 'sessions_database.db')
+        session = SessionStore(db_path)
+        rows = [['2024-01-01 10:00:00', 'alice', name, '3', '4', '1', '2', '']
+                for name in names[:done]]
+        CsvResultsSink(folder).write_rows(rows)
+        session.import_results('alice', rows)
+        for name in names[:done]:
+            session.save_viewport('alice', name, (0, 1000), (800, 0))
+        session.set_position('alice', names[done - 1], done - 1)
+        session.close_connection()
+
+        session, results['open_ms'] = timed_ms(SessionStore, db_path)
+        index, results['resume_index_ms'] = timed_ms(session.resume_index,
+                                                     'alice', names)
+        _, results['viewport_ms'] = timed_ms(session.viewport, 'alice', names[index])
+        _, results['first_next_ungraded_ms'] = timed_ms(
+            session.next_ungraded, 'alice', names, index)
+        _, results['next_ungraded_ms'] = timed_ms(
+            session.next_ungraded, 'alice', names, index)
+        session.close_connection()
+
+        sink = CsvResultsSink(folder)
+        _, results['scan_results_csv_ms'] = timed_ms(
+            lambda: {row[2] for row in sink.results_for_user('alice')
+                     if is_graded(row)})
+
+    for name, value in results.items():
+        print('%-24s %s' % (name, '%.3f' % value if isinstance(value, float)
+                            else value))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
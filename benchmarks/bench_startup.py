@@ -0,0 +1,131 @@
+"""
+Startup benchmark.
+
+Launches the user_auth.py entry point (with PATHOGUI_STARTUP_PROBE set,
+so it exits once the login dialog is up) and reports, from the launch of
+the interpreter:
+- login_dialog_ms: until the login dialog is shown,
+- preload_done_ms: until the main window modules are imported and the
+  slide catalog refreshed in the background.
+For comparison, eager_import_ms is the time to import PyQt5 and
+GUI_pyqt5 up front, which the entry point used to do before it could
+show the dialog.
+
+One more launch runs with -X importtime and lists the slowest top-level
+imports done before the dialog was shown and after it (in the
+background).
+
+The runs use a fresh cache directory (a cold slide catalog) and the
+Data folder of the repository. Like the application, they open the user
+database next to users/User.py.
+
+Run (from the repository root):
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_startup.py
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_startup.py --repeat 10 --json startup.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+PATHOGRADINGGUI = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               '..', 'pathogradinggui')
+MARKER = '-- login dialog shown --'
+
+
+def launch(command, env, cwd):
+    """Run a command; return (launch time, stdout, stderr)."""
+    start = time.time()
+    process = subprocess.run(command, env=env, cwd=cwd, capture_output=True,
+                             text=True, check=False)
+    if process.returncode != 0:
+        raise RuntimeError('%s failed:\n%s' % (' '.join(command), process.stderr))
+    return start, process.stdout, process.stderr
+
+
+def milestones(start, stdout):
+    """Return {milestone: ms since launch} from the probe's output."""
+    times = {}
+    for line in stdout.splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[0] in ('login_dialog_shown', 'preload_done'):
+            times[parts[0]] = 1000 * (float(parts[1]) - start)
+    return times
+
+
+def slowest_imports(stderr, count):
+    """
+    Return the slowest top-level imports of -X importtime output, before
+    and after the login dialog was shown, as [(module, ms)].
+    """
+    phases = {'before_dialog': [], 'background': []}
+    phase = 'before_dialog'
+    for line in stderr.splitlines():
+        if line.strip() == MARKER:
+            phase = 'background'
+            continue
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name[1:].startswith(' '):
+            phases[phase].append((name.strip(), int(cumulative) / 1000))
+    return {phase: sorted(imports, key=lambda item: -item[1])[:count]
+            for phase, imports in phases.items()}
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=8,
+                        help='slowest imports listed per phase')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        env = dict(os.environ, PATHOGUI_STARTUP_PROBE='1',
+                   PATHOGUI_CONFIG=os.path.join(folder, 'no_settings.json'))
+        env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        runs = []
+        for number in range(args.repeat):
+            env['XDG_CACHE_HOME'] = os.path.join(folder, 'cache%d' % number)
+            start, stdout, _ = launch([sys.executable, 'user_auth.py'], env,
+                                      PATHOGRADINGGUI)
+            runs.append(milestones(start, stdout))
+        for name in ('login_dialog_shown', 'preload_done'):
+            results[name.replace('_shown', '') + '_ms'] = statistics.median(
+                run[name] for run in runs)
+
+        eager = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            launch([sys.executable, '-c',
+                    'from PyQt5.QtWidgets import QApplication; import GUI_pyqt5'],
+                   env, PATHOGRADINGGUI)
+            eager.append(1000 * (time.perf_counter() - start))
+        results['eager_import_ms'] = statistics.median(eager)
+
+        env['XDG_CACHE_HOME'] = os.path.join(folder, 'importtime')
+        _, _, stderr = launch([sys.executable, '-X', 'importtime', 'user_auth.py'],
+                              env, PATHOGRADINGGUI)
+        results['imports'] = slowest_imports(stderr, args.top)
+
+    for name in ('login_dialog_ms', 'preload_done_ms', 'eager_import_ms'):
+        print('%-24s %9.1f' % (name, results[name]))
+    for phase, imports in results['imports'].items():
+        print('\nslowest imports, %s:' % phase.replace('_', ' '))
+        for module, ms in imports:
+            print('  %-30s %9.1f ms' % (module, ms))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Thumbnail strip benchmark.
+
+Times what the slide strip costs: opening it over many slides (the view
+only looks up the thumbnails it shows), making one thumbnail of an
+uncompressed and of a compressed slide, and reading a thumbnail back
+from the cache.
+
+Run (from the repository root):
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_thumbnails.py
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_thumbnails.py --slides 50000 --json thumbnails.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'pathogradinggui'))
+
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+from thumbnail_cache import ThumbnailCache, make_thumbnail  # noqa: E402
+from thumbnail_strip import (ThumbnailGenerator, ThumbnailModel,  # noqa: E402
+                             ThumbnailStrip)
+
+
+def timed_ms(function, *args, **kwargs):
+    """Return (result, milliseconds) of one call."""
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, 1000 * (time.perf_counter() - start)
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--slides', type=int, default=20000)
+    parser.add_argument('--size', type=int, default=8000,
+                        help='side of the synthetic slides in pixels')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication([])
+    results = {'slides': args.slides, 'size': args.size}
+    with tempfile.TemporaryDirectory() as folder:
+        pixels = np.random.default_rng(0).integers(
+            0, 255, (args.size, args.size, 3), dtype=np.uint8)
+        paths = {'uncompressed': os.path.join(folder, 'plain.tif'),
+                 'compressed': os.path.join(folder, 'deflate.tif')}
+        Image.fromarray(pixels).save(paths['uncompressed'])
+        Image.fromarray(pixels).save(paths['compressed'], compression='tiff_deflate')
+        del pixels
+        cache = ThumbnailCache(os.path.join(folder, 'thumbnails.db'))
+        for kind, path in paths.items():
+            (_, _, blob), results['make_%s_ms' % kind] = timed_ms(
+                make_thumbnail, path, pyramid_cache_dir=folder)
+            cache.put(path, blob)
+        _, results['cache_hit_ms'] = timed_ms(cache.get, paths['uncompressed'])
+
+        # Every name points at the same slide: each visible item is a hit
+        names = ['S%06d_A.tif' % number for number in range(args.slides)]
+        generator = ThumbnailGenerator(max_workers=1)
+        start = time.perf_counter()
+        model = ThumbnailModel(names, lambda name: paths['uncompressed'], cache,
+                               generator)
+        strip = ThumbnailStrip(model)
+        strip.resize(1200, strip.height())
+        strip.show()
+        strip.set_current(args.slides // 2)
+        app.processEvents()
+        results['open_strip_ms'] = 1000 * (time.perf_counter() - start)
+        results['thumbnails_looked_up'] = model.lookups
+        strip.close()
+        generator.shutdown()
+        cache.close_connection()
+
+    for name, value in results.items():
+        print('%-24s %s' % (name, '%.3f' % value if isinstance(value, float)
+                            else value))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+# -*- mode: python ; coding: utf-8 -*-
+"""
+PyInstaller spec of PathoGUI.
+
+Builds the login entry point (pathogradinggui/user_auth.py) as a onedir
+bundle: dist/PathoGUI/ holds the PathoGUI executable next to its
+libraries, so nothing is extracted at launch (a onefile executable
+unpacks matplotlib and Qt to a temporary folder on every start). The
+bundle folder is also where the application finds Data/ and writes
+Results/.
+
+To start faster and ship less, the default build also:
+- collects matplotlib with its Qt5Agg backend only, and leaves out
+  unused GUI toolkits, test suites and the analytics dependencies;
+- ships only the DejaVu Sans fonts of matplotlib, with a font list built
+  here for just those fonts (see pyi_rth_pathogui.py), so the first
+  start does not scan the system fonts;
+- drops matplotlib's sample data, the Qt translations and the WebGL
+  streaming platform of Qt, which pulls in QtQml and QtQuick;
+- compiles the bytecode with -O (asserts removed).
+
+Build (from the repository root):
+    pip install pyinstaller
+    pyinstaller --noconfirm packaging/pathogui.spec
+
+Variants, used by benchmarks/bench_bundle.py to compare launch times:
+    PATHOGUI_BUNDLE=onefile   single executable, as shipped before
+    PATHOGUI_PRUNE=0          everything the default hooks collect
+"""
+
+import os
+
+import matplotlib
+from matplotlib import font_manager
+
+ROOT = os.path.dirname(SPECPATH)
+APP = os.path.join(ROOT, 'pathogradinggui')
+ONEFILE = os.environ.get('PATHOGUI_BUNDLE') == 'onefile'
+PRUNE = os.environ.get('PATHOGUI_PRUNE', '1') != '0'
+
+# Not used by the GUI: other GUI toolkits, notebooks, test suites and the
+# dependencies of the command line tools (analytics, Parquet export)
+EXCLUDES = [
+    'tkinter', '_tkinter', 'PyQt6', 'PySide2', 'PySide6', 'wx', 'gi',
+    'IPython', 'jupyter_client', 'ipykernel', 'notebook',
+    'pytest', 'matplotlib.tests', 'numpy.tests', 'PIL.ImageQt',
+    'pandas', 'pyarrow', 'scipy',
+    'PyQt5.QtQml', 'PyQt5.QtQuick', 'PyQt5.QtWebEngineWidgets',
+    'PyQt5.QtMultimedia', 'PyQt5.QtBluetooth', 'PyQt5.QtSql',
+]
+
+# matplotlib data kept in the pruned build: the default font and the
+# toolbar icons
+KEEP_FONTS = ('DejaVuSans.', 'DejaVuSans-', 'DejaVuSansMono', 'LastResort', 'LICENSE')
+MPL_DATA = 'matplotlib/mpl-data/'
+
+
+def keep_data(dest):
+    """Return True for the data files the pruned build ships."""
+    dest = dest.replace(os.sep, '/')
+    if dest.startswith(MPL_DATA + 'fonts/'):
+        return os.path.basename(dest).startswith(KEEP_FONTS)
+    if dest.startswith(MPL_DATA + 'sample_data/'):
+        return False
+    return '/Qt5/translations/' not in dest
+
+
+# Qt libraries only loaded by the WebGL platform plugin (about 15 MB)
+DROP_QT_LIBS = ('libQt5Qml', 'libQt5QmlModels', 'libQt5Quick', 'libQt5WebSockets')
+
+
+def keep_binary(dest):
+    """Return True for the libraries and plugins the pruned build ships."""
+    name = os.path.basename(dest)
+    return not (name.startswith('libqwebgl') or name.split('.so')[0] in DROP_QT_LIBS)
+
+
+def build_font_cache(folder):
+    """
+    Write matplotlib's font list for the fonts the bundle ships. Fonts in
+    mpl-data are stored relative to it, so the list is valid wherever
+    the bundle is installed.
+    """
+    manager = font_manager.FontManager()
+    fonts = os.path.join(matplotlib.get_data_path(), 'fonts', 'ttf')
+    manager.ttflist = [entry for entry in manager.ttflist
+                       if os.path.dirname(entry.fname) == fonts and
+                       os.path.basename(entry.fname).startswith(KEEP_FONTS)]
+    manager.afmlist = []
+    os.makedirs(folder, exist_ok=True)
+    font_manager.json_dump(manager, os.path.join(
+        folder, 'fontlist-v%s.json' % font_manager.FontManager.__version__))
+    return folder
+
+
+# UserDatabase keeps user_database.db next to users/User.py, which is
+# bundled as bytecode: ship a file of the folder so that it exists
+datas = [(os.path.join(APP, 'users', 'create_tables.sql'), 'users')]
+runtime_hooks = []
+if PRUNE:
+    datas.append((build_font_cache(os.path.join(workpath, 'mpl_font_cache')),
+                  'mpl_font_cache'))
+    runtime_hooks.append(os.path.join(SPECPATH, 'pyi_rth_pathogui.py'))
+
+a = Analysis(
+    [os.path.join(APP, 'user_auth.py')],
+    pathex=[APP],
+    datas=datas,
+    # Imported by the background preloader and by the thumbnail workers
+    hiddenimports=['GUI_pyqt5', 'users.User', 'thumbnail_cache'],
+    hooksconfig={'matplotlib': {'backends': 'Qt5Agg'}} if PRUNE else {},
+    excludes=EXCLUDES if PRUNE else [],
+    runtime_hooks=runtime_hooks,
+    optimize=1 if PRUNE else 0,
+)
+if PRUNE:
+    # The links to the dropped libraries are listed with the data files
+    a.datas = [entry for entry in a.datas
+               if keep_data(entry[0]) and keep_binary(entry[0])]
+    a.binaries = [entry for entry in a.binaries if keep_binary(entry[0])]
+
+pyz = PYZ(a.pure)
+
+if ONEFILE:
+    exe = EXE(pyz, a.scripts, a.binaries, a.datas, [],
+              name='PathoGUI', console=False, upx=False)
+else:
+    exe = EXE(pyz, a.scripts, [], exclude_binaries=True,
+              name='PathoGUI', console=False, upx=False,
+              # Libraries next to the executable: sys._MEIPASS is the
+              # bundle folder, where Data/ and Results/ live
+              contents_directory='.')
+    coll = COLLECT(exe, a.binaries, a.datas, name='PathoGUI', upx=False)
@@ -0,0 +1,33 @@
+"""
+Runtime hook of the PathoGUI bundle, run before user_auth.py.
+
+Gives matplotlib a per-user config and cache directory and seeds it
+with the font list built with the bundle (see pathogui.spec), which only
+knows the fonts the bundle ships, so the first start does not scan the
+system fonts. Qt5Agg is the only backend in the bundle.
+"""
+
+import os
+import sys
+import shutil
+
+
+def _seed_matplotlib():
+    root = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    config = os.environ.setdefault('MPLCONFIGDIR',
+                                   os.path.join(root, 'pathogui', 'matplotlib'))
+    os.environ.setdefault('MPLBACKEND', 'Qt5Agg')
+    bundled = os.path.join(sys._MEIPASS, 'mpl_font_cache')  # pylint: disable=protected-access
+    try:
+        os.makedirs(config, exist_ok=True)
+        for name in os.listdir(bundled):
+            target = os.path.join(config, name)
+            if not os.path.exists(target):
+                shutil.copyfile(os.path.join(bundled, name), target)
+    except OSError:
+        # matplotlib falls back to building the list itself
+        pass
+
+
+_seed_matplotlib()
@@ -1,34 +1,55 @@
 """ Module providing a function creating CSV file"""
 import sys
 import os
-import csv
-import time
 import datetime
-import matplotlib.image as mpimg
 import warnings
 warnings.filterwarnings("ignore")
 
 from PyQt5.QtWidgets import (
     QMainWindow, QApplication, QWidget, QPushButton,
-    QLabel,QComboBox,
-    QHBoxLayout, QVBoxLayout, QGroupBox, QLineEdit, QFormLayout,
+    QLabel,QComboBox,QCheckBox,
+    QHBoxLayout, QVBoxLayout, QGroupBox, QLineEdit, QFormLayout, QDockWidget,
+    QAction,
     )
+from PyQt5.QtCore import Qt, QTimer
 from matplotlib.figure import Figure
-from matplotlib.backends.backend_qt5agg import (FigureCanvas,
-                                                NavigationToolbar2QT as NavigationToolbar)
-from user_auth import UserDatabase
+from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
+from users.User import UserDatabase
+from grading_client import GradingClient
 from login_dialog import LoginDialog, show_login_dialog
+from slide_source import SlideSource
+from prefetch import SlidePrefetcher, neighbour_indices
+from slide_reader import SlideReader
+from image_cache import DecodedImageCache
+from settings import load_settings
+from save_pipeline import ResultsWriter
+from results_store import ResultsDatabase, USER_COLUMN, open_results_store
+from tile_viewer import TileSlideView
+from render_controller import SlideRenderer, TimedFigureCanvas
+from annotations import Annotation, AnnotationStore, SlideAnnotations
+from annotation_overlay import AnnotationOverlay
+from slide_catalog import SlideCatalog
+from grading_journal import GradingJournal, PRIMARY, SECONDARY, COMMENT
+from session_store import SessionStore
+from thumbnail_cache import ThumbnailCache
+from thumbnail_strip import ThumbnailGenerator, ThumbnailModel, ThumbnailStrip
+import perf_log
 
 class MainWindow(QMainWindow):
     """Main window for the application."""
-    def __init__(self, current_user):
-        """Initialize the main window."""
+    def __init__(self, current_user, settings=None, client=None):
+        """
+        Initialize the main window. With a client (a logged in
+        GradingClient) it is a thin client: slides and results come from
+        the grading server.
+        """
         super().__init__()
         self.current_user = None
+        self.client = client
+        self.settings = settings if settings is not None else load_settings()
         self.setWindowTitle("PathoGUI")
 
         # Load images and initialize image index
-        image_path_list = []
         if getattr(sys, 'frozen', False):
             # If the application is run as a bundle
             self.base_path = sys._MEIPASS
@@ -36,19 +57,92 @@ class MainWindow(QMainWindow):
             # If the application is run as a script
             self.base_path = os.path.abspath("..")
 
-        data_path = os.path.join(self.base_path, 'Data')
-        for element in os.listdir(data_path):
-        #for element in os.listdir("../Data"):
-            if element.startswith("S") and element.endswith('.tif'):
-                image_path_list.append(element)
-        self.image_paths = image_path_list
-        self.image_index = 0
+        self.data_path = os.path.join(self.base_path, 'Data')
+        # Grading server error, shown in the status bar once it exists
+        self.server_error = None
+        if self.client is not None:
+            # Thin client: the slides are listed and read by the server
+            self.catalog = None
+            try:
+                self.image_paths = self.client.slide_names()
+            except (OSError, ValueError) as err:
+                self.image_paths = []
+                self.server_error = str(err)
+        else:
+            # The catalog only rescans the Data folder when it has changed
+            self.catalog = SlideCatalog()
+            self.catalog.refresh(self.data_path)
+            self.image_paths = self.catalog.names(self.data_path)
+        self.slide = None
+        self.image_name = None
+        self.x_limits = self.y_limits = None
+        # Decoded pyramid levels, bounded by bytes so memory stays flat
+        self.image_cache = DecodedImageCache(self.settings['cache_mb'] * 2**20)
+        # Decode the slides around the current one on a worker thread
+        self.prefetch_radius = self.settings['prefetch_radius']
+        self.prefetcher = SlidePrefetcher(self.prepare_slide,
+                                          max_pending=2 * self.prefetch_radius)
+        # Slides and results of a grading server are read off the GUI
+        # thread; the current slide stays shown until the next one arrives
+        self.slide_reader = SlideReader(max_workers=2)
+        self.slide_reader.ready.connect(self.on_read)
+        self.slide_reader.failed.connect(self.on_read_failed)
+        self.loading_slide = None
+        # Unsaved form of the last session, filled in once its slide is shown
+        self.restored = None
+        # Rows are written to the results store (or sent to the grading
+        # server) by a background thread
+        if self.client is not None:
+            self.results_sink = self.client
+        else:
+            self.results_sink = open_results_store(self.settings['results_backend'],
+                                                   self.base_path + os.sep + "Results")
+        self.pending_saves = 0
+        self.results_writer = ResultsWriter(self.results_sink)
+        self.results_writer.saved.connect(self.on_saved)
+        self.results_writer.failed.connect(self.on_save_failed)
+        # Every edit of the form and every queued row is journaled, so a
+        # crash before the row is written loses nothing
+        self.journal = GradingJournal(os.path.join(
+            self.base_path, "Results", ".journal_" + current_user + ".bin"))
+        # Reopen at the slide the user was on, without reading the results
+        self.session = SessionStore(os.path.join(self.base_path, "Results",
+                                                 "sessions_database.db"))
+        if not self.session.has_session(current_user):
+            # Graded flags of a user who started before sessions were kept
+            try:
+                self.session.import_results(
+                    current_user, self.results_sink.results_for_user(current_user))
+            except (OSError, ValueError) as err:
+                self.server_error = str(err)
+        self.image_index = self.session.resume_index(current_user, self.image_paths)
+        # Graded regions of every slide, loaded per slide into a grid index
+        self.annotation_store = AnnotationStore(
+            os.path.join(self.base_path, "Results", "annotations_database.db"))
+        self.annotations = None
+        # Thumbnail strip of every slide, created when first shown
+        self.thumbnail_dock = None
+        self.thumbnail_strip = None
+        self.overlay = None
         self.canvas = None
-        self.figure = Figure(figsize=(5, 4), dpi=100)
-        self.canvas = FigureCanvas(self.figure)
-        self.canvas.mpl_connect('button_release_event', self.on_zoom_completed)
-
-        self.toolbar = NavigationToolbar(self.canvas, self)
+        self.tile_view = None
+        if self.settings['viewer'] == 'qt':
+            # Native tile viewer: pan/zoom only change the view transform
+            self.tile_view = TileSlideView()
+            self.tile_view.viewport_changed.connect(self.on_viewport_changed)
+            self.tile_view.read_failed.connect(self.show_read_error)
+        else:
+            self.figure = Figure(figsize=(5, 4), dpi=100)
+            self.canvas = TimedFigureCanvas(self.figure)
+            # One Axes/AxesImage for every slide, pan/zoom redraws coalesced
+            self.renderer = SlideRenderer(self.figure, self.canvas)
+            self.renderer.viewport_changed.connect(self.on_viewport_changed)
+            self.renderer.render_failed.connect(self.show_read_error)
+            self.axes = self.renderer.axes
+            # Saved regions of the slide, drawn as one blitted collection
+            self.overlay = AnnotationOverlay(self.renderer)
+
+            self.toolbar = NavigationToolbar(self.canvas, self)
 
         ######################## UI Layout ##################################
         main_layout = QHBoxLayout()
@@ -62,6 +156,11 @@ class MainWindow(QMainWindow):
         self.user_name.setText(current_user)
         self.form_layout_0 = QFormLayout()
         self.form_layout_0.addRow("Logged in as:", self.user_name)
+        self.show_regions = QCheckBox("Show marked regions")
+        self.show_regions.setChecked(True)
+        self.show_regions.toggled.connect(self.toggle_regions)
+        self.show_regions.setEnabled(self.overlay is not None)
+        self.form_layout_0.addRow(self.show_regions)
         self.loading_label = QLabel()
 
         # Add x,y,z coordinate display
@@ -72,6 +171,7 @@ class MainWindow(QMainWindow):
         self.y_coordinate_textbox.setReadOnly(True)
         self.y_coordinate_textbox.setStyleSheet("background-color: #f0f0f0;")
         self.comment_textbox = QLineEdit()
+        self.comment_textbox.textChanged.connect(self.record_form)
         form_layout = QFormLayout()
         form_layout.addRow("x-coordinate:", self.x_coordinate_textbox)
         form_layout.addRow("y-coordinate:", self.y_coordinate_textbox)
@@ -87,6 +187,7 @@ class MainWindow(QMainWindow):
         self.dropdown1.addItem("3")
         self.dropdown1.addItem("4")
         self.dropdown1.addItem("5")
+        self.dropdown1.currentTextChanged.connect(self.record_form)
         dropdown_layout.addWidget(self.dropdown1)
         dropdown_layout.addWidget(QLabel("Secondary grade:"))
         self.dropdown2 = QComboBox()
@@ -94,6 +195,7 @@ class MainWindow(QMainWindow):
         self.dropdown2.addItem("3")
         self.dropdown2.addItem("4")
         self.dropdown2.addItem("5")
+        self.dropdown2.currentTextChanged.connect(self.record_form)
         dropdown_layout.addWidget(self.dropdown2)
         dropdown_container = QGroupBox("Grading")
         dropdown_container.setLayout(dropdown_layout)
@@ -110,17 +212,35 @@ class MainWindow(QMainWindow):
         # Clear button to clear all input
         clear_button = QPushButton("Clear all")
         clear_button.clicked.connect(self.clear_input)
+        # Button to mark the current view as a graded region
+        mark_button = QPushButton("Mark region")
+        mark_button.clicked.connect(self.mark_region)
+        # Button to jump to the next slide the user has not graded
+        ungraded_button = QPushButton("Next ungraded")
+        ungraded_button.clicked.connect(self.next_ungraded_image)
+        # Button to show the strip of slide thumbnails
+        slides_button = QPushButton("Slides")
+        slides_button.clicked.connect(self.toggle_thumbnails)
+        # Thumbnails are made from the slide files, not available to a
+        # thin client
+        slides_button.setEnabled(self.client is None)
         button_layout = QHBoxLayout()
         button_layout.addWidget(clear_button)
+        button_layout.addWidget(mark_button)
         button_layout.addWidget(previous_button)
         button_layout.addWidget(next_button)
+        button_layout.addWidget(ungraded_button)
+        button_layout.addWidget(slides_button)
         button_layout.addStretch()
         button_layout.addWidget(save_button)
 
 
         # Configure left layout and right layout and make it central
-        left_layout.addWidget(self.canvas)
-        left_layout.addWidget(self.toolbar)
+        if self.tile_view is not None:
+            left_layout.addWidget(self.tile_view)
+        else:
+            left_layout.addWidget(self.canvas)
+            left_layout.addWidget(self.toolbar)
         right_layout.addLayout(self.form_layout_0)
         right_layout.addWidget(self.loading_label)
         right_layout.addWidget(coordinates_container)
@@ -132,37 +252,79 @@ class MainWindow(QMainWindow):
         central_widget.setLayout(main_layout)
         self.setCentralWidget(central_widget)
 
-        self.cid = None
+        # Rolling averages of the timed hot paths, toggled with Ctrl+Shift+P
+        self.perf_label = QLabel()
+        self.perf_label.setVisible(False)
+        self.statusBar().addPermanentWidget(self.perf_label)
+        self.perf_timer = QTimer(self)
+        self.perf_timer.setInterval(500)
+        self.perf_timer.timeout.connect(self.update_perf_overlay)
+        self.perf_owned = False
+        perf_action = QAction("Performance overlay", self)
+        perf_action.setShortcut("Ctrl+Shift+P")
+        perf_action.setCheckable(True)
+        perf_action.toggled.connect(self.toggle_perf_overlay)
+        self.addAction(perf_action)
+        if self.settings['perf_log'] and not perf_log.enabled():
+            perf_log.enable(self.settings['perf_log'])
+
+        if self.server_error is not None:
+            self.statusBar().showMessage("Grading server: " + self.server_error)
         self.load_image()
+        self.restore_journal()
 
         ############# End of Layout ######################################
 
-    def on_zoom_completed(self, event):
-        """ Redraw figure when user zooming"""
-        if event.name == 'button_release_event':
-            self.figure.canvas.mpl_disconnect(self.cid)
-            self.cid = self.figure.canvas.mpl_connect('draw_event', self.on_draw_completed)
-
-    def on_draw_completed(self, event):
-        """ Show coordinate after user finished drawing"""
-        self.figure.canvas.mpl_disconnect(self.cid)
-        axes = self.figure.gca()
-        x_limits = self.x_limits
-        y_limits = self.y_limits
-        if axes:
-            # Don't let it pan out of bound
-            x_limits = axes.get_xlim()
-            y_limits = axes.get_ylim()
-
+    def on_viewport_changed(self, x_limits, y_limits):
+        """ Show coordinate after user panned or zoomed the slide"""
         self.x_limits = x_limits
         self.y_limits = y_limits
-
         self.x_coordinate_textbox.setText(str(format(self.x_limits[0],".3f")))
         self.y_coordinate_textbox.setText(str(format(self.y_limits[1],".3f")))
+        self.journal.set_viewport(x_limits, y_limits)
 
-        self.x_coordinate_textbox.update()
-        self.y_coordinate_textbox.update()
+    def set_viewport(self, x_limits, y_limits):
+        """ Show the given x and y limits of the current slide"""
+        if self.tile_view is not None:
+            self.tile_view.show_limits(x_limits, y_limits)
+        else:
+            self.axes.set_xlim(x_limits)
+            self.axes.set_ylim(y_limits)
+            self.renderer.render()
 
+    def record_form(self, *_args):
+        """ Journal the grading form after every edit"""
+        self.journal.set_field(PRIMARY, self.dropdown1.currentText())
+        self.journal.set_field(SECONDARY, self.dropdown2.currentText())
+        self.journal.set_field(COMMENT, self.comment_textbox.text())
+
+    def restore_journal(self):
+        """
+        Restore what the last session had not saved: its queued result rows
+        are submitted again, and the grades and view it was entering are
+        brought back.
+        """
+        state = self.journal.recovered
+        for row in self.journal.requeue_unsaved():
+            self.pending_saves += 1
+            self.results_writer.submit(row)
+        edited = (state['primary'], state['secondary'], state['comment']) != \
+            (" ", " ", "")
+        if not edited or state['image'] not in self.image_paths:
+            return
+        self.image_index = self.image_paths.index(state['image'])
+        self.restored = state
+        self.load_image()
+
+    def restore_form(self, state):
+        """ Fill in the grades and view journaled for the shown slide"""
+        self.dropdown1.setCurrentText(state['primary'])
+        self.dropdown2.setCurrentText(state['secondary'])
+        self.comment_textbox.setText(state['comment'])
+        if state['viewport'] is not None:
+            self.set_viewport(*state['viewport'])
+        self.loading_label.setText("Restored unsaved grades")
+        self.loading_label.setStyleSheet("color: green;")
 
     def show_saving(self):
         """ Show status when user click save button"""
@@ -181,7 +343,8 @@ class MainWindow(QMainWindow):
         """
         This function..
         - retrieves all the values to be saved
-        - write it into a .csv file when "Save" button is clicked
+        - queues it to be written into the results store (a .csv file per user
+          or the results database) when "Save" button is clicked
         """
         self.show_saving()
 
@@ -194,54 +357,262 @@ class MainWindow(QMainWindow):
         dt_            = str(datetime.datetime.today().strftime('%Y-%m-%d %H:%M:%S'))
         comment = self.comment_textbox.text()
 
-        headers = ["Date&Time", "User", "Image name",
-                   "PrimaryGrade", "SecondaryGrade", "xcoord", "ycoord", "User comment"]
         values =  [dt_, user_name, image_name, primary_grade, secondary_grade, x_coord, y_coord, comment]
 
-        root_folder = self.base_path + os.sep + "Results"
-        if not os.path.exists(root_folder):
-            os.mkdir(root_folder)
-        filename = root_folder + os.sep + "Grading_result_" + self.user_name.text() + ".csv"
-        with open(filename, mode="a", newline="", encoding="utf-8") as file:
-            writer = csv.writer(file)
-            if file.tell() == 0:
-                writer.writerow(headers)
-            writer.writerow(values)
+        self.pending_saves += 1
+        self.journal.queue_row(values)
+        self.results_writer.submit(values)
+        if primary_grade.strip() and secondary_grade.strip():
+            self.session.mark_graded(user_name, image_name)
+
+    def mark_region(self):
+        """
+        Add the current view as a rectangular region of the slide, with the
+        selected grades and comment.
+        """
+        if self.annotations is None:
+            return
+        annotation = Annotation.rectangle(
+            self.user_name.text(), self.image_name, self.x_limits,
+            self.y_limits, self.dropdown1.currentText(),
+            self.dropdown2.currentText(), self.comment_textbox.text())
+        self.annotations.add(annotation)
+        if self.overlay is not None:
+            self.overlay.refresh()
+        self.loading_label.setText("%d regions marked" % len(self.annotations))
+        self.loading_label.setStyleSheet("color: green;")
+
+    def toggle_regions(self, checked):
+        """ Show or hide the marked regions of the slide"""
+        if self.overlay is not None:
+            self.overlay.set_visible(checked)
+
+    def on_saved(self, count):
+        """ Clear the saving status once every queued row is written"""
+        self.journal.confirm_rows(count)
+        self.pending_saves = max(self.pending_saves - count, 0)
+        if self.pending_saves == 0:
+            self.hide_text()
 
-        time.sleep(0.5)
-        self.hide_text()
+    def on_save_failed(self, message, count):
+        """
+        Show that a batch of results could not be written. The rows stay in
+        the journal and are submitted again on the next start.
+        """
+        self.journal.fail_rows(count)
+        self.pending_saves = 0
+        self.loading_label.setText("Save failed: " + message)
+        self.loading_label.setStyleSheet("color: red;")
+
+    def slide_path(self, image_name):
+        """Return the full path of a slide in the Data folder."""
+        if getattr(sys, 'frozen', False):
+            base_path = sys._MEIPASS
+        else:
+            base_path = os.path.abspath("..")
+        return os.path.join(base_path, 'Data', image_name)
+
+    def prepare_slide(self, image_path, out_width, out_height):
+        """
+        Open a slide and read the view of the whole slide for a canvas of
+        out_width x out_height pixels. Safe to run off the main thread.
+        """
+        if self.client is not None:
+            slide = self.client.open_slide(os.path.basename(image_path))
+        else:
+            slide = SlideSource(image_path, image_cache=self.image_cache)
+        x_limits = (-0.5, slide.width - 0.5)
+        y_limits = (slide.height - 0.5, -0.5)
+        img, extent = slide.render_view(x_limits, y_limits, out_width, out_height)
+        return slide, img, extent
+
+    def take_slide(self, image_path, out_width, out_height):
+        """Return the prefetched slide, or prepare it now on a miss."""
+        prepared = self.prefetcher.take(image_path)
+        if prepared is None:
+            prepared = self.prepare_slide(image_path, out_width, out_height)
+        return prepared
 
     def load_image(self):
-        """Load and display the current image."""
+        """
+        Load and display the current image. A slide of the grading server
+        is opened on the slide reader and shown by on_read once it arrives.
+        """
+        with perf_log.timed('load_image'):
+            self._load_image()
+
+    def view_size(self):
+        """Return the size in pixels of the slide view."""
+        if self.tile_view is not None:
+            return self.tile_view.viewport().width(), self.tile_view.viewport().height()
+        return self.axes.bbox.width, self.axes.bbox.height
+
+    def _load_image(self):
         if 0 <= self.image_index < len(self.image_paths):
-            self.image_name = self.image_paths[self.image_index]
-            if getattr(sys, 'frozen', False):
-                base_path = sys._MEIPASS
-            else:
-                base_path = os.path.abspath("..")
-
-            image_path = os.path.join(base_path, 'Data', self.image_name)
-            #img = mpimg.imread('../Data/' + self.image_name)
-            img = mpimg.imread(image_path)
-
-            img_title = "Biopsy name: " + self.image_name.split(".tif")[0]
-
-            # Clear the existing axes
-            self.figure.clear()
-            self.axes = self.figure.add_subplot(1, 1, 1)
-            self.axes.imshow(img)
-            self.axes.set_title(img_title)
-            self.axes.spines['right'].set_visible(False)
-            self.axes.spines['top'].set_visible(False)
-            axes = self.figure.gca()
-            self.x_limits = axes.get_xlim()
-            self.y_limits = axes.get_ylim()
-            self.x_coordinate_textbox.setText(str(format(self.x_limits[0],".3f")))
-            self.y_coordinate_textbox.setText(str(format(self.y_limits[1],".3f")))
-            self.x_coordinate_textbox.update()
-            self.y_coordinate_textbox.update()
-
-            self.canvas.draw_idle()
+            image_name = self.image_paths[self.image_index]
+            out_width, out_height = self.view_size()
+            image_path = self.slide_path(image_name)
+            if self.client is None:
+                self.show_loaded_slide(image_name, self.take_slide(
+                    image_path, out_width, out_height))
+                return
+            # Opening a remote slide is a round trip to the server, or the
+            # whole timeout if it is down: wait for it on a worker
+            self.loading_slide = ('slide', self.image_index, image_name)
+            self.slide_reader.read(self.loading_slide, self.take_slide,
+                                   image_path, out_width, out_height)
+
+    def show_loaded_slide(self, image_name, prepared):
+        """
+        Show a slide, from the (slide, img, extent) returned by take_slide,
+        and prefetch its neighbours.
+        """
+        self.save_session_viewport()
+        self.image_name = image_name
+        self.journal.show_image(self.image_name)
+        self.session.set_position(self.user_name.text(), self.image_name,
+                                  self.image_index)
+
+        img_title = "Biopsy name: " + self.image_name.split(".tif")[0]
+        self.annotations = SlideAnnotations(self.annotation_store,
+                                            self.image_name)
+
+        if self.tile_view is not None:
+            self.slide = prepared[0]
+            self.setWindowTitle("PathoGUI - " + img_title)
+            self.tile_view.set_slide(self.slide)
+            self.on_viewport_changed(*self.tile_view.visible_limits())
+        else:
+            self.show_slide_matplotlib(prepared, img_title)
+            self.overlay.set_annotations(self.annotations, self.user_name.text())
+
+        viewport = self.session.viewport(self.user_name.text(), self.image_name)
+        if viewport is not None:
+            self.set_viewport(*viewport)
+        if self.restored is not None and self.restored['image'] == self.image_name:
+            self.restore_form(self.restored)
+        self.restored = None
+
+        if self.catalog is not None:
+            info = self.catalog.slide(self.data_path, self.image_name)
+            if info and not info['Pyramid'] and self.slide.pyramid_on_disk:
+                self.catalog.set_pyramid(self.data_path, self.image_name)
+        else:
+            self.show_other_graders()
+
+        if self.thumbnail_strip is not None:
+            self.thumbnail_strip.set_current(self.image_index)
+
+        # Prepare the neighbouring slides while the user grades this one
+        neighbours = neighbour_indices(self.image_index, self.prefetch_radius,
+                                       len(self.image_paths))
+        self.prefetcher.schedule(
+            [self.slide_path(self.image_paths[i]) for i in neighbours],
+            *self.view_size())
+
+    def on_read(self, tag, result):
+        """ Show a slide or the graders read by the slide reader"""
+        if tag[0] == 'slide':
+            # Only the last slide asked for is shown
+            if tag == self.loading_slide:
+                self.loading_slide = None
+                self.show_loaded_slide(tag[2], result)
+        elif tag[1] == self.image_name:
+            self.show_graders(result)
+
+    def on_read_failed(self, tag, message):
+        """ Report a slide or graders the slide reader could not read"""
+        if tag[0] == 'slide':
+            if tag == self.loading_slide:
+                # A slide that cannot be read leaves the current one shown
+                self.loading_slide = None
+                self.show_read_error(message)
+        elif tag[1] == self.image_name:
+            self.statusBar().showMessage("Grading server: " + message)
+
+    def show_read_error(self, message):
+        """ Report a slide that could not be read in the status bar"""
+        self.statusBar().showMessage("Could not read the slide: " + message)
+
+    def show_other_graders(self):
+        """ Look up who else has graded the current slide on the grading server"""
+        self.slide_reader.read(('graders', self.image_name),
+                               self.client.results_for_image, self.image_name)
+
+    def show_graders(self, rows):
+        """ Show the other users with both grades in rows of the current slide"""
+        users = sorted({row[USER_COLUMN] for row in rows
+                        if row[USER_COLUMN] != self.user_name.text()
+                        and row[3].strip() and row[4].strip()})
+        if users:
+            self.statusBar().showMessage("Also graded by: " + ", ".join(users))
+        else:
+            self.statusBar().clearMessage()
+
+    def save_session_viewport(self):
+        """ Remember the viewport of the current slide for the next visit"""
+        if self.image_name is not None and self.x_limits is not None:
+            self.session.save_viewport(self.user_name.text(), self.image_name,
+                                       self.x_limits, self.y_limits)
+
+    def show_slide_matplotlib(self, prepared, img_title):
+        """
+        Show a slide on the matplotlib canvas, from the (slide, img, extent)
+        returned by take_slide for the canvas size.
+        """
+        # Start from the full slide, only its thumbnail level was read
+        self.slide, img, extent = prepared
+        self.renderer.set_slide(self.slide, img_title, img, extent)
+        # Home/back/forward of the toolbar refer to the new slide
+        self.toolbar.update()
+
+    def toggle_perf_overlay(self, checked):
+        """Show or hide the rolling averages of the timed hot paths."""
+        if checked and not perf_log.enabled():
+            # No log file was asked for: keep the timings in memory only
+            perf_log.enable()
+            self.perf_owned = True
+        elif not checked and self.perf_owned:
+            perf_log.disable()
+            self.perf_owned = False
+        self.perf_label.setVisible(checked)
+        if checked:
+            self.update_perf_overlay()
+            self.perf_timer.start()
+        else:
+            self.perf_timer.stop()
+
+    def update_perf_overlay(self):
+        """Show the current rolling averages in the status bar."""
+        self.perf_label.setText(perf_log.summary() or "No timings yet")
+
+    def closeEvent(self, event):
+        """Stop background work when the window is closed."""
+        self.prefetcher.shutdown()
+        self.slide_reader.shutdown()
+        if self.tile_view is not None:
+            self.tile_view.reader.shutdown()
+        else:
+            self.renderer.reader.shutdown()
+        self.results_writer.close()
+        # Deliver the last saved/failed signals to the journal
+        QApplication.processEvents()
+        self.journal.close()
+        self.save_session_viewport()
+        self.session.close_connection()
+        if self.thumbnail_strip is not None:
+            self.thumbnail_strip.model().generator.shutdown()
+            self.thumbnail_strip.model().cache.close_connection()
+        if isinstance(self.results_sink, ResultsDatabase):
+            self.results_sink.close_connection()
+        if self.catalog is not None:
+            self.catalog.close_connection()
+        if self.client is not None:
+            self.client.close_connection()
+        self.annotation_store.close_connection()
+        self.perf_timer.stop()
+        perf_log.disable()
+        super().closeEvent(event)
 
     def previous_image(self):
         """Show the previous image."""
@@ -259,6 +630,43 @@ class MainWindow(QMainWindow):
             self.load_image()
             self.comment_textbox.clear()
 
+    def next_ungraded_image(self):
+        """Show the next slide the user has not graded."""
+        index = self.session.next_ungraded(self.user_name.text(), self.image_paths,
+                                           self.image_index)
+        if index is None:
+            self.loading_label.setText("Every slide is graded")
+            self.loading_label.setStyleSheet("color: green;")
+            return
+        self.clear_input()
+        self.image_index = index
+        self.load_image()
+        self.comment_textbox.clear()
+
+    def toggle_thumbnails(self):
+        """Show or hide the strip of slide thumbnails."""
+        if self.thumbnail_dock is None:
+            # Thumbnails are made in worker processes and kept in the cache
+            model = ThumbnailModel(self.image_paths, self.slide_path,
+                                   ThumbnailCache(), ThumbnailGenerator(), parent=self)
+            self.thumbnail_strip = ThumbnailStrip(model)
+            self.thumbnail_strip.slide_selected.connect(self.show_slide_at)
+            self.thumbnail_dock = QDockWidget("Slides", self)
+            self.thumbnail_dock.setWidget(self.thumbnail_strip)
+            self.addDockWidget(Qt.BottomDockWidgetArea, self.thumbnail_dock)
+            self.thumbnail_strip.set_current(self.image_index)
+        else:
+            self.thumbnail_dock.setVisible(not self.thumbnail_dock.isVisible())
+
+    def show_slide_at(self, index):
+        """Show the slide selected in the thumbnail strip."""
+        if index == self.image_index:
+            return
+        self.clear_input()
+        self.image_index = index
+        self.load_image()
+        self.comment_textbox.clear()
+
     def clear_input(self):
         """Clear input"""
         self.comment_textbox.clear()
@@ -269,14 +677,23 @@ if __name__ == '__main__':
     app = QApplication([])
 
     # Initialize the user database
-    user_db = UserDatabase()
+    settings = load_settings(sys.argv[1:])
+    if settings['perf_log']:
+        perf_log.enable(settings['perf_log'])
+    if settings['server']:
+        # Thin client: users, slides and results are on the grading server
+        user_db = GradingClient(settings['server'])
+    else:
+        user_db = UserDatabase(algorithm=settings['hash_algorithm'],
+                               params=settings['hash_params'])
 
     # Show the login dialog
     current_user = show_login_dialog(user_db, MainWindow)
 
     # Now, only if authentication is successful, create and show the main window
     if current_user:
-        w = MainWindow(current_user)
+        w = MainWindow(current_user, settings,
+                       user_db if settings['server'] else None)
         w.current_user = current_user  # Set the current user
         w.show()
         sys.exit(app.exec_())
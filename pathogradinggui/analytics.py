@@ -0,0 +1,303 @@
+"""
+Analytics Module
+
+This module summarizes the grading results of all users. Every results
+file (or the results database) is read once into a single pandas frame
+with compact column types (categories for users and slides, float32
+grades that are NaN when ungraded, datetimes), parsing the types while
+reading rather than converting text afterwards. Every statistic is
+computed with vectorized groupby / bincount operations on the category
+codes of that frame, so millions of rows are summarized in seconds.
+
+Statistics (based on each user's latest grade of a slide, unless noted):
+- grade_distribution: per-slide counts of each primary and secondary grade.
+- gleason_sums: per-slide Gleason sum (primary + secondary) statistics.
+- throughput: per-user number of grades (all saves), slides, active hours
+  and grades per active hour.
+- cohen_kappa / pairwise_kappa: Cohen's kappa between two users, or for
+  every pair of users.
+- fleiss_kappa: Fleiss' kappa over all users, allowing a different number
+  of raters per slide.
+
+Usage:
+    # Example usage:
+    frame = load_results('../Results')
+    print(grade_distribution(frame))
+    print(fleiss_kappa(frame, 'GleasonSum'))
+
+    # Or from the command line
+    python analytics.py --results ../Results --out ../Results/analytics
+"""
+
+import os
+import glob
+import sqlite3
+import argparse
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype, union_categoricals
+
+from results_store import COLUMNS, HEADERS
+
+GRADES = [3, 4, 5]
+# Gaps between two saves longer than this end an active grading session
+SESSION_GAP = pd.Timedelta(minutes=30)
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Column types read straight from the CSV files; " " is an ungraded grade
+CSV_DTYPES = {'DateTime': str, 'User': 'category', 'Image': 'category',
+              'PrimaryGrade': 'float32', 'SecondaryGrade': 'float32',
+              'XCoord': 'float64', 'YCoord': 'float64', 'Comment': str}
+
+
+def typed_results(frame):
+    """
+    Give a frame of results (the COLUMNS, as read from a CSV file or the
+    database) its column types, and add the Gleason sum.
+    """
+    frame['DateTime'] = pd.to_datetime(frame['DateTime'], format=DATETIME_FORMAT,
+                                       errors='coerce')
+    for column in ('User', 'Image'):
+        if frame[column].dtype != 'category':
+            frame[column] = frame[column].astype('category')
+    for column in ('PrimaryGrade', 'SecondaryGrade', 'XCoord', 'YCoord'):
+        if not is_numeric_dtype(frame[column]):
+            frame[column] = pd.to_numeric(frame[column].astype(str).str.strip(),
+                                          errors='coerce')
+    for column in ('PrimaryGrade', 'SecondaryGrade'):
+        frame[column] = frame[column].astype('float32')
+    frame['GleasonSum'] = frame['PrimaryGrade'] + frame['SecondaryGrade']
+    return frame
+
+
+def read_results_csv(source, header=0):
+    """
+    Read a results CSV file, parsing the columns while reading. Files with
+    unexpected values fall back to text columns that typed_results coerces.
+
+    Args:
+    - source (str or file): The file, or a file object.
+    - header (int or None): Row of the header, None if there is none
+        (e.g. for the part of a file appended since a given offset).
+    """
+    options = dict(header=header, names=COLUMNS, usecols=range(len(HEADERS)),
+                   keep_default_na=False)
+    try:
+        return pd.read_csv(source, dtype=CSV_DTYPES, na_values=[' ', ''], **options)
+    except ValueError:
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        frame = pd.read_csv(source, dtype=str, **options)
+        for column in ('User', 'Image'):
+            frame[column] = frame[column].astype('category')
+        return frame
+
+
+def load_results(results_folder, backend=None):
+    """
+    Load every grading result into one frame.
+
+    Args:
+    - results_folder (str): The Results folder.
+    - backend (str, optional): 'csv' to read the Grading_result_*.csv
+        files, 'sqlite' to read results_database.db. By default the
+        database is read if it exists, the CSV files otherwise.
+
+    Returns:
+    - pandas.DataFrame: One row per saved grade, with the columns of
+        results_store.COLUMNS plus GleasonSum. Ungraded (" ") grades are
+        NaN.
+    """
+    db_path = os.path.join(results_folder, 'results_database.db')
+    if backend is None:
+        backend = 'sqlite' if os.path.exists(db_path) else 'csv'
+    if backend == 'sqlite':
+        connection = sqlite3.connect(db_path)
+        try:
+            frame = pd.read_sql_query('SELECT %s FROM Results' % ', '.join(COLUMNS),
+                                      connection)
+        finally:
+            connection.close()
+        return typed_results(frame)
+    if backend != 'csv':
+        raise ValueError('Unknown results backend: %s' % backend)
+
+    names = sorted(glob.glob(os.path.join(results_folder, 'Grading_result_*.csv')))
+    frames = [read_results_csv(name) for name in names]
+    if not frames:
+        return typed_results(pd.DataFrame({column: pd.Series(dtype=str)
+                                     for column in COLUMNS}))
+    frame = pd.concat(frames, ignore_index=True)
+    # Each file has its own categories, merge them without going to text
+    for column in ('User', 'Image'):
+        frame[column] = union_categoricals([part[column] for part in frames])
+    return typed_results(frame)
+
+
+def latest_grades(frame):
+    """Return each user's latest graded row per slide."""
+    graded = frame.dropna(subset=['PrimaryGrade', 'SecondaryGrade'])
+    graded = graded.sort_values('DateTime', kind='stable')
+    return graded.drop_duplicates(['Image', 'User'], keep='last')
+
+
+def _counts(latest, column):
+    """Return a slides x values table of how often each value was given."""
+    counts = latest.groupby(['Image', column], observed=True).size()
+    table = counts.unstack(fill_value=0)
+    table.index = table.index.astype(str)
+    return table
+
+
+def grade_distribution(frame):
+    """
+    Return per-slide counts of each primary and secondary grade (one
+    column per grade, e.g. Primary_3 ... Secondary_5), from each user's
+    latest grade.
+    """
+    latest = latest_grades(frame)
+    parts = []
+    for column, label in (('PrimaryGrade', 'Primary'),
+                          ('SecondaryGrade', 'Secondary')):
+        counts = _counts(latest, column).reindex(columns=GRADES, fill_value=0)
+        counts.columns = ['%s_%d' % (label, grade) for grade in GRADES]
+        parts.append(counts)
+    return pd.concat(parts, axis=1).rename_axis('Image')
+
+
+def gleason_sums(frame):
+    """
+    Return per-slide Gleason sum statistics (raters, mean, min, max and
+    the most common sum) from each user's latest grade.
+    """
+    latest = latest_grades(frame)
+    stats = latest.groupby('Image', observed=True)['GleasonSum'] \
+        .agg(['count', 'mean', 'min', 'max'])
+    stats.columns = ['Raters', 'Mean', 'Min', 'Max']
+    stats.index = stats.index.astype(str)
+    # Most common sum, the lowest one on ties (idxmax takes the first)
+    counts = _counts(latest, 'GleasonSum')
+    stats['Mode'] = counts.idxmax(axis=1) if len(counts) else []
+    return stats.rename_axis('Image')
+
+
+def throughput(frame):
+    """
+    Return per-user grading throughput: saves, distinct slides, active
+    hours (time between consecutive saves, ignoring gaps longer than
+    SESSION_GAP) and saves per active hour.
+    """
+    ordered = frame.dropna(subset=['DateTime']).sort_values(['User', 'DateTime'])
+    users = ordered.groupby('User', observed=True)
+    gaps = users['DateTime'].diff()
+    gaps = gaps.where(gaps <= SESSION_GAP, pd.Timedelta(0)).fillna(pd.Timedelta(0))
+    result = pd.DataFrame({
+        'Saves': users.size(),
+        'Slides': users['Image'].nunique(),
+        'First': users['DateTime'].min(),
+        'Last': users['DateTime'].max(),
+        'ActiveHours': gaps.groupby(ordered['User'], observed=True).sum()
+                       .dt.total_seconds() / 3600.0,
+    })
+    result.index = result.index.astype(str)
+    result['SavesPerHour'] = result['Saves'] / \
+        result['ActiveHours'].where(result['ActiveHours'] > 0)
+    return result.rename_axis('User')
+
+
+def rating_matrix(frame, column='GleasonSum'):
+    """Return a slides x users matrix of each user's latest rating."""
+    latest = latest_grades(frame)
+    matrix = latest.set_index(['Image', 'User'])[column].unstack()
+    matrix.index = matrix.index.astype(str)
+    matrix.columns = matrix.columns.astype(str)
+    return matrix
+
+
+def cohen_kappa(ratings_a, ratings_b):
+    """
+    Return Cohen's kappa of two raters over the slides both rated.
+
+    Args:
+    - ratings_a, ratings_b (array-like): Ratings of the same slides, NaN
+        where a rater did not rate a slide.
+    """
+    ratings_a = np.asarray(ratings_a, dtype=float)
+    ratings_b = np.asarray(ratings_b, dtype=float)
+    both = ~(np.isnan(ratings_a) | np.isnan(ratings_b))
+    if not both.any():
+        return np.nan
+    categories, codes = np.unique(np.concatenate([ratings_a[both], ratings_b[both]]),
+                                  return_inverse=True)
+    size = len(categories)
+    codes_a, codes_b = codes[:both.sum()], codes[both.sum():]
+    confusion = np.bincount(codes_a * size + codes_b,
+                            minlength=size * size).reshape(size, size)
+    total = confusion.sum()
+    observed = np.trace(confusion) / total
+    expected = (confusion.sum(axis=0) * confusion.sum(axis=1)).sum() / total ** 2
+    if expected == 1:
+        return 1.0
+    return (observed - expected) / (1 - expected)
+
+
+def pairwise_kappa(frame, column='GleasonSum'):
+    """Return Cohen's kappa and the number of shared slides for every pair of users."""
+    matrix = rating_matrix(frame, column)
+    rows = []
+    for user_a, user_b in combinations(matrix.columns, 2):
+        shared = int((matrix[user_a].notna() & matrix[user_b].notna()).sum())
+        rows.append((user_a, user_b, shared,
+                     cohen_kappa(matrix[user_a], matrix[user_b])))
+    return pd.DataFrame(rows, columns=['UserA', 'UserB', 'Slides', 'Kappa'])
+
+
+def fleiss_kappa(frame, column='GleasonSum'):
+    """
+    Return Fleiss' kappa over all users and the slides rated by at least
+    two of them. Slides may have different numbers of raters.
+    """
+    counts = _counts(latest_grades(frame), column).to_numpy()
+    raters = counts.sum(axis=1)
+    counts, raters = counts[raters >= 2], raters[raters >= 2]
+    if len(raters) == 0:
+        return np.nan
+    agreement = ((counts ** 2).sum(axis=1) - raters) / (raters * (raters - 1))
+    proportions = counts.sum(axis=0) / raters.sum()
+    observed, expected = agreement.mean(), (proportions ** 2).sum()
+    if expected == 1:
+        return 1.0
+    return (observed - expected) / (1 - expected)
+
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description='Summarize PathoGUI grading results')
+    parser.add_argument('--results', default=os.path.join(os.path.abspath('..'),
+                                                          'Results'),
+                        help='Results folder to read')
+    parser.add_argument('--backend', choices=['csv', 'sqlite'],
+                        help='read the CSV files or the results database '
+                             '(default: the database if it exists)')
+    parser.add_argument('--out', help='also write each table as a CSV file here')
+    args = parser.parse_args(argv)
+
+    frame = load_results(args.results, args.backend)
+    tables = {'grade_distribution': grade_distribution(frame),
+              'gleason_sums': gleason_sums(frame),
+              'throughput': throughput(frame),
+              'pairwise_kappa': pairwise_kappa(frame)}
+    for name, table in tables.items():
+        print('== %s\n%s\n' % (name, table.to_string()))
+    print("Fleiss' kappa (Gleason sum): %.3f" % fleiss_kappa(frame))
+    if args.out:
+        if not os.path.exists(args.out):
+            os.makedirs(args.out)
+        for name, table in tables.items():
+            table.to_csv(os.path.join(args.out, name + '.csv'))
+    return tables
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+AnnotationOverlay Module
+
+This module draws the saved regions of the current slide on top of the
+matplotlib viewer. All visible regions are drawn by one PathCollection,
+whatever their number, so the cost of a redraw is one artist instead of
+one patch per region. Only the regions returned by the viewport query of
+SlideAnnotations (a grid index lookup) are handed to the collection, and
+the collection is an overlay of the SlideRenderer: panning, adding a
+region or toggling the overlay repaints it by blitting over the cached
+slide, never by re-rasterizing the slide.
+
+Regions are outlined in the colour of their primary grade. The Path and
+colour of every region are built once and reused, the viewport query is
+skipped when neither the view nor the regions changed, and the painted
+result of each state is kept by the renderer, so toggling the overlay
+only restores pixels.
+
+Usage:
+    # Example usage:
+    overlay = AnnotationOverlay(renderer)
+    overlay.set_annotations(SlideAnnotations(store, 'S001_D1.tif'), 'john_doe')
+    overlay.set_visible(False)   # toggle
+"""
+
+import numpy as np
+from matplotlib.colors import to_rgba
+from matplotlib.path import Path
+from matplotlib.collections import PathCollection
+
+GRADE_COLORS = {'3': '#ffd400', '4': '#ff7f00', '5': '#e41a1c'}
+DEFAULT_COLOR = '#00bfff'
+
+
+class AnnotationOverlay:
+    """
+    Batched, viewport-limited overlay of slide annotations.
+
+    Args:
+    - renderer (SlideRenderer): Viewer to draw on. The overlay follows its
+        viewport_changed signal.
+
+    Methods:
+    - set_annotations(annotations, user=None): Show the regions of a
+        slide, only those of one user if given.
+    - refresh(): Re-query the viewport and repaint.
+    - set_visible(visible): Toggle the overlay.
+
+    Attributes:
+    - shown (int): Number of regions in the collection.
+    """
+
+    def __init__(self, renderer):
+        self.renderer = renderer
+        self.annotations = None
+        self.user = None
+        self.shown = 0
+        self._outlines = {}
+        self._query = None
+        # A PathCollection takes ready-made Paths, a PolyCollection would
+        # rebuild one Path per region on every update
+        self.collection = PathCollection([], facecolors='none', linewidths=1.5)
+        renderer.axes.add_collection(self.collection, autolim=False)
+        renderer.add_overlay(self.collection)
+        renderer.viewport_changed.connect(self.refresh)
+
+    def set_annotations(self, annotations, user=None):
+        """Show the annotations of a slide (a SlideAnnotations)."""
+        self.annotations = annotations
+        self.user = user
+        self._outlines = {}
+        self._query = None
+        self.refresh()
+
+    def _outline(self, annotation):
+        # Paths and colours are built once per region and reused
+        outline = self._outlines.get(annotation.annotation_id)
+        if outline is None:
+            outline = (Path(np.asarray(annotation.vertices(), dtype=float),
+                            closed=True),
+                       to_rgba(GRADE_COLORS.get(annotation.primary_grade,
+                                                DEFAULT_COLOR)))
+            self._outlines[annotation.annotation_id] = outline
+        return outline
+
+    def refresh(self, *_limits):
+        """Query the regions in the viewport and repaint the overlay."""
+        if not self.collection.get_visible():
+            return
+        axes = self.renderer.axes
+        query = (id(self.annotations), self.user, axes.get_xlim(),
+                 axes.get_ylim(),
+                 None if self.annotations is None else self.annotations.revision)
+        if query != self._query:
+            self._query = query
+            visible = []
+            if self.annotations is not None:
+                visible = [annotation for annotation in
+                           self.annotations.visible(query[2], query[3])
+                           if self.user is None or annotation.user == self.user]
+            outlines = [self._outline(annotation) for annotation in visible]
+            self.collection.set_paths([path for path, _ in outlines])
+            self.collection.set_edgecolor(
+                np.array([color for _, color in outlines]).reshape(-1, 4))
+            self.shown = len(visible)
+        self.renderer.blit_overlays((True,) + query)
+
+    def set_visible(self, visible):
+        """Show or hide the overlay."""
+        self.collection.set_visible(visible)
+        if visible:
+            self.refresh()
+        else:
+            self.renderer.blit_overlays((False,))
@@ -0,0 +1,320 @@
+"""
+Annotations Module
+
+This module provides the multi-region annotation model. Instead of one
+x/y pair per Save (the corner of the zoom window), a pathologist can mark
+any number of regions per slide, each a rectangle or a polygon in level 0
+image pixel space with its own primary/secondary grade and comment.
+
+- AnnotationStore persists the annotations of every slide in one SQLite
+  database (Results/annotations_database.db), indexed on the slide name,
+  so revisiting a slide loads its annotations with a single index lookup.
+- GridIndex is a uniform grid over image space. Each annotation is
+  registered in the cells its bounding box overlaps, so "annotations in
+  the viewport" only looks at the cells the viewport covers, which takes
+  microseconds while panning even with thousands of regions.
+- SlideAnnotations holds the annotations of the current slide in memory
+  together with their GridIndex, and writes changes through to the store.
+
+Usage:
+    # Example usage:
+    store = AnnotationStore('../Results/annotations_database.db')
+    annotations = SlideAnnotations(store, 'S001_D1.tif')
+
+    # Mark a region
+    annotations.add(Annotation.rectangle('john_doe', 'S001_D1.tif',
+                                         (100, 400), (50, 300), '3', '4'))
+
+    # Regions overlapping the current view
+    visible = annotations.visible(axes.get_xlim(), axes.get_ylim())
+
+    store.close_connection()
+"""
+
+import os
+import json
+import sqlite3
+import datetime
+import threading
+
+CELL_SIZE = 1024           # grid cell edge length in image pixels
+KINDS = ('rectangle', 'polygon')
+
+
+class Annotation:
+    """
+    One annotated region of a slide.
+
+    Args:
+    - user (str): User who marked the region.
+    - image (str): Slide file name.
+    - kind (str): 'rectangle' or 'polygon'.
+    - points (list): Vertices [(x, y), ...] in level 0 pixel space; two
+        opposite corners for a rectangle.
+    - primary_grade, secondary_grade (str): Grades of the region.
+    - comment (str): Free text.
+    - created (str, optional): Timestamp, now by default.
+    - annotation_id (int, optional): Set by the store once saved.
+
+    Raises:
+    - ValueError: If the kind is unknown or there are too few points.
+    """
+
+    def __init__(self, user, image, kind, points, primary_grade='',
+                 secondary_grade='', comment='', created=None,
+                 annotation_id=None):
+        if kind not in KINDS:
+            raise ValueError('Unknown annotation kind: %s' % kind)
+        points = [(float(x), float(y)) for x, y in points]
+        if len(points) < (2 if kind == 'rectangle' else 3):
+            raise ValueError('Too few points for a %s' % kind)
+        self.user = user
+        self.image = image
+        self.kind = kind
+        self.points = points
+        self.primary_grade = primary_grade
+        self.secondary_grade = secondary_grade
+        self.comment = comment
+        self.created = created or \
+            datetime.datetime.today().strftime('%Y-%m-%d %H:%M:%S')
+        self.annotation_id = annotation_id
+
+    @classmethod
+    def rectangle(cls, user, image, x_range, y_range, primary_grade='',
+                  secondary_grade='', comment=''):
+        """Return a rectangle covering x_range x y_range (in any order)."""
+        return cls(user, image, 'rectangle',
+                   [(min(x_range), min(y_range)), (max(x_range), max(y_range))],
+                   primary_grade, secondary_grade, comment)
+
+    @property
+    def bbox(self):
+        """Bounding box (x_min, y_min, x_max, y_max)."""
+        xs = [x for x, _ in self.points]
+        ys = [y for _, y in self.points]
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def vertices(self):
+        """Return the outline as a closed list of (x, y) vertices."""
+        if self.kind == 'rectangle':
+            x_min, y_min, x_max, y_max = self.bbox
+            return [(x_min, y_min), (x_max, y_min), (x_max, y_max),
+                    (x_min, y_max)]
+        return list(self.points)
+
+
+class GridIndex:
+    """
+    Uniform grid spatial index of bounding boxes.
+
+    Methods:
+    - insert(key, bbox): Register a box (x_min, y_min, x_max, y_max).
+    - remove(key): Forget a box.
+    - query(x_range, y_range): Return the keys of the boxes overlapping a
+        region.
+    """
+
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.boxes = {}
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def _cells(self, x_min, y_min, x_max, y_max):
+        size = self.cell_size
+        for column in range(int(x_min // size), int(x_max // size) + 1):
+            for row in range(int(y_min // size), int(y_max // size) + 1):
+                yield column, row
+
+    def insert(self, key, bbox):
+        """Register the bounding box of key, replacing any previous one."""
+        self.remove(key)
+        self.boxes[key] = bbox
+        for cell in self._cells(*bbox):
+            self.cells.setdefault(cell, set()).add(key)
+
+    def remove(self, key):
+        """Forget the bounding box of key, if any."""
+        bbox = self.boxes.pop(key, None)
+        if bbox is None:
+            return
+        for cell in self._cells(*bbox):
+            keys = self.cells.get(cell)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.cells[cell]
+
+    def query(self, x_range, y_range):
+        """Return the set of keys whose boxes overlap the region."""
+        x_min, x_max = sorted(x_range)
+        y_min, y_max = sorted(y_range)
+        found = set()
+        for cell in self._cells(x_min, y_min, x_max, y_max):
+            found.update(self.cells.get(cell, ()))
+        return {key for key in found
+                if self.boxes[key][0] <= x_max and self.boxes[key][2] >= x_min
+                and self.boxes[key][1] <= y_max and self.boxes[key][3] >= y_min}
+
+
+class AnnotationStore:
+    """
+    AnnotationStore Class
+
+    SQLite persistence of the annotations of all slides.
+
+    Methods:
+        __init__(self, db_path):
+            Opens (or creates) the database in WAL mode and makes sure the
+            'Annotations' table and its index exist.
+
+        save(self, annotation):
+            Inserts a new annotation (setting its annotation_id) or
+            updates an existing one.
+
+        delete(self, annotation_id):
+            Removes an annotation.
+
+        for_image(self, image):
+            Returns every annotation of one slide, oldest first.
+
+        close_connection(self):
+            Closes the SQLite database connection.
+    """
+
+    COLUMNS = ['DateTime', 'User', 'Image', 'Kind', 'Points', 'XMin', 'YMin',
+               'XMax', 'YMax', 'PrimaryGrade', 'SecondaryGrade', 'Comment']
+
+    def __init__(self, db_path):
+        folder = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.create_table()
+
+    def create_table(self):
+        """Create the 'Annotations' table and its index if they do not exist."""
+        with self._lock, self.connection:
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS Annotations (
+                    Id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    DateTime TEXT NOT NULL,
+                    User varchar(255) NOT NULL,
+                    Image varchar(255) NOT NULL,
+                    Kind TEXT NOT NULL,
+                    Points TEXT NOT NULL,
+                    XMin REAL, YMin REAL, XMax REAL, YMax REAL,
+                    PrimaryGrade TEXT,
+                    SecondaryGrade TEXT,
+                    Comment TEXT
+                )
+            ''')
+            self.connection.execute('''
+                CREATE INDEX IF NOT EXISTS Annotations_Image
+                ON Annotations (Image)
+            ''')
+
+    def _values(self, annotation):
+        return (annotation.created, annotation.user, annotation.image,
+                annotation.kind, json.dumps(annotation.points)) + \
+            annotation.bbox + (annotation.primary_grade,
+                               annotation.secondary_grade, annotation.comment)
+
+    def save(self, annotation):
+        """Insert or update an annotation and return its id."""
+        with self._lock, self.connection:
+            if annotation.annotation_id is None:
+                cursor = self.connection.execute(
+                    'INSERT INTO Annotations (%s) VALUES (%s)'
+                    % (', '.join(self.COLUMNS), ', '.join('?' * len(self.COLUMNS))),
+                    self._values(annotation))
+                annotation.annotation_id = cursor.lastrowid
+            else:
+                self.connection.execute(
+                    'UPDATE Annotations SET %s WHERE Id=?'
+                    % ', '.join(column + '=?' for column in self.COLUMNS),
+                    self._values(annotation) + (annotation.annotation_id,))
+        return annotation.annotation_id
+
+    def delete(self, annotation_id):
+        """Remove an annotation."""
+        with self._lock, self.connection:
+            self.connection.execute('DELETE FROM Annotations WHERE Id=?',
+                                    (annotation_id,))
+
+    def for_image(self, image):
+        """Return the annotations of one slide, oldest first."""
+        with self._lock:
+            rows = self.connection.execute(
+                'SELECT Id, DateTime, User, Kind, Points, PrimaryGrade, \
+                SecondaryGrade, Comment FROM Annotations WHERE Image=? \
+                ORDER BY Id', (image,)).fetchall()
+        return [Annotation(user, image, kind, json.loads(points), primary,
+                           secondary, comment, created, annotation_id)
+                for annotation_id, created, user, kind, points, primary,
+                secondary, comment in rows]
+
+    def close_connection(self):
+        """Close the SQLite database connection."""
+        self.connection.close()
+
+
+class SlideAnnotations:
+    """
+    The annotations of one slide, in memory and spatially indexed.
+
+    Args:
+    - store (AnnotationStore): Where changes are persisted.
+    - image (str): Slide file name.
+
+    Methods:
+    - add(annotation): Save a new annotation and index it.
+    - remove(annotation_id): Delete an annotation.
+    - visible(x_limits, y_limits): Return the annotations overlapping the
+        view, oldest first.
+    """
+
+    def __init__(self, store, image, cell_size=CELL_SIZE):
+        self.store = store
+        self.image = image
+        self.index = GridIndex(cell_size)
+        self.annotations = {}
+        # Incremented on every change, so views can tell they are stale
+        self.revision = 0
+        for annotation in store.for_image(image):
+            self._index(annotation)
+
+    def __len__(self):
+        return len(self.annotations)
+
+    def __iter__(self):
+        return iter(self.annotations.values())
+
+    def _index(self, annotation):
+        self.annotations[annotation.annotation_id] = annotation
+        self.index.insert(annotation.annotation_id, annotation.bbox)
+
+    def add(self, annotation):
+        """Persist a new annotation of this slide and index it."""
+        annotation.image = self.image
+        self.store.save(annotation)
+        self._index(annotation)
+        self.revision += 1
+        return annotation
+
+    def remove(self, annotation_id):
+        """Delete an annotation of this slide."""
+        self.store.delete(annotation_id)
+        self.annotations.pop(annotation_id, None)
+        self.index.remove(annotation_id)
+        self.revision += 1
+
+    def visible(self, x_limits, y_limits):
+        """Return the annotations overlapping the axes limits."""
+        return [self.annotations[key]
+                for key in sorted(self.index.query(x_limits, y_limits))]
@@ -0,0 +1,215 @@
+"""
+Batch Ingest Module
+
+This module is a command line entry point that streams bulk grades (for
+example a spreadsheet from a second site) into the same results store the
+GUI writes to, without starting the GUI.
+
+The input is a CSV file or a JSONL file (one JSON object per line) with
+the fields user, image, primary, secondary, x, y and comment, plus an
+optional time. The column names written by MainWindow.save_coords
+("User", "Image name", "PrimaryGrade", ...) are accepted as well. Records
+are read lazily and written in chunks, so the input can be much larger
+than memory. Each record is validated before it is written:
+- the image must be a slide in the Data folder catalog,
+- both grades must be one of 3, 4 or 5,
+- the coordinates must be numbers.
+Rejected records, and JSONL lines that are not a JSON object, are
+counted and can be written to a separate file with their line number.
+
+Usage:
+    python batch_ingest.py grades_site2.csv
+    python batch_ingest.py grades_site2.jsonl --backend sqlite \\
+        --rejects rejected.jsonl --chunk-size 10000
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import datetime
+import argparse
+from itertools import islice
+
+from results_store import open_results_store
+from settings import load_settings
+from slide_catalog import SlideCatalog
+
+GRADES = ("3", "4", "5")
+CHUNK_SIZE = 5000
+
+# Accepted input names for each field, the first one is canonical
+FIELD_NAMES = {
+    'time': ('time', 'Date&Time', 'datetime'),
+    'user': ('user', 'User'),
+    'image': ('image', 'Image name', 'image_name'),
+    'primary': ('primary', 'PrimaryGrade', 'primary_grade'),
+    'secondary': ('secondary', 'SecondaryGrade', 'secondary_grade'),
+    'x': ('x', 'xcoord', 'x_coord'),
+    'y': ('y', 'ycoord', 'y_coord'),
+    'comment': ('comment', 'User comment'),
+}
+ALIASES = {alias: field for field, names in FIELD_NAMES.items()
+           for alias in names}
+
+
+def slide_index(data_path):
+    """Return the names of the slides in the Data folder, from the slide catalog."""
+    catalog = SlideCatalog()
+    try:
+        catalog.refresh(data_path)
+        return set(catalog.names(data_path))
+    finally:
+        catalog.close_connection()
+
+
+def read_records(path):
+    """
+    Yield (line number, record dict) for every record of a CSV or JSONL
+    file, without reading the whole file into memory. A JSONL line that is
+    not valid JSON is yielded as its text, for to_row to reject.
+    """
+    with open(path, 'r', newline='', encoding='utf-8') as file:
+        if path.endswith(('.jsonl', '.ndjson')):
+            for line_no, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_no, json.loads(line)
+                except ValueError:
+                    yield line_no, line.strip()
+        else:
+            for line_no, record in enumerate(csv.DictReader(file), 2):
+                yield line_no, record
+
+
+def to_row(record, images):
+    """
+    Validate one record and convert it to a results row (HEADERS order).
+
+    Returns:
+    - (list, None) for a valid record, (None, str) with the reason for an
+        invalid one.
+    """
+    if not isinstance(record, dict):
+        return None, 'not a JSON object'
+    fields = {}
+    for name, value in record.items():
+        field = ALIASES.get(name, ALIASES.get(str(name).strip().lower()))
+        if field is not None:
+            fields[field] = '' if value is None else str(value).strip()
+
+    user = fields.get('user', '')
+    if not user:
+        return None, 'missing user'
+    image = fields.get('image', '')
+    if not image.endswith('.tif'):
+        image += '.tif'
+    if image not in images:
+        return None, 'unknown image %s' % image
+    for field in ('primary', 'secondary'):
+        if fields.get(field) not in GRADES:
+            return None, 'invalid %s grade %r' % (field, fields.get(field))
+    try:
+        x_coord = format(float(fields.get('x', '')), ".3f")
+        y_coord = format(float(fields.get('y', '')), ".3f")
+    except ValueError:
+        return None, 'invalid coordinates'
+    dt_ = fields.get('time') or \
+        datetime.datetime.today().strftime('%Y-%m-%d %H:%M:%S')
+
+    return [dt_, user, image, fields['primary'], fields['secondary'],
+            x_coord, y_coord, fields.get('comment', '')], None
+
+
+def ingest(path, sink, images, chunk_size=CHUNK_SIZE, rejects=None,
+           progress=None):
+    """
+    Stream the records of `path` into `sink` in chunks.
+
+    Args:
+    - path (str): CSV or JSONL input file.
+    - sink: Results store with a write_rows(rows) method.
+    - images (set): Valid slide names.
+    - chunk_size (int): Records validated and written per batch.
+    - rejects (file, optional): Rejected records are written to it as JSONL
+        with their line number and reason.
+    - progress (callable, optional): Called with the running stats after
+        every chunk.
+
+    Returns:
+    - dict: rows written, rows rejected, seconds and rows per second.
+    """
+    stats = {'rows': 0, 'rejected': 0}
+    start = time.perf_counter()
+    records = read_records(path)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        rows = []
+        for line_no, record in chunk:
+            row, reason = to_row(record, images)
+            if row is None:
+                stats['rejected'] += 1
+                if rejects is not None:
+                    rejects.write(json.dumps({'line': line_no, 'reason': reason,
+                                              'record': record}) + '\n')
+            else:
+                rows.append(row)
+        if rows:
+            sink.write_rows(rows)
+        stats['rows'] += len(rows)
+        stats['seconds'] = time.perf_counter() - start
+        stats['rows_per_second'] = stats['rows'] / max(stats['seconds'], 1e-9)
+        if progress is not None:
+            progress(stats)
+    stats['seconds'] = time.perf_counter() - start
+    stats['rows_per_second'] = stats['rows'] / max(stats['seconds'], 1e-9)
+    return stats
+
+
+def main(argv=None):
+    """Command line entry point."""
+    base_path = os.path.abspath("..")
+    parser = argparse.ArgumentParser(
+        description='Ingest bulk grades into the PathoGUI results store')
+    parser.add_argument('input', help='CSV or JSONL file of grades')
+    parser.add_argument('--data', default=os.path.join(base_path, 'Data'),
+                        help='Data folder the images are validated against')
+    parser.add_argument('--results', default=os.path.join(base_path, 'Results'),
+                        help='Results folder to write to')
+    parser.add_argument('--backend', choices=['csv', 'sqlite'],
+                        help='results store (default: results_backend setting)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help='records written per batch')
+    parser.add_argument('--rejects', help='write rejected records to this JSONL file')
+    args = parser.parse_args(argv)
+
+    backend = args.backend or load_settings()['results_backend']
+    sink = open_results_store(backend, args.results)
+    images = slide_index(args.data)
+
+    def progress(stats):
+        sys.stderr.write('\r%d rows, %d rejected, %.0f rows/s'
+                         % (stats['rows'], stats['rejected'],
+                            stats['rows_per_second']))
+
+    rejects = open(args.rejects, 'w', encoding='utf-8') if args.rejects else None
+    try:
+        stats = ingest(args.input, sink, images, args.chunk_size, rejects, progress)
+    finally:
+        if rejects is not None:
+            rejects.close()
+        if hasattr(sink, 'close_connection'):
+            sink.close_connection()
+    sys.stderr.write('\n')
+    print('Ingested %d rows (%d rejected) in %.2f s, %.0f rows/s'
+          % (stats['rows'], stats['rejected'], stats['seconds'],
+             stats['rows_per_second']))
+    return stats
+
+
+if __name__ == '__main__':
+    main()
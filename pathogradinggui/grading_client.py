@@ -0,0 +1,198 @@
+"""
+GradingClient Module
+
+This module is the client of grading_server.py, used when PathoGUI runs
+as a thin client of a shared server (`python user_auth.py --server
+URL`). A GradingClient stands in for what a workstation otherwise opens
+itself:
+- the user database: verify_user and add_user, as UserDatabase does,
+  for the login dialog;
+- the results store: write_rows and results_for_user, as the stores of
+  results_store.py do, for the ResultsWriter and the session import;
+- the slides: slide_names, and open_slide returning a RemoteSlide the
+  viewers read tiles and views from.
+
+Errors answered by the server are raised as ValueError with the server's
+message and network failures as OSError, so the login dialog and the
+ResultsWriter report them as they do for the local databases (and rows
+that could not be saved stay in the grading journal). Every thread keeps
+its own persistent (keep-alive) connection to the server.
+
+Only the standard library is imported until a slide is opened, so the
+login dialog still shows before NumPy is loaded.
+
+Usage:
+    # Example usage:
+    client = GradingClient('http://127.0.0.1:8765')
+    client.verify_user('john_doe', 'password123')   # logs in
+
+    names = client.slide_names()
+    slide = client.open_slide(names[0])
+    img, extent = slide.render_view((-0.5, slide.width - 0.5),
+                                    (slide.height - 0.5, -0.5), 500, 400)
+
+    client.write_rows([['2023-12-10 10:00:00', 'john_doe', names[0],
+                        '3', '4', '10.000', '20.000', 'comment']])
+    rows = client.results_for_image(names[0])       # every user's grades
+
+    client.close_connection()
+"""
+
+import json
+import threading
+import http.client
+from urllib.parse import urlsplit, urlencode, quote
+
+
+class GradingClient:
+    """
+    Client of a GradingServer.
+
+    Args:
+    - url (str): Server URL, e.g. 'http://127.0.0.1:8765'.
+    - timeout (float): Seconds to wait for the server (opening a slide
+        for the first time builds its pyramid on the server).
+
+    Methods:
+    - verify_user(username, password), add_user(username, password):
+        As UserDatabase; verify_user logs the client in.
+    - slide_names(): Sorted names of the slides on the server.
+    - open_slide(name): RemoteSlide of a slide.
+    - tile(name, level, column, row), view(name, x_limits, y_limits,
+        out_width, out_height): Pixels of a tile / a rendered view as
+        .npy data (with the view's extent), read by RemoteSlide.
+    - write_rows(rows): Save rows of the logged in user.
+    - results_for_user(user), results_for_image(image): Saved rows.
+    - close_connection(): Close the connections to the server.
+    """
+
+    def __init__(self, url, timeout=60):
+        parts = urlsplit(url)
+        if parts.scheme != 'http' or not parts.hostname:
+            raise ValueError('Unsupported grading server URL: %s' % url)
+        self.url = url
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.token = None
+        self.user = None
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        """Return the calling thread's connection to the server."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = http.client.HTTPConnection(self.host, self.port,
+                                                    timeout=self.timeout)
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def request(self, method, path, payload=None):
+        """
+        Send a request to the server.
+
+        Args:
+        - method (str): 'GET' or 'POST'.
+        - path (str): Path and query string.
+        - payload (optional): Object sent as the JSON body.
+
+        Returns:
+        - (http.client.HTTPMessage, bytes): The answer headers and body.
+
+        Raises:
+        - ValueError: With the server's message if it refused the request.
+        - OSError: If the server could not be reached.
+        """
+        body = None if payload is None else json.dumps(payload).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        if self.token is not None:
+            headers['Authorization'] = 'Bearer ' + self.token
+        for attempt in (1, 2):
+            connection = self._connection()
+            reused = connection.sock is not None
+            try:
+                connection.request(method, path, body, headers)
+                response = connection.getresponse()
+                data = response.read()
+                break
+            except (OSError, http.client.HTTPException) as err:
+                connection.close()
+                # A kept-alive connection may have been closed by the
+                # server in the meantime: try once more on a new one
+                if attempt == 2 or not reused:
+                    raise OSError('Grading server %s unreachable: %s'
+                                  % (self.url, err)) from err
+        if response.status >= 400:
+            try:
+                message = json.loads(data)['error']
+            except (ValueError, KeyError, TypeError):
+                message = '%d %s' % (response.status, response.reason)
+            raise ValueError(message)
+        return response.headers, data
+
+    def _json(self, method, path, payload=None):
+        return json.loads(self.request(method, path, payload)[1])
+
+    def verify_user(self, username, password):
+        """
+        Log in. Returns True, or raises ValueError with the reason (wrong
+        password, unknown user) as UserDatabase.verify_user does.
+        """
+        answer = self._json('POST', '/login',
+                            {'username': username, 'password': password})
+        self.token, self.user = answer['token'], answer['user']
+        return True
+
+    def add_user(self, username, password):
+        """Create a user; raises ValueError if the name is taken."""
+        self._json('POST', '/users', {'username': username, 'password': password})
+
+    def slide_names(self):
+        """Return the sorted names of the slides on the server."""
+        return self._json('GET', '/slides')['slides']
+
+    def open_slide(self, name):
+        """Return a RemoteSlide reading the slide from the server."""
+        # NumPy is only needed once slides are shown, not for the login
+        from slide_source import RemoteSlide  # pylint: disable=import-outside-toplevel
+        return RemoteSlide(self, name, self._json('GET', '/slides/' + quote(name)))
+
+    def tile(self, name, level, column, row):
+        """Return the .npy data of one tile of a slide."""
+        return self.request('GET', '/slides/%s/tiles/%d/%d/%d'
+                            % (quote(name), level, column, row))[1]
+
+    def view(self, name, x_limits, y_limits, out_width, out_height):
+        """
+        Return the .npy data of SlideSource.render_view for a slide, and
+        the imshow extent of its pixels.
+        """
+        query = urlencode({'x0': x_limits[0], 'x1': x_limits[1],
+                           'y0': y_limits[0], 'y1': y_limits[1],
+                           'width': out_width, 'height': out_height})
+        headers, data = self.request('GET', '/slides/%s/view?%s' % (quote(name), query))
+        return data, tuple(json.loads(headers['X-Extent']))
+
+    def write_rows(self, rows):
+        """Save a batch of rows (lists in HEADERS order) of the logged in user."""
+        self._json('POST', '/results', {'rows': [list(row) for row in rows]})
+
+    def results_for_user(self, user):
+        """Return every row (in HEADERS order) of one user, oldest first."""
+        return self._json('GET', '/results?' + urlencode({'user': user}))['rows']
+
+    def results_for_image(self, image):
+        """Return every user's rows (in HEADERS order) for one slide."""
+        return self._json('GET', '/results?' + urlencode({'image': image}))['rows']
+
+    def close_connection(self):
+        """Close the connections of every thread to the server."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
@@ -0,0 +1,381 @@
+"""
+GradingJournal Module
+
+This module keeps a crash-safe journal of the grading form, so that a
+crash between choosing grades and clicking "Save" (or while a saved row
+is being written) loses nothing.
+
+Every edit of the form (slide shown, primary/secondary grade, comment,
+viewport) and every queued result row is appended to a small binary file
+as one record:
+
+    length (uint32) | crc32 (uint32) | time (float64) | kind (uint8) | value
+
+Appending is a single os.write of a few dozen bytes, cheap enough to do
+on every widget change. The records reach the OS at once, which is
+enough to survive a crash of the application; a background thread
+fsyncs them in batches (at most once per sync_interval) to also survive
+a crash of the machine.
+
+On startup the journal is replayed: the last state of the form and the
+result rows that were queued but never confirmed as written are
+returned, so the GUI can restore the form and submit the rows again. A
+torn or corrupt record at the end (a crash in the middle of an append)
+ends the replay and is cut off. The journal is then compacted, i.e.
+rewritten with only the records needed to rebuild that state. When it
+grows beyond compact_bytes, the records of the state are taken on the
+appending thread and written to a new file by the background thread, so
+neither the rewrite nor its fsync blocks the GUI; records appended in the
+meantime are carried over to the new file.
+
+Usage:
+    # Example usage:
+    journal = GradingJournal('../Results/.journal_john_doe.bin')
+    state = journal.recovered      # form and unsaved rows of the last run
+
+    journal.show_image('S001_D1.tif')
+    journal.set_field(PRIMARY, '4')
+    journal.set_viewport((0, 2000), (1500, 0))
+
+    journal.queue_row(row)         # before handing the row to the writer
+    journal.confirm_rows(1)        # once the writer reports it written
+
+    # On startup, submit the rows the last run did not write
+    for row in journal.requeue_unsaved():
+        writer.submit(row)
+
+    journal.close()
+"""
+
+import os
+import copy
+import json
+import time
+import zlib
+import struct
+import threading
+
+MAGIC = b'PGJ1'
+HEADER = struct.Struct('<IId')
+VIEWPORT = struct.Struct('<4d')
+COUNT = struct.Struct('<I')
+# Largest record accepted on replay, a longer length means a corrupt file
+MAX_RECORD = 1 << 20
+
+# Record kinds
+IMAGE = 1
+PRIMARY = 2
+SECONDARY = 3
+COMMENT = 4
+VIEWPORT_CHANGED = 5
+ROW_QUEUED = 6
+ROWS_CONFIRMED = 7
+ROWS_FAILED = 8
+
+FIELDS = {PRIMARY: 'primary', SECONDARY: 'secondary', COMMENT: 'comment'}
+
+
+def empty_state():
+    """Return the state of a form with nothing entered."""
+    return {'image': None, 'primary': ' ', 'secondary': ' ', 'comment': '',
+            'viewport': None, 'pending_rows': [], 'failed_rows': []}
+
+
+def apply_record(state, kind, value):
+    """Update a replay state with one decoded record."""
+    if kind == IMAGE:
+        # Showing a slide starts with an empty form
+        rows = state['pending_rows'], state['failed_rows']
+        state.update(empty_state())
+        state['pending_rows'], state['failed_rows'] = rows
+        state['image'] = value
+    elif kind in FIELDS:
+        state[FIELDS[kind]] = value
+    elif kind == VIEWPORT_CHANGED:
+        state['viewport'] = value
+    elif kind == ROW_QUEUED:
+        state['pending_rows'].append(value)
+    elif kind == ROWS_CONFIRMED:
+        # Rows are written in the order they were queued
+        del state['pending_rows'][:value]
+    elif kind == ROWS_FAILED:
+        state['failed_rows'].extend(state['pending_rows'][:value])
+        del state['pending_rows'][:value]
+
+
+def encode_record(kind, value, timestamp=None):
+    """Return the bytes of one record."""
+    if kind == VIEWPORT_CHANGED:
+        data = VIEWPORT.pack(*value[0], *value[1])
+    elif kind == ROW_QUEUED:
+        data = json.dumps(value).encode('utf-8')
+    elif kind in (ROWS_CONFIRMED, ROWS_FAILED):
+        data = COUNT.pack(value)
+    else:
+        data = value.encode('utf-8')
+    payload = bytes((kind,)) + data
+    return HEADER.pack(len(payload), zlib.crc32(payload),
+                       time.time() if timestamp is None else timestamp) + payload
+
+
+def decode_value(kind, data):
+    """Return the value of a record from its bytes."""
+    if kind == VIEWPORT_CHANGED:
+        values = VIEWPORT.unpack(data)
+        return (values[0], values[1]), (values[2], values[3])
+    if kind == ROW_QUEUED:
+        return json.loads(data.decode('utf-8'))
+    if kind in (ROWS_CONFIRMED, ROWS_FAILED):
+        return COUNT.unpack(data)[0]
+    return data.decode('utf-8')
+
+
+def read_records(data):
+    """
+    Decode the records of a journal (without the magic).
+
+    Returns:
+    - tuple: (list of (time, kind, value), length of the valid records).
+        Decoding stops at the first torn or corrupt record.
+    """
+    records = []
+    offset = 0
+    while offset + HEADER.size <= len(data):
+        length, crc, timestamp = HEADER.unpack_from(data, offset)
+        start = offset + HEADER.size
+        payload = data[start:start + length]
+        if not 0 < length <= MAX_RECORD or len(payload) < length or \
+                zlib.crc32(payload) != crc:
+            break
+        try:
+            value = decode_value(payload[0], payload[1:])
+        except (ValueError, struct.error):
+            break
+        records.append((timestamp, payload[0], value))
+        offset = start + length
+    return records, offset
+
+
+class GradingJournal:
+    """
+    Append-only journal of the grading form and the queued result rows.
+
+    Args:
+    - path (str): Journal file, created (with its folder) if needed.
+    - sync_interval (float): Longest time in seconds between an append
+        and the fsync that makes it durable.
+    - compact_bytes (int): Size beyond which the journal is compacted.
+
+    Methods:
+    - show_image(image), set_field(kind, text), set_viewport(x, y): Record
+        an edit of the form.
+    - queue_row(row) / confirm_rows(count) / fail_rows(count): Record a
+        result row handed to the writer, and that the oldest count rows
+        were written or could not be written.
+    - requeue_unsaved(): Queue the failed rows again and return every
+        unsaved row.
+    - sync(): fsync now.
+    - compact(): Have the background thread rewrite the journal with only
+        the current state.
+    - close(): Compact the journal if it is due, fsync and close it.
+
+    Attributes:
+    - recovered (dict): State replayed when the journal was opened, see
+        empty_state().
+    - state (dict): Current state.
+    """
+
+    def __init__(self, path, sync_interval=0.2, compact_bytes=1 << 20):
+        folder = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        self.path = path
+        self.sync_interval = sync_interval
+        self.compact_bytes = compact_bytes
+        self.size = 0
+        self._lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._stop = threading.Event()
+        self._closed = False
+        self._pending_compact = None
+
+        self.state = self._replay()
+        self.recovered = copy.deepcopy(self.state)
+        self._fd = None
+        # Cut off a torn record before anything is appended after it
+        self._compact(self._snapshot(), 0)
+        self._thread = threading.Thread(target=self._sync_loop, name='journal-sync',
+                                        daemon=True)
+        self._thread.start()
+
+    def _replay(self):
+        state = empty_state()
+        if not os.path.exists(self.path):
+            return state
+        with open(self.path, 'rb') as file:
+            data = file.read()
+        if len(data) >= len(MAGIC) and data[:len(MAGIC)] != MAGIC:
+            raise ValueError('Not a grading journal: %s' % self.path)
+        records, _ = read_records(data[len(MAGIC):])
+        for _, kind, value in records:
+            apply_record(state, kind, value)
+        return state
+
+    def _records(self):
+        """Return the records rebuilding the current state."""
+        state = self.state
+        records = []
+        if state['image'] is not None:
+            records.append((IMAGE, state['image']))
+        for kind, field in FIELDS.items():
+            if state[field] != empty_state()[field]:
+                records.append((kind, state[field]))
+        if state['viewport'] is not None:
+            records.append((VIEWPORT_CHANGED, state['viewport']))
+        records.extend((ROW_QUEUED, row) for row in state['failed_rows'])
+        if state['failed_rows']:
+            records.append((ROWS_FAILED, len(state['failed_rows'])))
+        records.extend((ROW_QUEUED, row) for row in state['pending_rows'])
+        return records
+
+    def _snapshot(self):
+        """Return the bytes of a journal holding only the current state."""
+        return MAGIC + b''.join(encode_record(kind, value)
+                                for kind, value in self._records())
+
+    def _compact(self, data, offset):
+        """
+        Replace the journal with data, a snapshot taken when it was offset
+        bytes long, followed by the records appended since. The snapshot
+        is written and fsynced without holding the lock; the new file
+        replaces the old one atomically.
+        """
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        with self._lock:
+            size = len(data)
+            if self._fd is not None and self.size > offset:
+                with open(self.path, 'rb') as old, open(tmp_path, 'ab') as file:
+                    old.seek(offset)
+                    size += file.write(old.read())
+            os.replace(tmp_path, self.path)
+            if self._fd is not None:
+                os.close(self._fd)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND |
+                               getattr(os, 'O_BINARY', 0))
+            self.size = size
+        # The carried over records are made durable by the next sync
+        self._dirty.set()
+
+    def _compact_pending(self):
+        with self._lock:
+            pending, self._pending_compact = self._pending_compact, None
+        if pending is not None:
+            self._compact(*pending)
+
+    def compact(self):
+        """
+        Have the background thread rewrite the journal with only the
+        records of the current state (taken now).
+        """
+        with self._lock:
+            self._pending_compact = (self._snapshot(), self.size)
+        self._dirty.set()
+
+    def _append(self, kind, value):
+        if self._closed:
+            return
+        apply_record(self.state, kind, value)
+        record = encode_record(kind, value)
+        with self._lock:
+            os.write(self._fd, record)
+            self.size += len(record)
+            if self.size > self.compact_bytes and self._pending_compact is None:
+                self._pending_compact = (self._snapshot(), self.size)
+        self._dirty.set()
+
+    def show_image(self, image):
+        """Record that a slide is shown, with an empty form."""
+        self._append(IMAGE, image)
+
+    def set_field(self, kind, text):
+        """Record the text of a form field (PRIMARY, SECONDARY or COMMENT)."""
+        if kind not in FIELDS:
+            raise ValueError('Unknown journal field: %s' % kind)
+        if self.state[FIELDS[kind]] != text:
+            self._append(kind, text)
+
+    def set_viewport(self, x_limits, y_limits):
+        """Record the visible region of the slide."""
+        viewport = (tuple(x_limits), tuple(y_limits))
+        if self.state['viewport'] != viewport:
+            self._append(VIEWPORT_CHANGED, viewport)
+
+    def queue_row(self, row):
+        """Record a result row before it is handed to the results writer."""
+        self._append(ROW_QUEUED, list(row))
+
+    def confirm_rows(self, count):
+        """Record that the oldest count queued rows were written."""
+        if count > 0:
+            self._append(ROWS_CONFIRMED, count)
+
+    def fail_rows(self, count):
+        """
+        Record that the oldest count queued rows could not be written. They
+        are kept, apart from the queue, until requeue_unsaved.
+        """
+        if count > 0:
+            self._append(ROWS_FAILED, count)
+
+    def requeue_unsaved(self):
+        """
+        Put the failed rows back in the queue, ahead of the queued ones,
+        and return every queued row, e.g. to submit them again on startup.
+        """
+        state = self.state
+        state['pending_rows'] = state['failed_rows'] + state['pending_rows']
+        state['failed_rows'] = []
+        self.compact()
+        return list(state['pending_rows'])
+
+    def sync(self):
+        """Make every record appended so far durable."""
+        self._dirty.clear()
+        # fsync a duplicate of the descriptor, so appends are not blocked
+        # meanwhile and a compaction may close the original
+        with self._lock:
+            fd = None if self._fd is None else os.dup(self._fd)
+        if fd is not None:
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _sync_loop(self):
+        # One fsync per sync_interval at most, whatever the number of appends
+        while not self._closed:
+            self._dirty.wait()
+            if self._closed:
+                break
+            self._compact_pending()
+            self.sync()
+            self._stop.wait(self.sync_interval)
+
+    def close(self):
+        """Compact the journal if it is due, fsync and close it."""
+        if self._closed:
+            return
+        self._closed = True
+        self._stop.set()
+        self._dirty.set()
+        self._thread.join()
+        if self._pending_compact is not None or self.size > self.compact_bytes:
+            self._compact(self._snapshot(), self.size)
+        self.sync()
+        with self._lock:
+            os.close(self._fd)
+            self._fd = None
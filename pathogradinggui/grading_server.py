@@ -0,0 +1,568 @@
+"""
+GradingServer Module
+
+This module is an optional HTTP service for grading a shared dataset
+from several workstations. Without it every workstation keeps its own
+user database next to users/User.py and writes its own Results folder,
+so graders cannot see one another's progress. A GradingServer owns the
+user database, the results database and the slides instead, and
+MainWindow runs as a thin client of it (grading_client.py, started with
+`--server URL`).
+
+The server only needs the standard library: asyncio streams accept the
+connections and parse the requests, and every request is handled on a
+pool of worker threads, so password hashing, pyramid builds and SQLite
+writes never hold up other clients. Database connections are pooled:
+a request borrows a UserDatabase, ResultsDatabase or SlideCatalog from
+a ConnectionPool for its duration, and opened slides (with their
+decoded levels) are shared between requests.
+
+API (JSON bodies and answers unless noted; every endpoint except login
+and user creation needs the "Authorization: Bearer <token>" header with
+the token returned by login):
+    POST /login                 {"username", "password"} -> {"token", "user"}
+    POST /users                 {"username", "password"} -> {"user"}
+    GET  /slides                -> {"slides": [sorted slide names]}
+    GET  /slides/<name>         -> {"shape", "dtype", "downsamples",
+                                    "level_shapes", "tile_size"}
+    GET  /slides/<name>/tiles/<level>/<column>/<row>
+                                -> the tile pixels, as a .npy file
+    GET  /slides/<name>/view?x0=&x1=&y0=&y1=&width=&height=
+                                -> SlideSource.render_view pixels as a
+                                   .npy file, their extent in the
+                                   X-Extent header
+    POST /results               {"rows": [rows in HEADERS order]} -> {"saved"}
+    GET  /results?user=<name>   -> {"rows": [...]}, oldest first
+    GET  /results?image=<name>  -> {"rows": [...]}, oldest first
+Errors are answered with {"error": message} and the status 400 (invalid
+request), 401 (not logged in, wrong password), 403 (rows of another
+user) or 404 (unknown slide or endpoint).
+
+Note:
+    Passwords and tokens are sent in clear: serve on the loopback
+    interface (the default) or on a trusted network only. Tokens are
+    kept in memory and are valid until the server stops.
+
+Usage:
+    # Serve ../Data, ../Results/results_database.db and the user database
+    # next to users/User.py on the loopback interface
+    python grading_server.py
+
+    # For other workstations
+    python grading_server.py --host 0.0.0.0 --port 8765 \\
+        --data /mnt/slides --results /mnt/results
+
+    # On each workstation
+    python user_auth.py --server http://grading-host:8765
+
+    # On a free loopback port from Python, e.g. in tests
+    server = GradingServer('../Data', '../Results', port=0)
+    url = server.start()
+    server.stop()
+"""
+
+import io
+import os
+import re
+import json
+import queue
+import logging
+import sqlite3
+import asyncio
+import secrets
+import argparse
+import threading
+import contextlib
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs, unquote
+
+import numpy as np
+
+from users.User import UserDatabase
+from results_store import ResultsDatabase, HEADERS, USER_COLUMN
+from slide_catalog import SlideCatalog, is_slide
+from slide_source import SlideSource
+from image_cache import DecodedImageCache
+from settings import load_settings
+
+DEFAULT_PORT = 8765
+MAX_BODY = 16 * 2**20      # largest request body, in bytes
+MAX_OPEN_SLIDES = 32       # slides kept open between requests
+
+LOG = logging.getLogger(__name__)
+
+Request = namedtuple('Request', 'method path query headers body')
+
+
+class HttpError(Exception):
+    """Error answered with the given HTTP status and message."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ConnectionPool:
+    """
+    Pool of database objects shared by the worker threads of the server.
+
+    Args:
+    - factory (callable): Returns a new database object with a
+        close_connection() method, e.g. a ResultsDatabase.
+    - size (int): Most objects open at once. They are opened when
+        first needed.
+
+    Methods:
+    - connection(): Context manager lending one object to the calling
+        thread, waiting for one to be returned if size are lent.
+    - close(): Close every object of the pool.
+    """
+
+    def __init__(self, factory, size=4):
+        self.factory = factory
+        self.size = size
+        self.opened = 0
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Lend a database object for the duration of a with block."""
+        try:
+            item = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self.opened < self.size
+                if create:
+                    self.opened += 1
+            item = None
+            if create:
+                try:
+                    item = self.factory()
+                finally:
+                    if item is None:
+                        with self._lock:
+                            self.opened -= 1
+            else:
+                item = self._idle.get()
+        try:
+            yield item
+        finally:
+            self._idle.put(item)
+
+    def close(self):
+        """Close the objects of the pool (all of them must be returned)."""
+        while True:
+            try:
+                item = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            item.close_connection()
+            with self._lock:
+                self.opened -= 1
+
+
+class GradingServer:
+    """
+    GradingServer Class
+
+    HTTP service owning the users, slides and results of a shared
+    dataset (see the module docstring for the API).
+
+    Args:
+    - data_path (str): Folder of the slides.
+    - results_path (str): Folder of results_database.db, created with
+        the database on the first request that needs it.
+    - user_db_path (str, optional): User database file. By default the
+        one next to users/User.py, which the workstations used so far.
+    - host (str): Interface to listen on.
+    - port (int): Port to listen on; 0 picks a free one.
+    - workers (int): Worker threads handling the requests.
+    - pool_size (int): Most open connections to each database.
+    - cache_mb (int): Memory budget of the decoded slide levels, in MiB.
+    - hash_algorithm, hash_params: Password hash for new users and
+        upgraded logins, as in UserDatabase.
+
+    Methods:
+    - start(): Serve on a background thread. Returns the server URL.
+    - stop(): Stop serving and close the databases.
+    - serve_forever(): Serve on the calling thread until interrupted.
+    """
+
+    def __init__(self, data_path, results_path, user_db_path=None,
+                 host='127.0.0.1', port=DEFAULT_PORT, workers=8, pool_size=4,
+                 cache_mb=512, hash_algorithm='pbkdf2_sha256', hash_params=None):
+        self.data_path = os.path.abspath(data_path)
+        self.host = host
+        self.port = port
+        self.image_cache = DecodedImageCache(cache_mb * 2**20)
+
+        def open_users():
+            if user_db_path is None:
+                return UserDatabase(algorithm=hash_algorithm, params=hash_params)
+            return UserDatabase(os.path.abspath(user_db_path),
+                                algorithm=hash_algorithm, params=hash_params)
+        results_db_path = os.path.join(results_path, 'results_database.db')
+        self.users = ConnectionPool(open_users, pool_size)
+        self.results = ConnectionPool(lambda: ResultsDatabase(results_db_path),
+                                      pool_size)
+        self.catalogs = ConnectionPool(SlideCatalog, pool_size)
+
+        self._workers = workers
+        self._executor = None
+        self._tokens = {}
+        self._tokens_lock = threading.Lock()
+        # name -> [lock, SlideSource], least recently used first
+        self._slides = OrderedDict()
+        self._slides_lock = threading.Lock()
+        self._routes = [(method, re.compile(pattern), handler) for method, pattern, handler in [
+            ('POST', r'/login', self._login),
+            ('POST', r'/users', self._create_user),
+            ('GET', r'/slides', self._list_slides),
+            ('GET', r'/slides/([^/]+)', self._slide_info),
+            ('GET', r'/slides/([^/]+)/tiles/(\d+)/(\d+)/(\d+)', self._slide_tile),
+            ('GET', r'/slides/([^/]+)/view', self._slide_view),
+            ('POST', r'/results', self._save_results),
+            ('GET', r'/results', self._query_results),
+        ]]
+        self._loop = None
+        self._server = None
+        self._writers = set()
+        self._thread = None
+        self._error = None
+
+    @property
+    def url(self):
+        """URL of the running server, e.g. http://127.0.0.1:8765."""
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return 'http://%s:%d' % (host, port)
+
+    def start(self):
+        """
+        Serve on a background thread; return the server URL once it is
+        listening.
+
+        Raises:
+        - OSError: If the port cannot be bound.
+        """
+        started = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(started,),
+                                        name='grading-server', daemon=True)
+        self._thread.start()
+        started.wait()
+        if self._error is not None:
+            self._thread.join()
+            raise self._error
+        return self.url
+
+    def stop(self):
+        """Stop serving, wait for the requests being handled, close the databases."""
+        if self._thread is not None and self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+        self._close()
+
+    def serve_forever(self):
+        """Serve on the calling thread until interrupted (Ctrl+C)."""
+        started = threading.Event()
+        try:
+            self._run(started, on_start=lambda: print('Serving on %s' % self.url,
+                                                      flush=True))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._close()
+        if self._error is not None:
+            raise self._error
+
+    def _run(self, started, on_start=None):
+        self._executor = ThreadPoolExecutor(self._workers,
+                                            thread_name_prefix='grading-worker')
+        loop = self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            self._server = loop.run_until_complete(asyncio.start_server(
+                self._handle_connection, self.host, self.port))
+        except OSError as err:
+            self._error = err
+            loop.close()
+            started.set()
+            return
+        started.set()
+        if on_start is not None:
+            on_start()
+        try:
+            loop.run_forever()
+        finally:
+            # Close the client connections: their handlers finish the
+            # request being handled and stop at the end of the stream
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            loop.run_until_complete(asyncio.gather(*asyncio.all_tasks(loop),
+                                                   return_exceptions=True))
+            loop.run_until_complete(self._server.wait_closed())
+            loop.close()
+
+    def _close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        for pool in (self.users, self.results, self.catalogs):
+            pool.close()
+
+    async def _handle_connection(self, reader, writer):
+        """Answer the requests of one (keep-alive) connection in turn."""
+        loop = asyncio.get_running_loop()
+        self._writers.add(writer)
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HttpError as err:
+                    writer.write(self._response(*self._json(err.status, {'error': str(err)}),
+                                                keep_alive=False))
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                answer = await loop.run_in_executor(self._executor, self._dispatch,
+                                                    request)
+                keep_alive = request.headers.get('connection', '').lower() != 'close'
+                writer.write(self._response(*answer, keep_alive=keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader):
+        """Read one request; return None at the end of the connection."""
+        try:
+            line = await reader.readline()
+            if not line:
+                return None
+            parts = line.decode('latin-1').split()
+            if len(parts) != 3:
+                raise HttpError(400, 'Malformed request line')
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length') or 0)
+        except ValueError as err:
+            raise HttpError(400, 'Malformed request: %s' % err)
+        if length > MAX_BODY:
+            raise HttpError(413, 'Request body larger than %d bytes' % MAX_BODY)
+        body = await reader.readexactly(length) if length > 0 else b''
+        target = urlsplit(parts[1])
+        query = {name: values[-1] for name, values in parse_qs(target.query).items()}
+        return Request(parts[0], unquote(target.path), query, headers, body)
+
+    def _dispatch(self, request):
+        """Run the handler of a request; return (status, headers, body)."""
+        allowed = []
+        for method, pattern, handler in self._routes:
+            match = pattern.fullmatch(request.path)
+            if match is None:
+                continue
+            if method != request.method:
+                allowed.append(method)
+                continue
+            try:
+                return handler(request, *match.groups())
+            except HttpError as err:
+                return self._json(err.status, {'error': str(err)})
+            except KeyError as err:
+                return self._json(400, {'error': 'Missing field: %s' % err})
+            except (ValueError, TypeError) as err:
+                return self._json(400, {'error': str(err)})
+            except (OSError, sqlite3.Error) as err:
+                return self._json(500, {'error': str(err)})
+            except Exception as err:  # pylint: disable=broad-except
+                # A bug in a handler must not leave the client waiting
+                LOG.exception('Error handling %s %s', request.method, request.path)
+                return self._json(500, {'error': 'Internal server error: %s'
+                                        % type(err).__name__})
+        if allowed:
+            return self._json(405, {'error': 'Use %s' % ' or '.join(allowed)})
+        return self._json(404, {'error': 'No such endpoint: %s' % request.path})
+
+    @staticmethod
+    def _response(status, headers, body, keep_alive=True):
+        lines = ['HTTP/1.1 %d %s' % (status, HTTPStatus(status).phrase),
+                 'Content-Length: %d' % len(body),
+                 'Connection: %s' % ('keep-alive' if keep_alive else 'close')]
+        lines += ['%s: %s' % item for item in headers.items()]
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
+
+    @staticmethod
+    def _json(status, answer):
+        return status, {'Content-Type': 'application/json'}, \
+            json.dumps(answer).encode('utf-8')
+
+    @staticmethod
+    def _array(array, headers=None):
+        buffer = io.BytesIO()
+        np.save(buffer, array, allow_pickle=False)
+        return 200, dict(headers or {}, **{'Content-Type': 'application/x-npy'}), \
+            buffer.getvalue()
+
+    @staticmethod
+    def _payload(request):
+        payload = json.loads(request.body or b'{}')
+        if not isinstance(payload, dict):
+            raise ValueError('expected a JSON object')
+        return payload
+
+    def _credentials(self, request):
+        payload = self._payload(request)
+        username, password = payload['username'], payload['password']
+        if not isinstance(username, str) or not isinstance(password, str) \
+                or not username:
+            raise ValueError('username and password must be non-empty strings')
+        return username, password
+
+    def _user(self, request):
+        """Return the user a request's token was issued to."""
+        scheme, _, token = request.headers.get('authorization', '').partition(' ')
+        with self._tokens_lock:
+            user = self._tokens.get(token) if scheme == 'Bearer' else None
+        if user is None:
+            raise HttpError(401, 'Not logged in')
+        return user
+
+    def _login(self, request):
+        username, password = self._credentials(request)
+        with self.users.connection() as user_db:
+            try:
+                user_db.verify_user(username, password)
+            except ValueError as err:
+                raise HttpError(401, str(err))
+        token = secrets.token_urlsafe(32)
+        with self._tokens_lock:
+            self._tokens[token] = username
+        return self._json(200, {'token': token, 'user': username})
+
+    def _create_user(self, request):
+        username, password = self._credentials(request)
+        with self.users.connection() as user_db:
+            user_db.add_user(username, password)
+        return self._json(201, {'user': username})
+
+    def _list_slides(self, request):
+        self._user(request)
+        with self.catalogs.connection() as catalog:
+            catalog.refresh(self.data_path)
+            return self._json(200, {'slides': catalog.names(self.data_path)})
+
+    def _slide(self, name):
+        """Return the open SlideSource of a slide of the Data folder."""
+        path = os.path.join(self.data_path, name)
+        if not is_slide(name) or not os.path.isfile(path):
+            raise HttpError(404, 'No such slide: %s' % name)
+        with self._slides_lock:
+            entry = self._slides.get(name)
+            if entry is None:
+                entry = self._slides[name] = [threading.Lock(), None]
+            self._slides.move_to_end(name)
+            while len(self._slides) > MAX_OPEN_SLIDES:
+                self._slides.popitem(last=False)
+        # Requests for a slide being opened wait for its pyramid
+        with entry[0]:
+            if entry[1] is None:
+                entry[1] = SlideSource(path, image_cache=self.image_cache)
+            return entry[1]
+
+    def _slide_info(self, request, name):
+        self._user(request)
+        slide = self._slide(name)
+        return self._json(200, {
+            'shape': list(slide.shape), 'dtype': slide.dtype.str,
+            'downsamples': slide.downsamples,
+            'level_shapes': [list(shape) for shape in slide.level_shapes],
+            'tile_size': slide.tile_size})
+
+    def _slide_tile(self, request, name, level, column, row):
+        self._user(request)
+        slide = self._slide(name)
+        level, column, row = int(level), int(column), int(row)
+        if level >= slide.level_count or \
+                row * slide.tile_size >= slide.level_shapes[level][0] or \
+                column * slide.tile_size >= slide.level_shapes[level][1]:
+            raise HttpError(404, 'No such tile: %d/%d/%d' % (level, column, row))
+        return self._array(slide.read_tile(level, column, row))
+
+    def _slide_view(self, request, name):
+        self._user(request)
+        slide = self._slide(name)
+        query = {key: float(request.query[key])
+                 for key in ('x0', 'x1', 'y0', 'y1', 'width', 'height')}
+        pixels, extent = slide.render_view((query['x0'], query['x1']),
+                                           (query['y0'], query['y1']),
+                                           query['width'], query['height'])
+        return self._array(pixels, {'X-Extent': json.dumps([float(value)
+                                                            for value in extent])})
+
+    def _save_results(self, request):
+        user = self._user(request)
+        rows = self._payload(request)['rows']
+        if not isinstance(rows, list) or not all(
+                isinstance(row, list) and len(row) == len(HEADERS) for row in rows):
+            raise ValueError('rows must be lists of %d values' % len(HEADERS))
+        if any(row[USER_COLUMN] != user for row in rows):
+            raise HttpError(403, 'Rows of another user than %s' % user)
+        rows = [[str(value) for value in row] for row in rows]
+        with self.results.connection() as results_db:
+            results_db.write_rows(rows)
+        return self._json(200, {'saved': len(rows)})
+
+    def _query_results(self, request):
+        self._user(request)
+        with self.results.connection() as results_db:
+            if 'user' in request.query:
+                rows = results_db.results_for_user(request.query['user'])
+            else:
+                rows = results_db.results_for_image(request.query['image'])
+        return self._json(200, {'rows': rows})
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(
+        description='Serve the users, slides and results of PathoGUI to thin clients')
+    parser.add_argument('--data', default=os.path.join('..', 'Data'),
+                        help='slide folder (default: ../Data)')
+    parser.add_argument('--results', default=os.path.join('..', 'Results'),
+                        help='folder of results_database.db (default: ../Results)')
+    parser.add_argument('--user-db', dest='user_db',
+                        help='user database (default: users/user_database.db)')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='interface to listen on (default: loopback only)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=8,
+                        help='threads handling requests')
+    parser.add_argument('--pool-size', type=int, default=4, dest='pool_size',
+                        help='connections to each database')
+    args, rest = parser.parse_known_args()
+    # --cache-mb and --hash-algorithm, or the settings file, as for the GUI
+    settings = load_settings(rest)
+
+    server = GradingServer(args.data, args.results, args.user_db, host=args.host,
+                           port=args.port, workers=args.workers,
+                           pool_size=args.pool_size, cache_mb=settings['cache_mb'],
+                           hash_algorithm=settings['hash_algorithm'],
+                           hash_params=settings['hash_params'])
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+DecodedImageCache Module
+
+This module provides a memory-bounded LRU cache for decoded slide data.
+Entries are keyed on (path, mtime, resolution level), so a slide that is
+modified on disk is never served stale, and eviction is driven by the
+total number of bytes held rather than by the number of entries. This
+keeps memory flat over a long grading session while making it instant to
+go back to a slide that was just graded.
+
+Usage:
+    # Example usage:
+    cache = DecodedImageCache(max_bytes=512 * 2**20)
+
+    key = cache_key('../Data/S001_D1.tif', level=2)
+    pixels = cache.get(key)
+    if pixels is None:
+        pixels = decode(...)
+        cache.put(key, pixels)
+
+    print(cache.stats())
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+
+def cache_key(image_path, level):
+    """Return the cache key of one resolution level of a slide."""
+    return (os.path.abspath(image_path), os.stat(image_path).st_mtime_ns,
+            level)
+
+
+class DecodedImageCache:
+    """
+    DecodedImageCache Class
+
+    Thread-safe LRU cache of NumPy arrays bounded by their total size.
+
+    Args:
+    - max_bytes (int): Byte budget. Entries larger than the whole budget
+        are not cached at all.
+
+    Methods:
+    - get(key): Return the cached array and mark it most recently used,
+        or None.
+    - put(key, array): Add an array, evicting least recently used entries
+        until the total size fits in the budget.
+    - clear(): Drop every entry.
+    - stats(): Return the hit, miss and eviction counters and the number
+        of bytes currently held.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        """Return the cached array for `key`, or None."""
+        with self._lock:
+            array = self._entries.get(key)
+            if array is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return array
+
+    def put(self, key, array):
+        """
+        Cache `array` under `key`.
+
+        Returns True if the array was cached, False if it is larger than
+        the whole budget.
+        """
+        size = array.nbytes
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old.nbytes
+            self._entries[key] = array
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+                self.evictions += 1
+        return True
+
+    def clear(self):
+        """Drop every cached array."""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """Return the cache counters as a dictionary."""
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'entries': len(self._entries),
+                'bytes': self.current_bytes, 'max_bytes': self.max_bytes}
@@ -7,7 +7,9 @@ It includes a LoginDialog class that inherits from QDialog and
 provides the following features:
 - Username and password input fields with labels
 - Login and Create New User buttons with corresponding actions
-- Authentication against a user database (provided during initialization)
+- Authentication against a user database (provided during initialization),
+  run on a QThreadPool worker so the dialog stays responsive while the
+  password hash is computed
 - Handling and display of error and information messages using QMessageBox
 - Optionally linked to a main window for integration into larger applications
 
@@ -22,8 +24,65 @@ Usage:
     obtain the authenticated user.
 """
 import sys
+import sqlite3
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
 from PyQt5.QtWidgets import QDialog, QLabel, QLineEdit, QPushButton, \
-    QVBoxLayout, QMessageBox
+    QVBoxLayout, QMessageBox, QProgressBar
+
+import perf_log
+
+
+class AuthSignals(QObject):
+    """
+    Signals of an AuthTask.
+
+    Signals:
+    - finished(str, str, bool, str): Emitted with the task's action
+        ('login' or 'create'), the username it checked, whether it
+        succeeded, and an error message on failure.
+    """
+    finished = pyqtSignal(str, str, bool, str)
+
+
+class AuthTask(QRunnable):
+    """
+    QRunnable running a password verification or user creation off the
+    Qt main thread.
+
+    Args:
+    - action (str): 'login' to call user_db.verify_user, 'create' to call
+        user_db.add_user.
+    - user_db (UserDatabase): The user database.
+    - username (str), password (str): The credentials.
+    """
+
+    def __init__(self, action, user_db, username, password):
+        super().__init__()
+        self.action = action
+        self.user_db = user_db
+        self.username = username
+        self.password = password
+        self.signals = AuthSignals()
+
+    def run(self):
+        """
+        Hash the password and report the outcome through signals. The
+        finished signal is always emitted, so the dialog never stays busy.
+        """
+        ok, message = False, ''
+        try:
+            with perf_log.timed('login_hash'):
+                if self.action == 'login':
+                    ok = bool(self.user_db.verify_user(self.username, self.password))
+                else:
+                    self.user_db.add_user(self.username, self.password)
+                    ok = True
+        except (ValueError, OSError, sqlite3.Error) as err:
+            message = str(err)
+        except Exception as err:  # pylint: disable=broad-except
+            message = '%s: %s' % (type(err).__name__, err)
+        finally:
+            self.signals.finished.emit(self.action, self.username, ok, message)
 
 
 class LoginDialog(QDialog):
@@ -50,6 +109,9 @@ class LoginDialog(QDialog):
         with echo mode set to Password.
     - login_button (QPushButton): Button to initiate authentication.
     - new_user_button (QPushButton): Button to initiate new user creation.
+    - progress (QProgressBar): Busy indicator shown while a password is
+        being hashed on the worker thread.
+    - thread_pool (QThreadPool): Pool running the AuthTask workers.
 
     Methods:
     - authenticate_user(): Method triggered when the login_button is clicked,
@@ -61,6 +123,8 @@ class LoginDialog(QDialog):
     - show_info_message(title: str, message: str): Displays an informational
         message using QMessageBox.
     - set_main_window(main_window: QWidget): Sets the main window reference.
+    - on_auth_finished(action: str, username: str, ok: bool, message: str):
+        Handles the result of an AuthTask on the GUI thread.
     """
     def __init__(self, user_db, main_window=None):
         """
@@ -103,6 +167,14 @@ class LoginDialog(QDialog):
         self.new_user_button = QPushButton('Create New User')
         self.new_user_button.clicked.connect(self.create_new_user)
 
+        # Busy indicator shown while a password is hashed
+        self.progress = QProgressBar()
+        self.progress.setRange(0, 0)
+        self.progress.setTextVisible(False)
+        self.progress.hide()
+        self.thread_pool = QThreadPool.globalInstance()
+        self.task = None
+
         layout = QVBoxLayout()
         layout.addWidget(self.username_label)
         layout.addWidget(self.username_input)
@@ -110,6 +182,7 @@ class LoginDialog(QDialog):
         layout.addWidget(self.password_input)
         layout.addWidget(self.login_button)
         layout.addWidget(self.new_user_button)
+        layout.addWidget(self.progress)
 
         self.setLayout(layout)
 
@@ -117,15 +190,11 @@ class LoginDialog(QDialog):
         """
         Attempt to authenticate the user using the provided credentials.
 
-        Retrieves the username and password from the input fields, attempts
-        to verify
-        the user against the user database, and updates the current_user
-        attribute if
-        authentication is successful. Shows an error message if
-        authentication fails.
-
-        Raises:
-        - ValueError: If an error occurs during the authentication process.
+        Retrieves the username and password from the input fields and
+        verifies them against the user database on a worker thread. The
+        current_user attribute is updated and the dialog accepted in
+        on_auth_finished if authentication is successful; an error message
+        is shown if it fails.
 
         Example:
         ```python
@@ -133,32 +202,17 @@ class LoginDialog(QDialog):
         login_dialog.authenticate_user()
         ```
         """
-        username = self.username_input.text()
-        password = self.password_input.text()
-
-        try:
-            if self.user_db.verify_user(username, password):
-                self.current_user = username
-                self.accept()
-            else:
-                self.show_error_message('Authentication Failed',
-                                        'Invalid username or password.')
-        except ValueError as err:
-            self.show_error_message('Error', str(err))
+        self.start_task('login')
 
     def create_new_user(self):
         """
         Create a new user and handle potential errors.
 
-        Retrieves the username and password from the input fields, attempts
-        to add
-        a new user to the user database, and shows an informational message
-        on success.
-        If an error occurs during the creation process, a corresponding
-        error message is displayed.
-
-        Raises:
-        - ValueError: If an error occurs during the user creation process.
+        Retrieves the username and password from the input fields and adds
+        a new user to the user database on a worker thread. An
+        informational message is shown on success; if an error occurs
+        during the creation process, a corresponding error message is
+        displayed.
 
         Example:
         ```python
@@ -166,16 +220,59 @@ class LoginDialog(QDialog):
         login_dialog.create_new_user()
         ```
         """
-        username = self.username_input.text()
-        password = self.password_input.text()
+        self.start_task('create')
 
-        try:
-            self.user_db.add_user(username, password)
+    def start_task(self, action):
+        """
+        Run a login or user creation on the thread pool.
+
+        Args:
+        - action (str): 'login' or 'create'.
+
+        Disables the inputs and buttons and shows the busy indicator until
+        on_auth_finished is called with the result.
+        """
+        task = AuthTask(action, self.user_db, self.username_input.text(),
+                        self.password_input.text())
+        task.signals.finished.connect(self.on_auth_finished)
+        self.task = task  # keep the signals alive until the task reports
+        self.set_busy(True)
+        self.thread_pool.start(task)
+
+    def set_busy(self, busy):
+        """
+        Show or hide the busy indicator and disable the inputs and buttons
+        while a password is being hashed.
+        """
+        self.username_input.setEnabled(not busy)
+        self.password_input.setEnabled(not busy)
+        self.login_button.setEnabled(not busy)
+        self.new_user_button.setEnabled(not busy)
+        self.progress.setVisible(busy)
+
+    def on_auth_finished(self, action, username, ok, message):
+        """
+        Handle the result of an AuthTask on the GUI thread.
+
+        Args:
+        - action (str): 'login' or 'create'.
+        - username (str): The username the task checked.
+        - ok (bool): Whether the action succeeded.
+        - message (str): The error message if it did not.
+        """
+        self.set_busy(False)
+        if message:
+            self.show_error_message('Error', message)
+        elif action == 'create':
             self.show_info_message('User Created',
                                    'New user created successfully. \
                                    Please log in.')
-        except ValueError as err:
-            self.show_error_message('Error', str(err))
+        elif ok:
+            self.current_user = username
+            self.accept()
+        else:
+            self.show_error_message('Authentication Failed',
+                                    'Invalid username or password.')
 
     def show_error_message(self, title, message):
         """
@@ -236,7 +333,7 @@ class LoginDialog(QDialog):
         self.main_window = main_window  # Set main_window
 
 
-def show_login_dialog(user_db, main_window):
+def show_login_dialog(user_db, main_window=None):
     """
     Attempt to authenticate the user using the provided credentials.
 
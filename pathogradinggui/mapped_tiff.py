@@ -0,0 +1,258 @@
+"""
+MappedTiff Module
+
+This module gives zero-copy access to the pixels of uncompressed TIFF
+files. Instead of decoding the whole slide through Pillow into a fresh
+array (what matplotlib.image.imread does), the TIFF header is parsed and
+the pixel data is exposed as a memory map of the file, so only the pages
+of the region that is actually read are faulted in.
+
+Two layouts are supported, in classic TIFF and BigTIFF files:
+- Uncompressed strips stored back to back (the usual layout written by
+  Pillow and tifffile): the image is a plain numpy.memmap of shape
+  (height, width[, samples]).
+- Uncompressed tiles, or strips that are not contiguous: the image is a
+  TiledTiffArray, which maps the file once and copies only the tiles a
+  slice intersects.
+Compressed, planar, palette or bit-packed images are not mappable and
+map_tiff returns None; callers fall back to decoding them.
+
+resident_bytes reports how much of a mapped file (or of the whole
+process) is resident in memory, to check the savings on large slides.
+
+Usage:
+    # Example usage:
+    pixels = map_tiff('../Data/S001_D1.tif')
+    if pixels is not None:
+        region = np.asarray(pixels[1000:1512, 2000:2512])
+        print(resident_bytes('../Data/S001_D1.tif'))
+"""
+
+import os
+import struct
+import numpy as np
+
+# TIFF field types -> struct format
+FIELD_FORMATS = {1: 'B', 3: 'H', 4: 'I', 6: 'b', 8: 'h', 9: 'i', 16: 'Q',
+                 17: 'q', 18: 'Q'}
+
+TAGS = {
+    256: 'width', 257: 'height', 258: 'bits_per_sample', 259: 'compression',
+    262: 'photometric', 273: 'strip_offsets', 277: 'samples_per_pixel',
+    278: 'rows_per_strip', 279: 'strip_byte_counts', 284: 'planar_config',
+    317: 'predictor', 322: 'tile_width', 323: 'tile_length',
+    324: 'tile_offsets', 325: 'tile_byte_counts', 339: 'sample_format',
+}
+
+# SampleFormat -> numpy kind
+SAMPLE_KINDS = {1: 'u', 2: 'i', 3: 'f'}
+
+
+def read_tiff_tags(path):
+    """
+    Return the byte order ('<' or '>') and the integer tags of the first
+    image of a TIFF file, by name (see TAGS). Tags with one value are
+    returned as ints, others as tuples.
+
+    Raises:
+    - ValueError: If the file is not a TIFF file.
+    """
+    with open(path, 'rb') as file:
+        header = file.read(16)
+        if header[:2] == b'II':
+            order = '<'
+        elif header[:2] == b'MM':
+            order = '>'
+        else:
+            raise ValueError('Not a TIFF file: %s' % path)
+        magic = struct.unpack(order + 'H', header[2:4])[0]
+        if magic == 42:
+            offset = struct.unpack(order + 'I', header[4:8])[0]
+            count_format, entry_format, inline = 'H', 'HHI4s', 4
+        elif magic == 43:
+            offset = struct.unpack(order + 'Q', header[8:16])[0]
+            count_format, entry_format, inline = 'Q', 'HHQ8s', 8
+        else:
+            raise ValueError('Not a TIFF file: %s' % path)
+
+        file.seek(offset)
+        count_size = struct.calcsize(count_format)
+        count = struct.unpack(order + count_format, file.read(count_size))[0]
+        entry_size = struct.calcsize(order + entry_format)
+        entries = file.read(count * entry_size)
+
+        tags = {}
+        for index in range(count):
+            tag, field_type, values, data = struct.unpack_from(
+                order + entry_format, entries, index * entry_size)
+            if tag not in TAGS or field_type not in FIELD_FORMATS:
+                continue
+            value_format = '%d%s' % (values, FIELD_FORMATS[field_type])
+            size = struct.calcsize(value_format)
+            if size > inline:
+                file.seek(struct.unpack(order + ('I' if inline == 4 else 'Q'),
+                                        data)[0])
+                data = file.read(size)
+            value = struct.unpack(order + value_format, data[:size])
+            tags[TAGS[tag]] = value[0] if values == 1 else value
+    return order, tags
+
+
+def _as_tuple(value):
+    return value if isinstance(value, tuple) else (value,)
+
+
+class TiledTiffArray:
+    """
+    Read-only, array-like view of an image stored as uncompressed tiles
+    (or non-contiguous strips) of a memory-mapped file.
+
+    Slicing with up to two slices (steps of 1) returns a new numpy array
+    holding only the requested region; only the tiles it intersects are
+    read. np.asarray(tiled) reads the whole image.
+
+    Args:
+    - path (str): File holding the tiles.
+    - shape (tuple): Image shape, (height, width[, samples]).
+    - dtype (numpy.dtype): Sample type, including byte order.
+    - tile_shape (tuple): (tile_length, tile_width) of every tile.
+    - offsets (tuple): File offset of each tile, row by row.
+    """
+
+    def __init__(self, path, shape, dtype, tile_shape, offsets):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.tile_shape = tuple(tile_shape)
+        self.offsets = offsets
+        self.tiles_across = -(-self.shape[1] // self.tile_shape[1])
+        self._file = np.memmap(path, dtype=np.uint8, mode='r')
+
+    @property
+    def ndim(self):
+        """Number of array dimensions."""
+        return len(self.shape)
+
+    @property
+    def nbytes(self):
+        """Size of the whole image in bytes."""
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    def __len__(self):
+        return self.shape[0]
+
+    def tile(self, tile_row, tile_column):
+        """Return one tile as a view of the memory map."""
+        tile_length, tile_width = self.tile_shape
+        rows = min(tile_length, self.shape[0] - tile_row * tile_length)
+        offset = self.offsets[tile_row * self.tiles_across + tile_column]
+        return np.ndarray((rows, tile_width) + self.shape[2:], dtype=self.dtype,
+                          buffer=self._file, offset=offset)
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) > 2 or not all(isinstance(k, slice) for k in key):
+            raise IndexError('TiledTiffArray only supports row/column slices')
+        key = key + (slice(None),) * (2 - len(key))
+        (row0, row1, row_step), (col0, col1, col_step) = \
+            (k.indices(n) for k, n in zip(key, self.shape))
+        if row_step != 1 or col_step != 1:
+            raise IndexError('TiledTiffArray does not support slice steps')
+        row1, col1 = max(row1, row0), max(col1, col0)
+
+        out = np.empty((row1 - row0, col1 - col0) + self.shape[2:],
+                       dtype=self.dtype)
+        tile_length, tile_width = self.tile_shape
+        for tile_row in range(row0 // tile_length, -(-row1 // tile_length)):
+            top = tile_row * tile_length
+            for tile_column in range(col0 // tile_width, -(-col1 // tile_width)):
+                left = tile_column * tile_width
+                tile = self.tile(tile_row, tile_column)
+                r0, r1 = max(row0, top), min(row1, top + tile.shape[0])
+                c0, c1 = max(col0, left), min(col1, left + tile_width)
+                out[r0 - row0:r1 - row0, c0 - col0:c1 - col0] = \
+                    tile[r0 - top:r1 - top, c0 - left:c1 - left]
+        return out
+
+    def __array__(self, dtype=None, copy=None):
+        data = self[:, :]
+        return data if dtype is None else data.astype(dtype)
+
+
+def map_tiff(path):
+    """
+    Return the pixels of an uncompressed TIFF file as a numpy.memmap (or a
+    TiledTiffArray), without reading them.
+
+    Returns:
+    - numpy.memmap, TiledTiffArray or None: None if the file is not a TIFF
+        file or its layout cannot be mapped.
+    """
+    try:
+        order, tags = read_tiff_tags(path)
+    except (OSError, ValueError, struct.error):
+        return None
+
+    samples = tags.get('samples_per_pixel', 1)
+    bits = set(_as_tuple(tags.get('bits_per_sample', 1)))
+    kind = SAMPLE_KINDS.get(_as_tuple(tags.get('sample_format', 1))[0])
+    if tags.get('compression', 1) != 1 or tags.get('predictor', 1) != 1 or \
+            (samples > 1 and tags.get('planar_config', 1) != 1) or \
+            tags.get('photometric') not in (1, 2) or \
+            len(bits) != 1 or kind is None or 'width' not in tags:
+        return None
+    bits = bits.pop()
+    if bits not in (8, 16, 32, 64):
+        return None
+    dtype = np.dtype('%s%s%d' % (order, kind, bits // 8))
+    height, width = tags['height'], tags['width']
+    shape = (height, width) + ((samples,) if samples > 1 else ())
+    row_bytes = width * samples * dtype.itemsize
+
+    if 'tile_offsets' in tags:
+        return TiledTiffArray(path, shape, dtype,
+                              (tags['tile_length'], tags['tile_width']),
+                              _as_tuple(tags['tile_offsets']))
+    if 'strip_offsets' not in tags:
+        return None
+    offsets = _as_tuple(tags['strip_offsets'])
+    rows_per_strip = min(tags.get('rows_per_strip', height), height)
+    contiguous = all(offset == offsets[0] + k * rows_per_strip * row_bytes
+                     for k, offset in enumerate(offsets))
+    if not contiguous:
+        return TiledTiffArray(path, shape, dtype, (rows_per_strip, width),
+                              offsets)
+    if offsets[0] + height * row_bytes > os.path.getsize(path):
+        return None
+    return np.memmap(path, dtype=dtype, mode='r', offset=offsets[0],
+                     shape=shape)
+
+
+def resident_bytes(path=None):
+    """
+    Return the number of bytes resident in memory for the mappings of one
+    file, or for the whole process if no path is given. Returns None where
+    /proc is not available (non-Linux systems).
+    """
+    try:
+        if path is None:
+            with open('/proc/self/status', 'r', encoding='utf-8') as file:
+                for line in file:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) * 1024
+            return None
+        path = os.path.realpath(path)
+        total = 0
+        in_mapping = False
+        with open('/proc/self/smaps', 'r', encoding='utf-8') as file:
+            for line in file:
+                fields = line.split()
+                if '-' in fields[0] and not fields[0].endswith(':'):
+                    # Mapping header: address perms offset dev inode [path]
+                    in_mapping = len(fields) >= 6 and \
+                        line.split(None, 5)[5].strip() == path
+                elif in_mapping and fields[0] == 'Rss:':
+                    total += int(fields[1]) * 1024
+        return total
+    except OSError:
+        return None
@@ -0,0 +1,282 @@
+"""
+Parquet Export Module
+
+This module exports the grading results to a Parquet dataset for
+downstream pipelines, so they read typed columns instead of re-parsing
+the CSV files (whose free-text comments make that fragile and slow).
+
+The dataset is partitioned by user and date (hive layout, e.g.
+parquet/User=john_doe/Date=2023-12-10/*.parquet) and has the columns:
+- DateTime: timestamp (milliseconds, the coarsest unit Parquet stores)
+- Image: dictionary encoded string
+- PrimaryGrade, SecondaryGrade: categorical grades (a dictionary of the
+  grades "3", "4" and "5", read back by pandas as a category), null when
+  ungraded
+- XCoord, YCoord: float64
+- Comment: string
+
+The export is incremental. A watermark file (_watermark.json in the
+dataset folder) records how far every source was exported: the byte
+offset of each Grading_result_<user>.csv file (they are append-only),
+with the file's inode and a checksum of the bytes at the start and just
+before that offset, or the last row Id of the results database. A run only reads and writes
+what was appended since. Only complete CSV records are exported, so a
+row being written while the export runs is picked up by the next run.
+
+Data files are named after the source and the range they hold, so a run
+interrupted before it saved the watermark is repeated without
+duplicating rows. A CSV file that was rewritten (e.g. by
+ResultsDatabase.export_csv, even to the same or a larger size) or a
+database that was recreated is exported again from the start, replacing
+its earlier files.
+
+pyarrow is only needed by this module; install it with
+`pip install pyarrow`.
+
+Usage:
+    # Example usage:
+    rows = export_parquet('../Results', '../Results/parquet')
+
+    # Or from the command line
+    python parquet_export.py --results ../Results --out ../Results/parquet
+
+    # Read it back
+    import pyarrow.dataset as ds
+    table = ds.dataset('../Results/parquet', partitioning='hive').to_table()
+"""
+
+import io
+import os
+import glob
+import json
+import hashlib
+import sqlite3
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from results_store import COLUMNS, complete_records
+from analytics import GRADES, read_results_csv, typed_results
+
+WATERMARK_FILE = '_watermark.json'
+PARTITION_COLUMNS = ['User', 'Date']
+CHECK_BYTES = 4096     # bytes checksummed at each end of the exported range
+
+
+def _pyarrow():
+    """Import pyarrow, which only the Parquet export needs."""
+    try:
+        import pyarrow
+        import pyarrow.dataset  # noqa: F401
+    except ImportError:
+        raise ImportError('The Parquet export needs pyarrow: pip install pyarrow')
+    return pyarrow
+
+
+def export_schema():
+    """Return the pyarrow schema of the exported dataset."""
+    pa = _pyarrow()
+    grade = pa.dictionary(pa.int8(), pa.string())
+    return pa.schema([('DateTime', pa.timestamp('ms')),
+                      ('Image', pa.dictionary(pa.int32(), pa.string())),
+                      ('PrimaryGrade', grade),
+                      ('SecondaryGrade', grade),
+                      ('XCoord', pa.float64()),
+                      ('YCoord', pa.float64()),
+                      ('Comment', pa.string()),
+                      ('User', pa.string()),
+                      ('Date', pa.string())])
+
+
+def to_table(frame):
+    """
+    Convert a typed results frame (see analytics.typed_results) to a
+    pyarrow Table with the export schema.
+    """
+    pa = _pyarrow()
+    grades = pa.array([str(grade) for grade in GRADES], type=pa.string())
+    columns = {
+        'DateTime': pa.array(frame['DateTime'].dt.floor('s'), from_pandas=True)
+                      .cast(pa.timestamp('ms')),
+        'Image': pa.array(frame['Image'].astype(str).to_numpy(), type=pa.string())
+                   .dictionary_encode(),
+        'XCoord': pa.array(frame['XCoord'].to_numpy(dtype=float), from_pandas=True),
+        'YCoord': pa.array(frame['YCoord'].to_numpy(dtype=float), from_pandas=True),
+        'Comment': pa.array(frame['Comment'].astype(object).to_numpy(),
+                            type=pa.string(), from_pandas=True),
+        'User': pa.array(frame['User'].astype(str).to_numpy(), type=pa.string()),
+        'Date': pa.array(frame['DateTime'].dt.strftime('%Y-%m-%d').astype(object)
+                         .to_numpy(), type=pa.string(), from_pandas=True),
+    }
+    for column in ('PrimaryGrade', 'SecondaryGrade'):
+        # Ungraded and unknown grades get code -1, which becomes null
+        codes = pd.Categorical(frame[column], categories=GRADES).codes
+        indices = pa.array(codes.astype(np.int8), mask=codes < 0, type=pa.int8())
+        columns[column] = pa.DictionaryArray.from_arrays(indices, grades)
+    schema = export_schema()
+    return pa.Table.from_arrays([columns[name] for name in schema.names],
+                                schema=schema)
+
+
+def load_watermark(out_folder):
+    """Return the watermark of a dataset folder (nothing exported if missing)."""
+    path = os.path.join(out_folder, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return {'csv': {}, 'sqlite': 0}
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_watermark(out_folder, watermark):
+    """Write the watermark atomically (a crash keeps the previous one)."""
+    path = os.path.join(out_folder, WATERMARK_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump(watermark, file, indent=2)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(path + '.tmp', path)
+
+
+def _remove_files(out_folder, pattern):
+    """
+    Remove the data files matching a name pattern from every partition,
+    and the partition folders left empty.
+    """
+    for path in glob.glob(os.path.join(out_folder, '**', pattern), recursive=True):
+        os.remove(path)
+        folder = os.path.dirname(path)
+        while folder != out_folder and not os.listdir(folder):
+            os.rmdir(folder)
+            folder = os.path.dirname(folder)
+
+
+def _write(table, out_folder, basename):
+    """Append a table to the dataset as files named basename-<i>.parquet."""
+    pa = _pyarrow()
+    partitioning = pa.dataset.partitioning(
+        pa.schema([(name, pa.string()) for name in PARTITION_COLUMNS]),
+        flavor='hive')
+    # Files left by an interrupted run of the same range are replaced
+    _remove_files(out_folder, basename + '-*.parquet')
+    pa.dataset.write_dataset(table, out_folder, format='parquet',
+                             partitioning=partitioning,
+                             basename_template=basename + '-{i}.parquet',
+                             existing_data_behavior='overwrite_or_ignore')
+
+
+def _exported_checksum(file, offset):
+    """
+    Return a checksum of the first and the last CHECK_BYTES bytes before
+    offset of an open CSV file, which changes if the exported part of the
+    file was rewritten.
+    """
+    file.seek(0)
+    digest = hashlib.md5(file.read(min(offset, CHECK_BYTES)))
+    file.seek(max(offset - CHECK_BYTES, 0))
+    digest.update(file.read(min(offset, CHECK_BYTES)))
+    return digest.hexdigest()
+
+
+def _export_csv(results_folder, out_folder, watermark):
+    rows = 0
+    entries = watermark.setdefault('csv', {})
+    for path in sorted(glob.glob(os.path.join(results_folder, 'Grading_result_*.csv'))):
+        name = os.path.basename(path)
+        key = 'csv_' + hashlib.md5(name.encode('utf-8')).hexdigest()[:10]
+        entry = entries.get(name, {'offset': 0})
+        if not isinstance(entry, dict):
+            # Watermark of an older version: the offset alone
+            entry = {'offset': entry}
+        start = entry['offset']
+        stat = os.stat(path)
+        with open(path, 'rb') as file:
+            if stat.st_size < start or \
+                    entry.get('inode', stat.st_ino) != stat.st_ino or \
+                    entry.get('checksum') not in (None, _exported_checksum(file, start)):
+                # The file was rewritten: export it again from the start
+                _remove_files(out_folder, key + '-*.parquet')
+                start = 0
+            file.seek(start)
+            data = file.read()
+            end = complete_records(data)
+            if end == 0:
+                continue
+            checksum = _exported_checksum(file, start + end)
+        frame = typed_results(read_results_csv(io.BytesIO(data[:end]),
+                                               header=0 if start == 0 else None))
+        if len(frame):
+            _write(to_table(frame), out_folder, '%s-%d-%d' % (key, start, start + end))
+            rows += len(frame)
+        entries[name] = {'offset': start + end, 'inode': stat.st_ino,
+                         'checksum': checksum}
+        save_watermark(out_folder, watermark)
+    return rows
+
+
+def _export_sqlite(results_folder, out_folder, watermark):
+    db_path = os.path.join(results_folder, 'results_database.db')
+    connection = sqlite3.connect(db_path)
+    try:
+        last_id = connection.execute('SELECT MAX(Id) FROM Results').fetchone()[0] or 0
+        start = watermark.get('sqlite', 0)
+        if last_id < start:
+            # The database was recreated: export it again from the start
+            _remove_files(out_folder, 'db-*.parquet')
+            start = 0
+        frame = pd.read_sql_query('SELECT %s FROM Results WHERE Id > ? AND Id <= ? '
+                                  'ORDER BY Id' % ', '.join(COLUMNS),
+                                  connection, params=(start, last_id))
+    finally:
+        connection.close()
+    if len(frame):
+        _write(to_table(typed_results(frame)), out_folder,
+               'db-%d-%d' % (start, last_id))
+    watermark['sqlite'] = last_id
+    save_watermark(out_folder, watermark)
+    return len(frame)
+
+
+def export_parquet(results_folder, out_folder, backend=None):
+    """
+    Append the results written since the last export to the Parquet
+    dataset.
+
+    Args:
+    - results_folder (str): The Results folder.
+    - out_folder (str): The dataset folder, created if needed.
+    - backend (str, optional): 'csv' or 'sqlite', as for
+        analytics.load_results. By default the database is exported if it
+        exists, the CSV files otherwise.
+
+    Returns:
+    - int: Number of rows exported.
+    """
+    _pyarrow()
+    if backend is None:
+        db_path = os.path.join(results_folder, 'results_database.db')
+        backend = 'sqlite' if os.path.exists(db_path) else 'csv'
+    if backend not in ('csv', 'sqlite'):
+        raise ValueError('Unknown results backend: %s' % backend)
+    if not os.path.exists(out_folder):
+        os.makedirs(out_folder)
+    watermark = load_watermark(out_folder)
+    if backend == 'sqlite':
+        return _export_sqlite(results_folder, out_folder, watermark)
+    return _export_csv(results_folder, out_folder, watermark)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export grading results to Parquet')
+    parser.add_argument('--results', default=os.path.join(os.path.abspath('..'),
+                                                          'Results'),
+                        help='Results folder to read')
+    parser.add_argument('--out', help='dataset folder (default: <results>/parquet)')
+    parser.add_argument('--backend', choices=['csv', 'sqlite'],
+                        help='export the CSV files or the results database '
+                             '(default: the database if it exists)')
+    args = parser.parse_args()
+
+    out = args.out or os.path.join(args.results, 'parquet')
+    print('%d rows exported to %s' % (export_parquet(args.results, out, args.backend),
+                                      out))
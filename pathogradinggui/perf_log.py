@@ -0,0 +1,194 @@
+"""
+PerfLog Module
+
+This module times the hot paths of PathoGUI (slide decode and
+downsampling, canvas draws, results writes, password hashing), so that
+"it feels slow" can be looked at. Instrumentation is off unless enabled;
+then every timed section is appended as one JSON line to a log file, and
+rolling averages are kept for the performance overlay of the main window.
+
+The calls stay in production code: when instrumentation is off, timed()
+returns a shared no-op context manager, which costs a global lookup and
+an empty with-block (well under a microsecond).
+
+Log lines look like:
+    {"ts": 1702200000.123, "name": "decode", "ms": 412.7, "thread": "prefetch_0"}
+
+Usage:
+    # Example usage:
+    perf_log.enable('../Results/perf.jsonl')     # or enable() for memory only
+
+    with perf_log.timed('decode'):
+        pixels = mpimg.imread(path)
+
+    print(perf_log.summary())                    # e.g. "decode 412.7 ms"
+    perf_log.disable()
+"""
+
+import json
+import time
+import threading
+from collections import deque
+
+ROLLING_WINDOW = 50
+FLUSH_EVERY = 100
+
+_recorder = None
+
+
+class _NullSpan:
+    """Context manager doing nothing, returned while instrumentation is off."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """Times a with-block and records it under a name."""
+
+    __slots__ = ('recorder', 'name', 'start')
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.recorder.record(self.name, 1000 * (time.perf_counter() - self.start))
+        return False
+
+
+class PerfRecorder:
+    """
+    PerfRecorder Class
+
+    Thread-safe sink of timings: rolling statistics per name and an
+    optional JSONL log.
+
+    Methods:
+        __init__(self, log_path=None, window=ROLLING_WINDOW):
+            Opens the log file for appending, if one is given.
+
+        record(self, name, ms):
+            Records one timing in milliseconds.
+
+        averages(self):
+            Returns {name: (rolling mean ms, last ms, count)}.
+
+        flush(self) / close(self):
+            Write buffered log lines / and close the log file.
+    """
+
+    def __init__(self, log_path=None, window=ROLLING_WINDOW):
+        self.log_path = log_path
+        self.window = window
+        self._file = open(log_path, 'a', encoding='utf-8') if log_path else None
+        self._lock = threading.Lock()
+        self._recent = {}
+        self._counts = {}
+        self._unflushed = 0
+
+    def record(self, name, ms):
+        """Record one timing (in milliseconds) of a named section."""
+        with self._lock:
+            recent = self._recent.get(name)
+            if recent is None:
+                recent = self._recent[name] = deque(maxlen=self.window)
+            recent.append(ms)
+            self._counts[name] = self._counts.get(name, 0) + 1
+            if self._file is not None:
+                self._file.write(json.dumps({
+                    'ts': round(time.time(), 3), 'name': name, 'ms': round(ms, 3),
+                    'thread': threading.current_thread().name}) + '\n')
+                self._unflushed += 1
+                if self._unflushed >= FLUSH_EVERY:
+                    self._flush()
+
+    def averages(self):
+        """Return {name: (rolling mean ms, last ms, count)}."""
+        with self._lock:
+            return {name: (sum(recent) / len(recent), recent[-1], self._counts[name])
+                    for name, recent in self._recent.items()}
+
+    def _flush(self):
+        self._file.flush()
+        self._unflushed = 0
+
+    def flush(self):
+        """Write the buffered log lines to the log file."""
+        with self._lock:
+            if self._file is not None:
+                self._flush()
+
+    def close(self):
+        """Flush and close the log file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def enable(log_path=None, window=ROLLING_WINDOW):
+    """
+    Turn instrumentation on, replacing any previous recorder.
+
+    Args:
+    - log_path (str, optional): JSONL file the timings are appended to;
+        without one, only the rolling averages are kept.
+    - window (int): Timings per name in the rolling averages.
+
+    Returns:
+    - PerfRecorder: The new recorder.
+    """
+    global _recorder  # pylint: disable=global-statement
+    disable()
+    _recorder = PerfRecorder(log_path, window)
+    return _recorder
+
+
+def disable():
+    """Turn instrumentation off and close the log file."""
+    global _recorder  # pylint: disable=global-statement
+    recorder, _recorder = _recorder, None
+    if recorder is not None:
+        recorder.close()
+
+
+def enabled():
+    """Return True if instrumentation is on."""
+    return _recorder is not None
+
+
+def recorder():
+    """Return the current PerfRecorder, or None."""
+    return _recorder
+
+
+def timed(name):
+    """Return a context manager timing its block under name (no-op if off)."""
+    current = _recorder
+    if current is None:
+        return NULL_SPAN
+    return _Span(current, name)
+
+
+def summary():
+    """Return the rolling averages as one line of text, '' if off."""
+    current = _recorder
+    if current is None:
+        return ''
+    current.flush()
+    return '   '.join('%s %.1f ms' % (name, mean) for name, (mean, _, _)
+                      in sorted(current.averages().items()))
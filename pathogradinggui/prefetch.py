@@ -0,0 +1,134 @@
+"""
+SlidePrefetcher Module
+
+This module decodes the slides next to the one being graded on a worker
+thread, so that pressing Next or Previous swaps in an image that is
+already prepared instead of decoding it on the Qt main thread.
+
+The prefetch queue is bounded: every call to `schedule` names the slides
+that are wanted now, in priority order, and any pending work for other
+slides is cancelled (or its result dropped once it finishes). This keeps
+the worker from falling behind when a grader jumps around the list.
+
+Usage:
+    # Example usage:
+    prefetcher = SlidePrefetcher(load_slide, max_pending=2)
+
+    # After showing slide 10, prepare slides 11 and 9 in the background
+    prefetcher.schedule([paths[11], paths[9]])
+
+    # When the user presses Next
+    result = prefetcher.take(paths[11])
+    if result is None:
+        result = load_slide(paths[11])
+
+    print(prefetcher.stats())
+    prefetcher.shutdown()
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+def neighbour_indices(index, radius, count):
+    """
+    Return the indices within `radius` of `index`, nearest first and
+    alternating forward/backward, e.g. (5, 2, 10) -> [6, 4, 7, 3].
+    """
+    indices = []
+    for step in range(1, radius + 1):
+        for candidate in (index + step, index - step):
+            if 0 <= candidate < count:
+                indices.append(candidate)
+    return indices
+
+
+class SlidePrefetcher:
+    """
+    SlidePrefetcher Class
+
+    Bounded, cancellable background queue of slide loads.
+
+    Args:
+    - loader (callable): Called as loader(key, *args) on the worker thread;
+        its return value is handed back by `take`.
+    - max_pending (int): Maximum number of slides queued or held at once.
+    - max_workers (int): Number of worker threads.
+
+    Methods:
+    - schedule(keys, *args): Replace the wanted set with `keys` (highest
+        priority first), cancelling or dropping everything else.
+    - take(key): Return the prepared result for `key`, or None if it was
+        not prefetched. Updates the hit/miss counters.
+    - stats(): Return the hit, miss and dropped counters.
+    - wait(timeout=None): Wait until the scheduled slides are prepared.
+    - shutdown(): Cancel pending work and stop the worker threads.
+    """
+
+    def __init__(self, loader, max_pending=2, max_workers=1):
+        self.loader = loader
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='prefetch')
+        self._futures = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.dropped = 0
+
+    def schedule(self, keys, *args):
+        """Prefetch `keys` in priority order and drop any stale work."""
+        wanted = list(dict.fromkeys(keys))[:self.max_pending]
+        with self._lock:
+            for key in list(self._futures):
+                if key not in wanted:
+                    self._futures.pop(key).cancel()
+                    self.dropped += 1
+            for key in wanted:
+                if key not in self._futures:
+                    self._futures[key] = self._executor.submit(
+                        self.loader, key, *args)
+
+    def take(self, key):
+        """
+        Return the prefetched result for `key` and forget it.
+
+        A slide that is still being decoded is waited for rather than
+        decoded a second time, but counts as a miss.
+        """
+        with self._lock:
+            future = self._futures.pop(key, None)
+        if future is None:
+            self.misses += 1
+            return None
+        if future.done():
+            self.hits += 1
+        else:
+            self.misses += 1
+        try:
+            return future.result()
+        except Exception:  # pylint: disable=broad-except
+            # Failures are reported again by the synchronous load
+            return None
+
+    def stats(self):
+        """Return the prefetch counters as a dictionary."""
+        return {'hits': self.hits, 'misses': self.misses,
+                'dropped': self.dropped}
+
+    def wait(self, timeout=None):
+        """
+        Wait until the scheduled slides are prepared (as after a grader has
+        looked at a slide for a while). Returns True if all of them are.
+        """
+        with self._lock:
+            futures = list(self._futures.values())
+        return not wait(futures, timeout)[1]
+
+    def shutdown(self):
+        """Cancel pending work and stop the worker threads."""
+        with self._lock:
+            for future in self._futures.values():
+                future.cancel()
+            self._futures.clear()
+        self._executor.shutdown(wait=False)
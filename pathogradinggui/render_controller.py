@@ -0,0 +1,255 @@
+"""
+SlideRenderer Module
+
+This module provides the render controller of the matplotlib viewer. It
+owns one Axes and one AxesImage for the lifetime of the window: showing
+a new slide or panning/zooming only swaps the image data with set_data
+and set_extent, instead of clearing the figure and rebuilding the axes,
+title and spines.
+
+Pan and zoom change the axes limits many times per second. A change only
+starts a single-shot timer if none is pending; when it fires, at most
+once per frame interval, the visible window is read with SlideSource.render_view
+and one redraw is requested. Overlay artists (annotations, markers) are
+drawn with blitting: they are marked animated, kept out of the full
+redraw, and repainted on top of a cached background, so updating them
+never re-rasterizes the slide.
+
+Views of a slide on a grading server (RemoteSlide) are read by a
+SlideReader on a worker thread, one request at a time; limit changes
+made while one is in flight are rendered once it returns. A view that
+cannot be read leaves the current image and is reported with
+render_failed.
+
+Usage:
+    # Example usage:
+    renderer = SlideRenderer(figure, canvas)
+    renderer.viewport_changed.connect(on_viewport_changed)
+    renderer.set_slide(SlideSource('../Data/S001_D1.tif'), 'Biopsy name: S001_D1')
+
+    # Overlays drawn with blitting
+    marker, = renderer.axes.plot([100], [200], 'r+')
+    renderer.add_overlay(marker)
+    marker.set_data([150], [250])
+    renderer.blit_overlays()
+"""
+
+import numpy as np
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from matplotlib.backends.backend_qt5agg import FigureCanvas
+
+import perf_log
+from slide_reader import SlideReader
+
+FRAME_INTERVAL_MS = 16     # one redraw per frame at 60 Hz
+
+
+class TimedFigureCanvas(FigureCanvas):
+    """FigureCanvas whose full redraws are timed as 'canvas.draw' (see perf_log)."""
+
+    def draw(self):
+        """Render the figure."""
+        with perf_log.timed('canvas.draw'):
+            super().draw()
+
+
+class SlideRenderer(QObject):
+    """
+    Render controller for a slide on a matplotlib FigureCanvas.
+
+    Args:
+    - figure (matplotlib.figure.Figure): Figure to draw into. One Axes is
+        added to it.
+    - canvas (FigureCanvas): Canvas showing the figure.
+    - frame_interval (int): Minimum time between two redraws caused by
+        pan/zoom, in milliseconds.
+
+    Attributes:
+    - reader (SlideReader): Reads the views of remote slides; shut it
+        down when done.
+
+    Signals:
+    - viewport_changed(tuple, tuple): Emitted with the x and y limits
+        after the view of a slide has been redrawn.
+    - render_failed(str): Emitted with the error message if the view of
+        a slide could not be read (e.g. the grading server is down).
+
+    Methods:
+    - set_slide(slide, title): Show a new slide, fitted to the axes.
+    - schedule(): Request a redraw of the visible window; bursts of
+        requests are coalesced into one per frame interval.
+    - render(): Redraw the visible window now (as soon as it is read, for
+        a remote slide).
+    - add_overlay(artist) / remove_overlay(artist): Manage the artists
+        drawn with blitting.
+    - blit_overlays(state=None): Repaint the overlays over the cached
+        background. Pass a key describing the overlay state to reuse the
+        painted result when the same state is shown again.
+    """
+
+    viewport_changed = pyqtSignal(tuple, tuple)
+    render_failed = pyqtSignal(str)
+
+    def __init__(self, figure, canvas, frame_interval=FRAME_INTERVAL_MS):
+        super().__init__()
+        self.figure = figure
+        self.canvas = canvas
+        self.slide = None
+        self.renders = 0
+        self.overlays = []
+        self._background = None
+        self._draw_pending = False
+        self._composited = {}
+        self._shown = None
+        # Views of remote slides: one read in flight, and whether the
+        # limits changed meanwhile
+        self.reader = SlideReader(max_workers=1, parent=self)
+        self.reader.ready.connect(self._on_view_read)
+        self.reader.failed.connect(self._on_view_failed)
+        self._reading = False
+        self._stale = False
+
+        self.axes = figure.add_subplot(1, 1, 1)
+        self.axes.spines['right'].set_visible(False)
+        self.axes.spines['top'].set_visible(False)
+        self.axes_image = self.axes.imshow(np.zeros((1, 1, 3), dtype=np.uint8))
+        # The limits belong to the user, new extents must not rescale them
+        self.axes.set_autoscale_on(False)
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(frame_interval)
+        self._timer.timeout.connect(self.render)
+        self.axes.callbacks.connect('xlim_changed', self._limits_changed)
+        self.axes.callbacks.connect('ylim_changed', self._limits_changed)
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def set_slide(self, slide, title, img=None, extent=None):
+        """
+        Show a new slide, fitted to the axes.
+
+        Args:
+        - slide (SlideSource): The slide.
+        - title (str): Axes title.
+        - img, extent (optional): An already rendered view of the whole
+            slide (e.g. from the prefetcher), to avoid reading it again.
+        """
+        self.slide = slide
+        self.axes.set_title(title)
+        self.axes.set_xlim(-0.5, slide.width - 0.5)
+        self.axes.set_ylim(slide.height - 0.5, -0.5)
+        if img is not None:
+            self._timer.stop()
+            self._show(img, extent)
+        else:
+            self.render()
+
+    def _limits_changed(self, _axes):
+        self.schedule()
+
+    def schedule(self):
+        """Request a redraw; bursts are coalesced into one per frame."""
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def render(self):
+        """Read the visible window at canvas resolution and redraw."""
+        self._timer.stop()
+        if self.slide is None:
+            return
+        bbox = self.axes.bbox
+        args = (self.axes.get_xlim(), self.axes.get_ylim(), bbox.width, bbox.height)
+        if self.slide.remote:
+            if self._reading:
+                self._stale = True
+            else:
+                self._reading, self._stale = True, False
+                self.reader.read(self.slide, self.slide.render_view, *args)
+            return
+        try:
+            img, extent = self.slide.render_view(*args)
+        except (OSError, ValueError) as err:
+            self.render_failed.emit(str(err))
+            return
+        self._show(img, extent)
+
+    def _on_view_read(self, slide, view):
+        self._reading = False
+        # The view of a slide that is no longer shown is dropped
+        if slide is self.slide:
+            self._show(*view)
+        if self._stale:
+            self.render()
+
+    def _on_view_failed(self, slide, message):
+        self._reading = False
+        if slide is self.slide:
+            self.render_failed.emit(message)
+        if self._stale:
+            self.render()
+
+    def _show(self, img, extent):
+        # Only swap what changed, a pan that stays inside the same window
+        # (e.g. clamped at the slide edge) costs nothing
+        shown = (self.slide, tuple(extent), img.shape)
+        if shown != self._shown:
+            self._shown = shown
+            self.axes_image.set_data(img)
+            self.axes_image.set_extent(extent)
+            self.renders += 1
+            self._draw_pending = True
+            self.canvas.draw_idle()
+        self.viewport_changed.emit(tuple(self.axes.get_xlim()),
+                                   tuple(self.axes.get_ylim()))
+
+    def add_overlay(self, artist):
+        """Draw an artist of self.axes with blitting."""
+        artist.set_animated(True)
+        self.overlays.append(artist)
+
+    def remove_overlay(self, artist):
+        """Stop drawing an overlay and remove it from the axes."""
+        if artist in self.overlays:
+            self.overlays.remove(artist)
+            artist.remove()
+
+    def _on_draw(self, _event):
+        # A full redraw just happened: cache it and put the overlays on top
+        self._draw_pending = False
+        self._composited = {}
+        self._background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self._draw_overlays()
+
+    def _draw_overlays(self):
+        for artist in self.overlays:
+            if artist.get_visible():
+                self.axes.draw_artist(artist)
+
+    def blit_overlays(self, state=None):
+        """
+        Repaint the overlays over the cached slide background.
+
+        Args:
+        - state (hashable, optional): Key of what the overlays show. The
+            painted canvas is kept per state until the next full draw, so
+            switching back to a state (e.g. toggling an overlay) only
+            restores pixels.
+        """
+        if self._draw_pending:
+            # The coming full draw paints the overlays as well
+            return
+        if self._background is None:
+            self._draw_pending = True
+            self.canvas.draw_idle()
+            return
+        if state is not None and state in self._composited:
+            self.canvas.restore_region(self._composited[state])
+        else:
+            self.canvas.restore_region(self._background)
+            self._draw_overlays()
+            if state is not None:
+                if len(self._composited) >= 4:
+                    self._composited.clear()
+                self._composited[state] = self.canvas.copy_from_bbox(
+                    self.figure.bbox)
+        self.canvas.blit(self.figure.bbox)
@@ -0,0 +1,307 @@
+"""
+Results Store Module
+
+This module provides the stores grading results are written to: the
+original layout of one Results/Grading_result_<user>.csv file per user
+(CsvResultsSink), and an SQLite-based store (ResultsDatabase).
+
+ResultsDatabase is the alternative to appending to one CSV file per
+user. All users share one table indexed on (image, user, timestamp),
+so questions like "all grades for slide S128_A" or "which slides do the
+graders disagree on" are answered with an index lookup instead of parsing
+every CSV file.
+
+The database runs in WAL mode so the GUI can keep writing while other
+processes (exports, analytics) read, and every batch of rows is written
+in a single transaction. The old CSV layout can be regenerated at any
+time with export_csv.
+
+Usage:
+    # Example usage:
+    results_db = ResultsDatabase('../Results/results_database.db')
+
+    # Add a result (same columns and order as the CSV files)
+    results_db.write_rows([['2023-12-10 10:00:00', 'john_doe', 'S128_A.tif',
+                            '3', '4', '10.000', '20.000', 'comment']])
+
+    # Query
+    rows = results_db.results_for_image('S128_A.tif')
+    disagreements = results_db.disagreements()
+
+    # Write Grading_result_<user>.csv files for compatibility
+    results_db.export_csv('../Results')
+
+    # Close the database connection when done
+    results_db.close_connection()
+
+    # Open the store selected by the results_backend setting
+    sink = open_results_store('sqlite', '../Results')
+
+    # Or from the command line
+    python results_store.py ../Results/results_database.db --export ../Results
+"""
+
+import os
+import csv
+import sqlite3
+import argparse
+import threading
+
+HEADERS = ["Date&Time", "User", "Image name",
+           "PrimaryGrade", "SecondaryGrade", "xcoord", "ycoord", "User comment"]
+USER_COLUMN = HEADERS.index("User")
+COLUMNS = ["DateTime", "User", "Image",
+           "PrimaryGrade", "SecondaryGrade", "XCoord", "YCoord", "Comment"]
+
+
+def complete_records(data):
+    """
+    Return the length of the complete CSV records at the start of data: up
+    to the last newline that is not inside a quoted field.
+    """
+    end = data.rfind(b'\n')
+    # Quotes are balanced at the end of every complete record ("" escapes
+    # count twice)
+    while end >= 0 and data.count(b'"', 0, end) % 2:
+        end = data.rfind(b'\n', 0, end)
+    return end + 1
+
+
+def repair_csv(filename):
+    """
+    Cut a partial last row (left by a crash in the middle of an append)
+    off a CSV file. Returns True if the file was changed.
+    """
+    with open(filename, 'rb+') as file:
+        file.seek(0, os.SEEK_END)
+        if file.tell() == 0:
+            return False
+        file.seek(-1, os.SEEK_END)
+        if file.read(1) == b'\n':
+            return False
+        file.seek(0)
+        file.truncate(complete_records(file.read()))
+    return True
+
+
+class CsvResultsSink:
+    """
+    Results sink writing one Grading_result_<user>.csv file per user.
+
+    Args:
+    - root_folder (str): Folder holding the result files. It is created
+        on the first write.
+
+    Methods:
+    - write_rows(rows): Append a batch of rows (lists in HEADERS order),
+        opening each user's file once per batch. A partial row left at
+        the end of a file by a crash is removed first.
+    - results_for_user(user): Return every row of one user, as
+        ResultsDatabase.results_for_user does.
+    """
+
+    def __init__(self, root_folder):
+        self.root_folder = root_folder
+
+    def filename(self, user_name):
+        """Return the result file of a user."""
+        return self.root_folder + os.sep + "Grading_result_" + user_name + ".csv"
+
+    def write_rows(self, rows):
+        """Append rows to the per-user CSV files."""
+        if not os.path.exists(self.root_folder):
+            os.mkdir(self.root_folder)
+        by_user = {}
+        for row in rows:
+            by_user.setdefault(row[USER_COLUMN], []).append(row)
+        for user_name, user_rows in by_user.items():
+            if os.path.exists(self.filename(user_name)):
+                repair_csv(self.filename(user_name))
+            with open(self.filename(user_name), mode="a", newline="",
+                      encoding="utf-8") as file:
+                writer = csv.writer(file)
+                if file.tell() == 0:
+                    writer.writerow(HEADERS)
+                writer.writerows(user_rows)
+
+    def results_for_user(self, user_name):
+        """Return every row (in HEADERS order) of one user, oldest first."""
+        if not os.path.exists(self.filename(user_name)):
+            return []
+        with open(self.filename(user_name), mode="r", newline="",
+                  encoding="utf-8") as file:
+            return [row for row in csv.reader(file)][1:]
+
+
+class ResultsDatabase:
+    """
+    ResultsDatabase Class
+
+    SQLite-backed results store. It implements the same write_rows(rows)
+    interface as CsvResultsSink, so it can be handed to a
+    ResultsWriter directly; rows are lists in HEADERS order.
+
+    Methods:
+        __init__(self, db_path):
+            Opens (or creates) the database in WAL mode and makes sure the
+            'Results' table and its indexes exist.
+
+        write_rows(self, rows):
+            Inserts a batch of rows in one transaction.
+
+        results_for_image(self, image):
+            Returns every row for one slide, oldest first.
+
+        results_for_user(self, user):
+            Returns every row of one user, oldest first.
+
+        disagreements(self):
+            Returns (image, number of distinct grade pairs) for every slide
+            that received different grades from different users.
+
+        export_csv(self, root_folder):
+            Writes one Grading_result_<user>.csv file per user in the
+            layout produced by MainWindow.save_coords.
+
+        close_connection(self):
+            Closes the SQLite database connection.
+
+    Note:
+        The connection may be used from the ResultsWriter thread as well as
+        the GUI thread; access is serialized with a lock.
+    """
+
+    def __init__(self, db_path):
+        folder = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.cursor = self.connection.cursor()
+        self.create_table()
+
+    def create_table(self):
+        """
+        Create the 'Results' table and its indexes if they do not exist.
+        Values are stored as text, exactly as the GUI produced them, so that
+        the CSV export round-trips.
+        """
+        with self._lock, self.connection:
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS Results (
+                    Id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    DateTime TEXT NOT NULL,
+                    User varchar(255) NOT NULL,
+                    Image varchar(255) NOT NULL,
+                    PrimaryGrade TEXT,
+                    SecondaryGrade TEXT,
+                    XCoord TEXT,
+                    YCoord TEXT,
+                    Comment TEXT
+                )
+            ''')
+            self.connection.execute('''
+                CREATE INDEX IF NOT EXISTS Results_Image_User_DateTime
+                ON Results (Image, User, DateTime)
+            ''')
+            self.connection.execute('''
+                CREATE INDEX IF NOT EXISTS Results_User_DateTime
+                ON Results (User, DateTime)
+            ''')
+
+    def write_rows(self, rows):
+        """Insert a batch of rows (lists in HEADERS order) in one transaction."""
+        placeholders = ', '.join('?' * len(COLUMNS))
+        with self._lock, self.connection:
+            self.connection.executemany(
+                'INSERT INTO Results (%s) VALUES (%s)'
+                % (', '.join(COLUMNS), placeholders),
+                [tuple(row) for row in rows])
+
+    def _select(self, where, args):
+        with self._lock:
+            self.cursor.execute('SELECT %s FROM Results %s ORDER BY DateTime, Id'
+                                % (', '.join(COLUMNS), where), args)
+            return [list(row) for row in self.cursor.fetchall()]
+
+    def results_for_image(self, image):
+        """Return every row (in HEADERS order) for one slide."""
+        return self._select('WHERE Image=?', (image,))
+
+    def results_for_user(self, user):
+        """Return every row (in HEADERS order) of one user."""
+        return self._select('WHERE User=?', (user,))
+
+    def users(self):
+        """Return the names of all users with results, sorted."""
+        with self._lock:
+            self.cursor.execute('SELECT DISTINCT User FROM Results ORDER BY User')
+            return [row[0] for row in self.cursor.fetchall()]
+
+    def disagreements(self):
+        """
+        Return (image, distinct grade pairs) for slides graded differently
+        by different users, using only each user's latest grade.
+        """
+        with self._lock:
+            self.cursor.execute('''
+                SELECT Image, COUNT(DISTINCT PrimaryGrade || '+' || SecondaryGrade)
+                FROM Results AS r
+                WHERE Id = (SELECT Id FROM Results
+                            WHERE Image = r.Image AND User = r.User
+                            ORDER BY DateTime DESC, Id DESC LIMIT 1)
+                GROUP BY Image
+                HAVING COUNT(DISTINCT PrimaryGrade || '+' || SecondaryGrade) > 1
+                ORDER BY Image
+            ''')
+            return self.cursor.fetchall()
+
+    def export_csv(self, root_folder):
+        """
+        Write one Grading_result_<user>.csv file per user into root_folder,
+        replacing existing files. Returns the list of files written.
+        """
+        if not os.path.exists(root_folder):
+            os.makedirs(root_folder)
+        written = []
+        for user in self.users():
+            filename = root_folder + os.sep + "Grading_result_" + user + ".csv"
+            with open(filename, mode="w", newline="", encoding="utf-8") as file:
+                writer = csv.writer(file)
+                writer.writerow(HEADERS)
+                writer.writerows(self.results_for_user(user))
+            written.append(filename)
+        return written
+
+    def close_connection(self):
+        """Close the SQLite database connection."""
+        self.connection.close()
+
+
+def open_results_store(backend, root_folder):
+    """
+    Return the results store for a results_backend setting: 'csv' for
+    per-user CSV files in root_folder, 'sqlite' for
+    root_folder/results_database.db.
+    """
+    if backend == 'sqlite':
+        return ResultsDatabase(os.path.join(root_folder, 'results_database.db'))
+    if backend == 'csv':
+        return CsvResultsSink(root_folder)
+    raise ValueError('Unknown results backend: %s' % backend)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export the results database')
+    parser.add_argument('db_path', help='results database file')
+    parser.add_argument('--export', required=True, metavar='FOLDER',
+                        help='folder to write Grading_result_<user>.csv files to')
+    args = parser.parse_args()
+
+    results_db = ResultsDatabase(args.db_path)
+    for path in results_db.export_csv(args.export):
+        print(path)
+    results_db.close_connection()
@@ -0,0 +1,114 @@
+"""
+ResultsWriter Module
+
+This module moves writing grading results off the Qt main thread.
+`MainWindow.save_coords` only queues a row; a background thread collects
+the rows that arrive within a short flush interval into one batch, hands
+the batch to a results store (by default the per-user CSV files) and then
+reports back to the GUI through Qt signals.
+
+Usage:
+    # Example usage:
+    writer = ResultsWriter(results_store.CsvResultsSink('../Results'))
+    writer.saved.connect(on_saved)
+    writer.failed.connect(on_failed)
+
+    writer.submit(['2023-12-10 10:00:00', 'john_doe', 'S001_D1.tif',
+                   '3', '4', '10.000', '20.000', 'comment'])
+
+    # Block until every queued row is on disk, e.g. at shutdown
+    writer.close()
+"""
+
+import queue
+import sqlite3
+import threading
+from PyQt5.QtCore import QObject, pyqtSignal
+
+import perf_log
+
+
+class ResultsWriter(QObject):
+    """
+    Background writer for grading results.
+
+    Args:
+    - sink: Object with a write_rows(rows) method, e.g.
+        results_store.CsvResultsSink or results_store.ResultsDatabase.
+    - flush_interval (float): Seconds to wait for more rows before writing
+        a batch.
+    - max_batch (int): Largest number of rows written in one batch.
+
+    Signals:
+    - saved(int): Emitted with the number of rows after each batch is
+        written.
+    - failed(str, int): Emitted with the error message and the number of
+        rows if a batch could not be written.
+
+    Methods:
+    - submit(row): Queue one row. Returns immediately.
+    - flush(): Block until every queued row has been written.
+    - close(): Flush and stop the writer thread.
+    """
+
+    saved = pyqtSignal(int)
+    failed = pyqtSignal(str, int)
+
+    _STOP = object()
+
+    def __init__(self, sink, flush_interval=0.2, max_batch=500, parent=None):
+        super().__init__(parent)
+        self.sink = sink
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='results-writer',
+                                        daemon=True)
+        self._thread.start()
+
+    def submit(self, row):
+        """Queue one row for writing."""
+        self._queue.put(row)
+
+    def flush(self):
+        """Block until every queued row has been written."""
+        self._queue.join()
+
+    def close(self):
+        """Write any queued rows and stop the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join()
+
+    def _run(self):
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is self._STOP:
+                self._queue.task_done()
+                break
+            batch = [item]
+            # Collect whatever else arrives within the flush interval
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    self._queue.task_done()
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                with perf_log.timed('results_write'):
+                    self.sink.write_rows(batch)
+                self.saved.emit(len(batch))
+            except (OSError, ValueError, sqlite3.Error) as err:
+                self.failed.emit(str(err), len(batch))
+            except Exception as err:  # pylint: disable=broad-except
+                # Any other error of the sink must not end the thread:
+                # rows submitted later would never be written
+                self.failed.emit('%s: %s' % (type(err).__name__, err), len(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
@@ -0,0 +1,240 @@
+"""
+SessionStore Module
+
+This module keeps the grading session of every user in an SQLite
+database, so the GUI reopens where a grader stopped instead of at the
+first slide:
+- the last slide shown (name and index in the slide list),
+- the viewport (x and y limits) last shown for each slide,
+- which slides the user has graded.
+
+Resuming reads one row by primary key, and a slide's viewport is read
+when the slide is shown, so login costs the same whatever the number of
+slides graded. "Next ungraded slide" walks the sorted slide list and an
+index on (User, Graded, Image) side by side, so it reads only the graded
+slides between the current one and the answer instead of scanning the
+results files. The flags of a user who graded before sessions were kept
+can be imported from their results once (import_results).
+
+Usage:
+    # Example usage:
+    session = SessionStore('../Results/sessions_database.db')
+    index = session.resume_index('john_doe', image_paths)
+
+    session.set_position('john_doe', 'S001_D1.tif', index)
+    session.save_viewport('john_doe', 'S001_D1.tif', (0, 2000), (1500, 0))
+    session.mark_graded('john_doe', 'S001_D1.tif')
+    index = session.next_ungraded('john_doe', image_paths, index)
+
+    # Close the database connection when done
+    session.close_connection()
+"""
+
+import os
+import time
+import bisect
+import sqlite3
+
+from results_store import HEADERS
+
+IMAGE_COLUMN = HEADERS.index("Image name")
+GRADE_COLUMNS = (HEADERS.index("PrimaryGrade"), HEADERS.index("SecondaryGrade"))
+
+
+def is_graded(row):
+    """
+    Return True if a result row (in HEADERS order) has both grades. Rows
+    too short to hold them (e.g. a hand-edited CSV file) are not graded.
+    """
+    if len(row) <= max(GRADE_COLUMNS):
+        return False
+    return all((row[column] or '').strip() for column in GRADE_COLUMNS)
+
+
+class SessionStore:
+    """
+    SessionStore Class
+
+    Persistent per-user grading sessions.
+
+    Methods:
+        __init__(self, db_path):
+            Opens (or creates) the sessions database in WAL mode.
+
+        has_session(self, user):
+            Returns True if the user has a saved position.
+
+        resume_index(self, user, names):
+            Returns the index in names of the user's last slide (0 if
+            none).
+
+        set_position(self, user, image, index):
+            Saves the slide the user is on.
+
+        save_viewport(self, user, image, x_limits, y_limits) /
+        viewport(self, user, image):
+            Saves / returns the last viewport of a slide.
+
+        mark_graded(self, user, image, graded=True) / graded(self, user):
+            Sets a slide's graded flag / returns the user's graded slides.
+
+        next_ungraded(self, user, names, index):
+            Returns the index of the next slide after index (wrapping
+            around) the user has not graded, or None.
+
+        import_results(self, user, rows):
+            Marks the slides graded in result rows as graded.
+
+        close_connection(self):
+            Closes the SQLite database connection.
+    """
+
+    def __init__(self, db_path):
+        folder = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.cursor = self.connection.cursor()
+        self.create_tables()
+
+    def create_tables(self):
+        """Create the 'Sessions' and 'SlideStates' tables if they do not exist."""
+        with self.connection:
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS Sessions (
+                    User varchar(255) PRIMARY KEY,
+                    Image varchar(255),
+                    ImageIndex INTEGER,
+                    Updated REAL
+                )
+            ''')
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS SlideStates (
+                    User varchar(255) NOT NULL,
+                    Image varchar(255) NOT NULL,
+                    XLeft REAL, XRight REAL, YBottom REAL, YTop REAL,
+                    Graded INTEGER DEFAULT 0,
+                    Updated REAL,
+                    PRIMARY KEY (User, Image)
+                )
+            ''')
+            self.connection.execute('''
+                CREATE INDEX IF NOT EXISTS SlideStates_User_Graded_Image
+                ON SlideStates (User, Graded, Image)
+            ''')
+
+    def has_session(self, user):
+        """Return True if the user has a saved position."""
+        self.cursor.execute('SELECT 1 FROM Sessions WHERE User=?', (user,))
+        return self.cursor.fetchone() is not None
+
+    def resume_index(self, user, names):
+        """
+        Return the index of the user's last slide in names (a sorted list of
+        slide names). If slides were added or removed since, the index of
+        the last slide's name (or of the slide that now follows it) is
+        found by bisection.
+        """
+        self.cursor.execute('SELECT Image, ImageIndex FROM Sessions WHERE User=?',
+                            (user,))
+        row = self.cursor.fetchone()
+        if row is None or not names:
+            return 0
+        image, index = row
+        if 0 <= index < len(names) and names[index] == image:
+            return index
+        return min(bisect.bisect_left(names, image), len(names) - 1)
+
+    def set_position(self, user, image, index):
+        """Save the slide the user is on."""
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO Sessions (User, Image, ImageIndex, Updated) '
+                'VALUES (?, ?, ?, ?)', (user, image, index, time.time()))
+
+    def save_viewport(self, user, image, x_limits, y_limits):
+        """Save the viewport (x and y limits) of a slide."""
+        with self.connection:
+            self.connection.execute('''
+                INSERT INTO SlideStates (User, Image, XLeft, XRight, YBottom,
+                                         YTop, Updated)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (User, Image) DO UPDATE SET
+                    XLeft=excluded.XLeft, XRight=excluded.XRight,
+                    YBottom=excluded.YBottom, YTop=excluded.YTop,
+                    Updated=excluded.Updated
+            ''', (user, image, float(x_limits[0]), float(x_limits[1]),
+                  float(y_limits[0]), float(y_limits[1]), time.time()))
+
+    def viewport(self, user, image):
+        """Return the saved (x_limits, y_limits) of a slide, or None."""
+        self.cursor.execute('SELECT XLeft, XRight, YBottom, YTop FROM SlideStates '
+                            'WHERE User=? AND Image=?', (user, image))
+        row = self.cursor.fetchone()
+        if row is None or row[0] is None:
+            return None
+        return (row[0], row[1]), (row[2], row[3])
+
+    def graded(self, user):
+        """Return the set of slides the user has graded."""
+        self.cursor.execute('SELECT Image FROM SlideStates '
+                            'WHERE User=? AND Graded=1', (user,))
+        return {row[0] for row in self.cursor.fetchall()}
+
+    def mark_graded(self, user, image, graded=True):
+        """Set or clear the graded flag of a slide."""
+        self._set_graded(user, [image], graded)
+
+    def _set_graded(self, user, images, graded):
+        with self.connection:
+            self.connection.executemany('''
+                INSERT INTO SlideStates (User, Image, Graded, Updated)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (User, Image) DO UPDATE SET
+                    Graded=excluded.Graded, Updated=excluded.Updated
+            ''', [(user, image, int(graded), time.time()) for image in images])
+
+    def _first_ungraded(self, user, names, start, stop):
+        if start >= stop:
+            return None
+        # Graded slides from names[start] on, in the same (binary) order as
+        # the sorted names
+        rows = self.connection.execute(
+            'SELECT Image FROM SlideStates WHERE User=? AND Graded=1 AND Image>=? '
+            'ORDER BY Image', (user, names[start]))
+        graded = next(rows, (None,))[0]
+        for position in range(start, stop):
+            while graded is not None and graded < names[position]:
+                graded = next(rows, (None,))[0]
+            if graded != names[position]:
+                return position
+        return None
+
+    def next_ungraded(self, user, names, index):
+        """
+        Return the index of the first slide after index (wrapping around to
+        the start of names, a sorted list) that the user has not graded, or
+        None if every slide is graded.
+        """
+        for start, stop in ((index + 1, len(names)), (0, min(index + 1, len(names)))):
+            position = self._first_ungraded(user, names, start, stop)
+            if position is not None:
+                return position
+        return None
+
+    def import_results(self, user, rows):
+        """
+        Mark the slides with both grades in result rows (lists in HEADERS
+        order) as graded. Returns the number of slides marked.
+        """
+        images = {row[IMAGE_COLUMN] for row in rows if is_graded(row)}
+        images -= self.graded(user)
+        if images:
+            self._set_graded(user, sorted(images), True)
+        return len(images)
+
+    def close_connection(self):
+        """Close the SQLite database connection."""
+        self.connection.close()
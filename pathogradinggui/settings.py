@@ -0,0 +1,103 @@
+"""
+Settings Module
+
+This module collects the tunable settings of PathoGUI. Values come from
+three places, later ones overriding earlier ones:
+1. The defaults in DEFAULTS.
+2. A JSON config file, by default ~/.config/pathogui/settings.json (or the
+   file named by the PATHOGUI_CONFIG environment variable).
+3. Command line options, e.g. `python user_auth.py --cache-mb 2048`.
+
+Usage:
+    # Example usage:
+    settings = load_settings(sys.argv[1:])
+    w = MainWindow(current_user, settings)
+"""
+
+import os
+import json
+import argparse
+
+DEFAULTS = {
+    # Byte budget of the decoded image cache, in MiB
+    'cache_mb': 512,
+    # Number of slides prefetched on each side of the current one
+    'prefetch_radius': 1,
+    # Where grading results are written: 'csv' (one file per user) or
+    # 'sqlite' (Results/results_database.db)
+    'results_backend': 'csv',
+    # Slide viewer: 'matplotlib' (FigureCanvas and toolbar) or 'qt' (native
+    # QGraphicsView tile viewer, faster for very large slides)
+    'viewer': 'matplotlib',
+    # Password hash for new users and upgraded logins: 'pbkdf2_sha256' or
+    # 'scrypt'; 'hash_params' overrides its parameters, e.g.
+    # {"iterations": 600000}
+    'hash_algorithm': 'pbkdf2_sha256',
+    'hash_params': {},
+    # JSONL file hot-path timings are appended to; instrumentation is off
+    # when unset (the overlay, Ctrl+Shift+P, turns it on in memory)
+    'perf_log': None,
+    # URL of a grading server (grading_server.py) owning the users, slides
+    # and results; unset, the workstation uses its own
+    'server': None,
+}
+
+
+def config_path():
+    """Return the path of the JSON config file."""
+    if os.environ.get('PATHOGUI_CONFIG'):
+        return os.environ['PATHOGUI_CONFIG']
+    root = os.environ.get('XDG_CONFIG_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.config')
+    return os.path.join(root, 'pathogui', 'settings.json')
+
+
+def build_parser():
+    """Return the argument parser for the settings command line options."""
+    parser = argparse.ArgumentParser(description='PathoGUI grading tool')
+    parser.add_argument('--config', help='JSON settings file to read')
+    parser.add_argument('--cache-mb', type=int, dest='cache_mb',
+                        help='memory budget of the decoded image cache (MiB)')
+    parser.add_argument('--prefetch-radius', type=int, dest='prefetch_radius',
+                        help='slides to prefetch on each side of the current one')
+    parser.add_argument('--results-backend', choices=['csv', 'sqlite'],
+                        dest='results_backend',
+                        help='store grading results as CSV files or in SQLite')
+    parser.add_argument('--viewer', choices=['matplotlib', 'qt'],
+                        help='slide viewer backend')
+    parser.add_argument('--hash-algorithm', choices=['pbkdf2_sha256', 'scrypt'],
+                        dest='hash_algorithm',
+                        help='password hash for new users and upgraded logins')
+    parser.add_argument('--perf-log', dest='perf_log',
+                        help='append hot-path timings to this JSONL file')
+    parser.add_argument('--server',
+                        help='grading server URL, e.g. http://127.0.0.1:8765')
+    return parser
+
+
+def load_settings(argv=None):
+    """
+    Return the settings dictionary.
+
+    Args:
+    - argv (list, optional): Command line arguments. Unknown arguments
+        (e.g. Qt's own options) are ignored.
+
+    Raises:
+    - ValueError: If the config file exists but is not valid JSON.
+    """
+    args, _ = build_parser().parse_known_args([] if argv is None else argv)
+    settings = dict(DEFAULTS)
+
+    path = args.config or config_path()
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as file:
+            try:
+                settings.update(json.load(file))
+            except ValueError as err:
+                raise ValueError('Invalid settings file %s: %s' % (path, err))
+
+    for name, value in vars(args).items():
+        if name != 'config' and value is not None:
+            settings[name] = value
+    return settings
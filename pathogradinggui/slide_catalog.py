@@ -0,0 +1,198 @@
+"""
+SlideCatalog Module
+
+This module keeps a persistent SQLite catalog of the slides in a Data
+folder, so that startup does not have to open every slide of a folder of
+tens of thousands of slides on a network mount every time. For each slide the
+catalog holds its file name, size, modification time, dimensions, dtype
+and whether a SlideSource pyramid is already cached for it.
+
+The catalog is refreshed incrementally: the folder is listed once with
+os.scandir, and only new or changed files (by the size and mtime of the
+listing) are opened to read their dimensions; removed files are dropped.
+The folder's own modification time is not trusted to skip the listing,
+since rewriting a slide in place (same name, new pixels) does not change
+it. A full refresh (`refresh(data_path, full=True)`) opens every slide
+again.
+
+Usage:
+    # Example usage:
+    catalog = SlideCatalog()
+    catalog.refresh('../Data')
+    image_paths = catalog.names('../Data')
+    info = catalog.slide('../Data', 'S001_D1.tif')   # dict of metadata
+    catalog.close_connection()
+"""
+
+import os
+import struct
+import sqlite3
+
+import numpy as np
+
+from slide_source import default_cache_dir, pyramid_path
+from mapped_tiff import read_tiff_tags, SAMPLE_KINDS
+FIELDS = ['Name', 'Size', 'MTime', 'Width', 'Height', 'Channels', 'Dtype',
+          'Pyramid']
+
+
+def is_slide(name):
+    """Return True for the file names the GUI treats as slides."""
+    return name.startswith("S") and name.endswith('.tif')
+
+
+def probe_slide(path):
+    """
+    Return (width, height, channels, dtype) of a TIFF slide, reading only
+    its header. Unreadable files are catalogued with unknown dimensions.
+
+    The tags are parsed directly (see mapped_tiff.read_tiff_tags) rather
+    than through Pillow, whose decompression bomb limit refuses to open
+    slides and is a process-wide setting other threads rely on.
+    """
+    try:
+        _, tags = read_tiff_tags(path)
+        width, height = tags['width'], tags['height']
+    except (OSError, ValueError, KeyError, struct.error):
+        return None, None, None, None
+    # Tags with a value per sample are tuples, e.g. (8, 8, 8) for RGB
+    bits, sample_format = (np.atleast_1d(tags.get(name, 1))[0].item()
+                           for name in ('bits_per_sample', 'sample_format'))
+    kind = SAMPLE_KINDS.get(sample_format)
+    if bits == 1:
+        dtype = 'bool'
+    elif kind is not None and bits in (8, 16, 32, 64):
+        dtype = np.dtype('%s%d' % (kind, bits // 8)).name
+    else:
+        dtype = None
+    return width, height, tags.get('samples_per_pixel', 1), dtype
+
+
+class SlideCatalog:
+    """
+    SlideCatalog Class
+
+    Persistent, incrementally refreshed index of the slides in one or more
+    Data folders.
+
+    Methods:
+        __init__(self, db_path=None, pyramid_cache_dir=None):
+            Opens (or creates) the catalog database, by default in the
+            per-user cache directory.
+
+        refresh(self, data_path, full=False):
+            Brings the catalog of a folder up to date and returns the
+            number of slides that were added, changed or removed.
+
+        names(self, data_path):
+            Returns the slide file names of a folder, sorted.
+
+        slide(self, data_path, name):
+            Returns the catalogued metadata of one slide as a dict.
+
+        set_pyramid(self, data_path, name, available=True):
+            Records that a slide's pyramid has been cached.
+
+        close_connection(self):
+            Closes the SQLite database connection.
+    """
+
+    def __init__(self, db_path=None, pyramid_cache_dir=None):
+        if db_path is None:
+            db_path = os.path.join(default_cache_dir(), 'slide_catalog.db')
+        folder = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        self.pyramid_cache_dir = pyramid_cache_dir
+        # The grading server lends catalogs to its worker threads, one
+        # thread at a time
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.cursor = self.connection.cursor()
+        self.probed = 0
+        self.create_tables()
+
+    def create_tables(self):
+        """Create the 'Slides' table if it does not exist."""
+        with self.connection:
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS Slides (
+                    Folder TEXT NOT NULL,
+                    Name TEXT NOT NULL,
+                    Size INTEGER,
+                    MTime INTEGER,
+                    Width INTEGER,
+                    Height INTEGER,
+                    Channels INTEGER,
+                    Dtype TEXT,
+                    Pyramid INTEGER DEFAULT 0,
+                    PRIMARY KEY (Folder, Name)
+                )
+            ''')
+
+    def refresh(self, data_path, full=False):
+        """
+        Bring the catalog of `data_path` up to date. Slides whose size and
+        mtime are unchanged are not opened again, unless `full` is set.
+
+        Returns:
+        - int: Number of slides added, changed or removed.
+        """
+        folder = os.path.abspath(data_path)
+        self.cursor.execute('SELECT Name, Size, MTime FROM Slides WHERE Folder=?',
+                            (folder,))
+        known = {name: (size, mtime) for name, size, mtime in self.cursor.fetchall()}
+
+        changed = []
+        seen = set()
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if not is_slide(entry.name):
+                    continue
+                seen.add(entry.name)
+                stat = entry.stat()
+                if not full and \
+                        known.get(entry.name) == (stat.st_size, stat.st_mtime_ns):
+                    continue
+                self.probed += 1
+                width, height, channels, dtype = probe_slide(entry.path)
+                pyramid = os.path.exists(os.path.join(
+                    pyramid_path(entry.name, stat.st_size, stat.st_mtime_ns,
+                                 self.pyramid_cache_dir), 'meta.json'))
+                changed.append((folder, entry.name, stat.st_size,
+                                stat.st_mtime_ns, width, height, channels,
+                                dtype, int(pyramid)))
+        removed = [(folder, name) for name in known if name not in seen]
+
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO Slides (Folder, %s) VALUES (%s)'
+                % (', '.join(FIELDS), ', '.join('?' * (len(FIELDS) + 1))),
+                changed)
+            self.connection.executemany(
+                'DELETE FROM Slides WHERE Folder=? AND Name=?', removed)
+        return len(changed) + len(removed)
+
+    def names(self, data_path):
+        """Return the slide names of a folder, sorted."""
+        self.cursor.execute('SELECT Name FROM Slides WHERE Folder=? ORDER BY Name',
+                            (os.path.abspath(data_path),))
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def slide(self, data_path, name):
+        """Return the metadata of one slide as a dict, or None."""
+        self.cursor.execute('SELECT %s FROM Slides WHERE Folder=? AND Name=?'
+                            % ', '.join(FIELDS),
+                            (os.path.abspath(data_path), name))
+        row = self.cursor.fetchone()
+        return dict(zip(FIELDS, row)) if row else None
+
+    def set_pyramid(self, data_path, name, available=True):
+        """Record whether the pyramid of a slide is cached."""
+        with self.connection:
+            self.connection.execute(
+                'UPDATE Slides SET Pyramid=? WHERE Folder=? AND Name=?',
+                (int(available), os.path.abspath(data_path), name))
+
+    def close_connection(self):
+        """Close the SQLite database connection."""
+        self.connection.close()
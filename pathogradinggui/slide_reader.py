@@ -0,0 +1,81 @@
+"""
+SlideReader Module
+
+This module reads the pixels of slides served by a grading server (see
+slide_source.RemoteSlide) off the Qt main thread. Each read of a remote
+slide is an HTTP request; made from a timer slot or a scroll handler it
+would freeze the window for a round trip, or for the whole timeout if
+the server is unreachable. The viewers hand such reads to a SlideReader,
+which runs them on a small pool of threads and delivers the result, or
+the error, back on the GUI thread with signals.
+
+Usage:
+    # Example usage:
+    reader = SlideReader()
+    reader.ready.connect(on_ready)          # on_ready(tag, (img, extent))
+    reader.failed.connect(on_failed)        # on_failed(tag, message)
+    reader.read(('view', 1), slide.render_view, x_limits, y_limits, 800, 600)
+
+    # When done
+    reader.shutdown()
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+
+class SlideReader(QObject):
+    """
+    Runs slide reads on worker threads.
+
+    Args:
+    - max_workers (int): Reads running at once.
+
+    Signals:
+    - ready(object, object): Emitted with the tag and the result of each
+        read.
+    - failed(object, str): Emitted with the tag and the error message if a
+        read raised, e.g. the server could not be reached (OSError) or
+        refused the request (ValueError).
+
+    Methods:
+    - read(tag, function, *args): Call function(*args) on a worker thread.
+    - shutdown(): Cancel waiting reads and stop the workers.
+    """
+
+    ready = pyqtSignal(object, object)
+    failed = pyqtSignal(object, str)
+    # Worker results, delivered to the GUI thread
+    _finished = pyqtSignal(object, object)
+
+    def __init__(self, max_workers=4, parent=None):
+        super().__init__(parent)
+        self.max_workers = max_workers
+        self._executor = None
+        self._finished.connect(self._on_finished)
+
+    def read(self, tag, function, *args):
+        """Call function(*args) on a worker thread; report it with tag."""
+        if self._executor is None:
+            # Only started once a remote slide is shown
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix='slide-reader')
+        future = self._executor.submit(function, *args)
+        future.add_done_callback(lambda done: self._finished.emit(done, tag))
+
+    def _on_finished(self, future, tag):
+        if future.cancelled():
+            return
+        try:
+            result = future.result()
+        except Exception as err:  # pylint: disable=broad-except
+            self.failed.emit(tag, str(err))
+            return
+        self.ready.emit(tag, result)
+
+    def shutdown(self):
+        """Cancel waiting reads and stop the worker threads."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,499 @@
+"""
+SlideSource Module
+
+This module provides tiled, multi-resolution access to biopsy slides.
+Instead of handing the whole full-resolution array to the viewer every
+time a slide is shown, a SlideSource keeps a downsampled pyramid of the
+slide on disk and serves only the tiles that cover the requested region,
+at the resolution level that matches the size of the canvas.
+
+The pyramid is built once per slide (the only time the full-resolution
+image is decoded) and stored as one .npy file per level in a cache
+directory keyed on the slide name, size and modification time. Later
+views memory-map the levels, so the first view of a slide only touches
+the pages of its thumbnail level.
+
+Uncompressed TIFF slides are not decoded at all: their level 0 is a
+memory map of the TIFF file itself (see mapped_tiff), so it is not
+copied into the pyramid cache or the decoded image cache, and reading a
+region only faults in the pages that hold it.
+
+RemoteSlide has the same interface for slides read from a grading server
+(see grading_server.py): the server keeps the pyramid and sends tiles and
+views.
+
+Usage:
+    # Example usage:
+    source = SlideSource('../Data/S001_D1.tif')
+
+    # Thumbnail of the whole slide for a 500x400 canvas
+    img, extent = source.read_view((-0.5, source.width - 0.5),
+                                   (source.height - 0.5, -0.5),
+                                   500, 400)
+    axes.imshow(img, extent=extent)
+
+    # Exactly the visible window, at most 500x400 pixels
+    img, extent = source.render_view(axes.get_xlim(), axes.get_ylim(),
+                                     500, 400)
+
+    # Share decoded levels between slides, bounded to 512 MiB
+    cache = DecodedImageCache(512 * 2**20)
+    source = SlideSource('../Data/S001_D1.tif', image_cache=cache)
+
+Note:
+    All coordinates passed to and returned from a SlideSource are in
+    full-resolution (level 0) pixel space, using the same convention as
+    matplotlib's imshow: pixel i covers [i - 0.5, i + 0.5].
+"""
+
+import io
+import os
+import json
+import math
+import numpy as np
+import matplotlib.image as mpimg
+
+import perf_log
+from mapped_tiff import map_tiff
+
+TILE_SIZE = 512            # tile edge length in pixels, at every level
+MIN_LEVEL_SIZE = 256       # stop the pyramid once the longest side fits
+BAND_ROWS = 1024           # rows downsampled at a time while building
+
+
+def default_cache_dir(*parts):
+    """
+    Return the per-user cache directory used for pyramids and other
+    derived slide data, e.g. default_cache_dir('pyramids').
+    """
+    root = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(root, 'pathogui', *parts)
+
+
+def pyramid_path(image_name, size, mtime_ns, cache_dir=None):
+    """
+    Return the pyramid directory of a slide file with the given name, size
+    and modification time. It holds a meta.json once the pyramid is complete.
+    """
+    if cache_dir is None:
+        cache_dir = default_cache_dir('pyramids')
+    return os.path.join(cache_dir, '%s-%d-%d' % (image_name, size, mtime_ns))
+
+
+def _halve(array):
+    """
+    Downsample an image by 2 in both directions with a 2x2 block mean.
+
+    Odd edges are padded by repeating the last row/column. The work is
+    done in bands of BAND_ROWS rows so a large base level never needs a
+    full floating point copy in memory.
+    """
+    height, width = array.shape[:2]
+    out_h, out_w = (height + 1) // 2, (width + 1) // 2
+    out = np.empty((out_h, out_w) + array.shape[2:], dtype=array.dtype)
+    for start in range(0, height, BAND_ROWS):
+        band = np.asarray(array[start:start + BAND_ROWS], dtype=np.float32)
+        pad = [(0, band.shape[0] % 2), (0, width % 2)] + \
+            [(0, 0)] * (band.ndim - 2)
+        if band.shape[0] % 2 or width % 2:
+            band = np.pad(band, pad, mode='edge')
+        band = band.reshape((band.shape[0] // 2, 2, band.shape[1] // 2, 2)
+                            + band.shape[2:]).mean(axis=(1, 3))
+        if np.issubdtype(array.dtype, np.integer):
+            band = np.rint(band)
+        out[start // 2:start // 2 + band.shape[0]] = band
+    return out
+
+
+def block_mean(array, factor):
+    """
+    Downsample an image by an integer factor with a vectorized block mean.
+
+    Rows and columns that do not fill a whole block are dropped, so the
+    result covers exactly factor * result.shape[:2] input pixels.
+    """
+    height = array.shape[0] // factor * factor
+    width = array.shape[1] // factor * factor
+    blocks = np.asarray(array[:height, :width], dtype=np.float32)
+    out = blocks.reshape((height // factor, factor, width // factor, factor)
+                         + array.shape[2:]).mean(axis=(1, 3))
+    if np.issubdtype(array.dtype, np.integer):
+        out = np.rint(out)
+    return out.astype(array.dtype)
+
+
+def fit_to(array, out_width, out_height):
+    """
+    Reduce an image to at most out_width x out_height pixels by picking
+    evenly spaced rows and columns. Smaller images are returned as is.
+    """
+    height, width = array.shape[:2]
+    out_w = max(min(int(math.ceil(out_width)), width), 1)
+    out_h = max(min(int(math.ceil(out_height)), height), 1)
+    if (out_h, out_w) == (height, width):
+        return array
+    rows = (np.arange(out_h) * height) // out_h
+    columns = (np.arange(out_w) * width) // out_w
+    return array[rows[:, None], columns]
+
+
+class SlideSource:
+    """
+    SlideSource Class
+
+    Tiled, multi-resolution view of one slide. Level 0 is the full
+    resolution image; level k is downsampled by 2**k.
+
+    Methods:
+        __init__(self, image_path, cache_dir=None, tile_size=TILE_SIZE,
+                 image_cache=None):
+            Opens the slide, reusing its pyramid from cache_dir when one
+            exists for the current file, building it otherwise. Levels
+            decoded while building it are kept in image_cache (a
+            DecodedImageCache) and shared across SlideSource instances.
+
+        level(self, level):
+            Returns the array of one pyramid level. Level 0 of an
+            uncompressed TIFF is a memory map of the file.
+
+        best_level(self, downsample):
+            Returns the coarsest level that still has at least one level
+            pixel per screen pixel for the given downsample factor.
+
+        tiles_for_region(self, level, x_range, y_range):
+            Returns the (column, row) tile indices covering a region.
+
+        read_tile(self, level, column, row):
+            Returns the pixels of a single tile.
+
+        read_region(self, level, x_range, y_range):
+            Returns the tiles covering a region as one array, together
+            with its imshow extent in level 0 pixel space.
+
+        read_view(self, x_limits, y_limits, out_width, out_height):
+            Picks the level that matches the output size and returns the
+            region covering the given axes limits.
+
+        render_view(self, x_limits, y_limits, out_width, out_height):
+            Returns just the visible window, downsampled to at most
+            out_width x out_height pixels, for handing to imshow.
+    """
+
+    # Whether reads go over the network (see RemoteSlide)
+    remote = False
+
+    def __init__(self, image_path, cache_dir=None, tile_size=TILE_SIZE,
+                 image_cache=None):
+        self.image_path = image_path
+        self.tile_size = tile_size
+        self.image_cache = image_cache
+
+        stat = os.stat(image_path)
+        self._cache_key = (os.path.abspath(image_path), stat.st_mtime_ns)
+        self.pyramid_dir = pyramid_path(os.path.basename(image_path),
+                                        stat.st_size, stat.st_mtime_ns, cache_dir)
+        self.pyramid_on_disk = False
+        # Zero-copy level 0 for uncompressed TIFFs, None otherwise
+        self.mapped = map_tiff(image_path)
+
+        self.shape = None
+        self.dtype = None
+        self.downsamples = []
+        self.level_shapes = []
+        self._levels = {}
+
+        if not self._load_meta():
+            self.build_pyramid()
+
+    @property
+    def width(self):
+        """Full resolution width in pixels."""
+        return self.shape[1]
+
+    @property
+    def height(self):
+        """Full resolution height in pixels."""
+        return self.shape[0]
+
+    @property
+    def level_count(self):
+        """Number of levels in the pyramid."""
+        return len(self.downsamples)
+
+    def _level_path(self, level):
+        return os.path.join(self.pyramid_dir, 'level_%d.npy' % level)
+
+    def _load_meta(self):
+        meta_path = os.path.join(self.pyramid_dir, 'meta.json')
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as file:
+                meta = json.load(file)
+        except (OSError, ValueError):
+            return False
+        self.shape = tuple(meta['shape'])
+        self.dtype = np.dtype(meta['dtype'])
+        self.downsamples = meta['downsamples']
+        self.level_shapes = [tuple(shape) for shape in meta['level_shapes']]
+        if meta.get('mapped_level0') and self.mapped is None:
+            return False
+        self.pyramid_on_disk = True
+        return True
+
+    def build_pyramid(self):
+        """
+        Decode the full resolution slide once and write its pyramid.
+
+        Mapped TIFFs are downsampled straight from the memory map, and
+        their level 0 is not written to the cache. If the cache directory
+        cannot be written the levels are kept in memory for the lifetime
+        of this SlideSource instead.
+        """
+        if self.mapped is not None:
+            level = self.mapped
+        else:
+            with perf_log.timed('decode'):
+                level = mpimg.imread(self.image_path)
+        levels = [level]
+        with perf_log.timed('pyramid'):
+            while max(level.shape[:2]) > MIN_LEVEL_SIZE:
+                level = _halve(level)
+                levels.append(level)
+
+        self.shape = levels[0].shape
+        self.dtype = levels[0].dtype
+        self.downsamples = [2 ** k for k in range(len(levels))]
+        self.level_shapes = [lvl.shape for lvl in levels]
+        self._levels = dict(enumerate(levels))
+        first = 0 if self.mapped is None else 1
+        if self.image_cache is not None:
+            for k, lvl in enumerate(levels[first:], first):
+                self.image_cache.put(self._cache_key + (k,), lvl)
+
+        meta = {'shape': list(self.shape), 'dtype': self.dtype.str,
+                'downsamples': self.downsamples,
+                'level_shapes': [list(shape) for shape in self.level_shapes],
+                'mapped_level0': self.mapped is not None}
+        try:
+            os.makedirs(self.pyramid_dir, exist_ok=True)
+            for k, lvl in enumerate(levels[first:], first):
+                # Write to a temporary name first so that a crash never
+                # leaves a truncated level behind a valid meta.json
+                tmp_path = self._level_path(k) + '.tmp'
+                with open(tmp_path, 'wb') as file:
+                    np.save(file, lvl)
+                os.replace(tmp_path, self._level_path(k))
+            tmp_path = os.path.join(self.pyramid_dir, 'meta.json.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(meta, file)
+            os.replace(tmp_path, os.path.join(self.pyramid_dir, 'meta.json'))
+        except OSError:
+            return
+        self.pyramid_on_disk = True
+        # Drop the decoded arrays, later reads go through memory maps
+        self._levels = {}
+
+    def level(self, level):
+        """
+        Return the array of a pyramid level.
+
+        Levels decoded by build_pyramid are served from the decoded image
+        cache while it holds them. Otherwise the level is memory-mapped
+        from the pyramid cache and not copied: only the pages that are
+        read are loaded, and the page cache shares them between
+        SlideSource instances. The mapped level 0 of a TIFF is always
+        returned as is.
+        """
+        if level == 0 and self.mapped is not None:
+            return self.mapped
+        if level in self._levels:
+            return self._levels[level]
+        if self.image_cache is not None:
+            key = self._cache_key + (level,)
+            cached = self.image_cache.get(key)
+            if cached is not None:
+                return cached
+        data = np.load(self._level_path(level), mmap_mode='r')
+        self._levels[level] = data
+        return data
+
+    def best_level(self, downsample):
+        """Return the coarsest level with downsample <= the given one."""
+        best = 0
+        for k, level_downsample in enumerate(self.downsamples):
+            if level_downsample <= downsample:
+                best = k
+        return best
+
+    def _level_bounds(self, level, x_range, y_range):
+        """
+        Convert a level 0 region to clipped level pixel bounds. The start
+        stays on the last column/row for a region past the right/bottom
+        edge, so a region outside the slide is an empty one at its edge.
+        """
+        downsample = self.downsamples[level]
+        height, width = self.level_shapes[level][:2]
+        x_lo, x_hi = sorted(x_range)
+        y_lo, y_hi = sorted(y_range)
+        col0 = min(max(int(math.floor((x_lo + 0.5) / downsample)), 0), width - 1)
+        col1 = min(max(int(math.ceil((x_hi + 0.5) / downsample)), 0), width)
+        row0 = min(max(int(math.floor((y_lo + 0.5) / downsample)), 0), height - 1)
+        row1 = min(max(int(math.ceil((y_hi + 0.5) / downsample)), 0), height)
+        return col0, col1, row0, row1
+
+    def tiles_for_region(self, level, x_range, y_range):
+        """Return the (column, row) indices of the tiles covering a region."""
+        col0, col1, row0, row1 = self._level_bounds(level, x_range, y_range)
+        size = self.tile_size
+        return [(column, row)
+                for row in range(row0 // size, (max(row1, 1) - 1) // size + 1)
+                for column in range(col0 // size,
+                                    (max(col1, 1) - 1) // size + 1)]
+
+    def read_tile(self, level, column, row):
+        """Return the pixels of one tile (edge tiles may be smaller)."""
+        size = self.tile_size
+        data = self.level(level)
+        return np.ascontiguousarray(
+            data[row * size:(row + 1) * size, column * size:(column + 1) * size])
+
+    def tile_extent(self, level, column, row):
+        """Return the imshow extent of one tile in level 0 pixel space."""
+        size = self.tile_size
+        height, width = self.level_shapes[level][:2]
+        return self._extent(level, column * size, min((column + 1) * size, width),
+                            row * size, min((row + 1) * size, height))
+
+    def _extent(self, level, col0, col1, row0, row1):
+        downsample = self.downsamples[level]
+        return (col0 * downsample - 0.5,
+                min(col1 * downsample, self.width) - 0.5,
+                min(row1 * downsample, self.height) - 0.5,
+                row0 * downsample - 0.5)
+
+    def read_region(self, level, x_range, y_range):
+        """
+        Return the pixels of the tiles covering a region at one level.
+
+        Args:
+        - level (int): Pyramid level to read from.
+        - x_range, y_range (tuple): Region bounds in level 0 pixel space,
+            in any order.
+
+        Returns:
+        - (numpy.ndarray, tuple): The tile-aligned pixels and their imshow
+            extent (left, right, bottom, top) in level 0 pixel space.
+        """
+        col0, col1, row0, row1 = self._level_bounds(level, x_range, y_range)
+        col1, row1 = max(col1, col0 + 1), max(row1, row0 + 1)
+        size = self.tile_size
+        height, width = self.level_shapes[level][:2]
+        # Snap outwards to the tile grid so small pans reuse the same tiles
+        col0, row0 = col0 // size * size, row0 // size * size
+        col1 = min(-(-col1 // size) * size, width)
+        row1 = min(-(-row1 // size) * size, height)
+        data = self.level(level)
+        pixels = np.ascontiguousarray(data[row0:row1, col0:col1])
+        return pixels, self._extent(level, col0, col1, row0, row1)
+
+    def read_view(self, x_limits, y_limits, out_width, out_height):
+        """
+        Return the region covering the axes limits at the level matching
+        an output of out_width x out_height screen pixels.
+        """
+        view_w = abs(x_limits[1] - x_limits[0])
+        view_h = abs(y_limits[1] - y_limits[0])
+        downsample = min(view_w / max(out_width, 1),
+                         view_h / max(out_height, 1))
+        level = self.best_level(downsample)
+        return self.read_region(level, x_limits, y_limits)
+
+    def render_view(self, x_limits, y_limits, out_width, out_height):
+        """
+        Return the pixels of the visible window, never more than the
+        output has.
+
+        The window is read from the matching pyramid level without
+        snapping to tiles, reduced by the remaining integer factor with
+        block_mean, and finally thinned with fit_to so it has at most
+        out_width x out_height pixels. Agg then has next to nothing to
+        resample on a draw.
+
+        Args:
+        - x_limits, y_limits (tuple): Axes limits in level 0 pixel space,
+            as returned by axes.get_xlim() / axes.get_ylim().
+        - out_width, out_height (float): Size of the axes in screen
+            pixels (figure DPI included), e.g. axes.bbox.width.
+
+        Returns:
+        - (numpy.ndarray, tuple): The pixels and their imshow extent
+            (left, right, bottom, top) in level 0 pixel space.
+        """
+        view_w = abs(x_limits[1] - x_limits[0])
+        view_h = abs(y_limits[1] - y_limits[0])
+        downsample = min(view_w / max(out_width, 1),
+                         view_h / max(out_height, 1))
+        level = self.best_level(downsample)
+        col0, col1, row0, row1 = self._level_bounds(level, x_limits, y_limits)
+        col1, row1 = max(col1, col0 + 1), max(row1, row0 + 1)
+        window = self.level(level)[row0:row1, col0:col1]
+
+        factor = int(downsample / self.downsamples[level])
+        factor = max(min(factor, window.shape[0], window.shape[1]), 1)
+        with perf_log.timed('downsample'):
+            if factor > 1:
+                pixels = block_mean(window, factor)
+                col1 = col0 + pixels.shape[1] * factor
+                row1 = row0 + pixels.shape[0] * factor
+            else:
+                pixels = window
+            pixels = np.ascontiguousarray(fit_to(pixels, out_width, out_height))
+        return pixels, self._extent(level, col0, col1, row0, row1)
+
+
+class RemoteSlide(SlideSource):
+    """
+    SlideSource served by a grading server (see grading_server.py), for
+    MainWindow running as a thin client. It has the interface the viewers
+    use (width, height, best_level, tiles_for_region, read_tile and
+    render_view); the pixels of tiles and views are read over HTTP, the
+    level geometry is computed locally from the slide's metadata. The
+    viewers read tiles and views of remote slides off the Qt main thread
+    (see slide_reader.py).
+
+    Args:
+    - client (GradingClient): Client of the server, logged in.
+    - name (str): Slide name, as listed by the server.
+    - meta (dict): Metadata returned by the server for the slide: shape,
+        dtype, downsamples, level_shapes and tile_size.
+    """
+
+    remote = True
+
+    def __init__(self, client, name, meta):  # pylint: disable=super-init-not-called
+        self.client = client
+        self.image_path = name
+        self.tile_size = meta['tile_size']
+        self.image_cache = None
+        self.pyramid_on_disk = False
+        self.mapped = None
+        self.shape = tuple(meta['shape'])
+        self.dtype = np.dtype(meta['dtype'])
+        self.downsamples = meta['downsamples']
+        self.level_shapes = [tuple(shape) for shape in meta['level_shapes']]
+        self._levels = {}
+
+    def level(self, level):
+        """Whole levels are not sent by the server."""
+        raise ValueError('Remote slides are read by tile or by view')
+
+    def read_tile(self, level, column, row):
+        """Return the pixels of one tile, read from the server."""
+        data = self.client.tile(self.image_path, level, column, row)
+        return np.load(io.BytesIO(data), allow_pickle=False)
+
+    def render_view(self, x_limits, y_limits, out_width, out_height):
+        """Return the visible window and its extent, rendered by the server."""
+        data, extent = self.client.view(self.image_path, x_limits, y_limits,
+                                        out_width, out_height)
+        return np.load(io.BytesIO(data), allow_pickle=False), extent
@@ -4,6 +4,7 @@ Testing GUI_pyqt5.py for the following function
 2) test_clear_input (one-shot test)
 3) test_save_coords (one-shot test)
 4) test_load_image_unsupported_type (Edge test)
+5) test_load_remote_image_without_blocking (Edge test)
 
 NOTE (12/10/23) test all functions at the same time resulted in 'Segmentation fault' warning
 This file supports only one test per run
@@ -14,6 +15,8 @@ import unittest
 import os
 import shutil
 import tempfile
+import threading
+import time
 import pytest
 from pytest import ExitCode
 
@@ -31,6 +34,32 @@ from login_dialog import LoginDialog, show_login_dialog
 
 from GUI_pyqt5 import MainWindow
 
+class StalledClient:
+    """ Grading client of a server that does not answer until released"""
+
+    def __init__(self):
+        self.released = threading.Event()
+
+    def slide_names(self):
+        return ['S001_A.tif', 'S002_A.tif']
+
+    def results_for_user(self, _user):
+        return []
+
+    def open_slide(self, _name):
+        self.released.wait(10)
+        raise OSError('Grading server unreachable')
+
+    def results_for_image(self, _image):
+        self.released.wait(10)
+        return []
+
+    def write_rows(self, _rows):
+        pass
+
+    def close_connection(self):
+        pass
+
 class TestMainWindow(unittest.TestCase):
     """ This class manges the test for Patho GUI application"""
 
@@ -125,8 +154,10 @@ class TestMainWindow(unittest.TestCase):
         window.image_name = image_name
         window.user_name.setText(user_name)
 
-        # Call the save_coords function
+        # Call the save_coords function and wait for the background writer
         window.save_coords()
+        window.results_writer.flush()
+        QApplication.processEvents()
 
         # Assert that the CSV file is created with the expected values
         # ignore date&time column in expected_csv_content file
@@ -160,5 +191,25 @@ class TestMainWindow(unittest.TestCase):
         with self.assertRaises(Exception):
             self.main_window.load_image()
 
+    def test_load_remote_image_without_blocking(self):
+        """ A slide of a stalled grading server is opened off the GUI thread"""
+        client = StalledClient()
+        try:
+            start = time.perf_counter()
+            window = MainWindow("test_user", client=client)
+            window.next_image()
+            self.assertLess(time.perf_counter() - start, 2)
+            self.assertIsNone(window.image_name)
+        finally:
+            client.released.set()
+        # The error is reported once the read gives up
+        end = time.perf_counter() + 5
+        while window.loading_slide is not None and time.perf_counter() < end:
+            QApplication.processEvents()
+        self.assertEqual(window.statusBar().currentMessage(),
+                         "Could not read the slide: Grading server unreachable")
+        self.assertIsNone(window.image_name)
+        window.close()
+
 if __name__ == '__main__':
     unittest.main()
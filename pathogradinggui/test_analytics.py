@@ -0,0 +1,108 @@
+"""
+Testing analytics.py for the following function
+1) test_load_csv_and_sqlite (smoke test)
+2) test_distribution_and_sums (one-shot test)
+3) test_throughput (one-shot test)
+4) test_kappa (one-shot test)
+5) test_no_results (Edge test)
+"""
+import unittest
+import os
+import shutil
+import tempfile
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from results_store import CsvResultsSink, ResultsDatabase
+from analytics import (load_results, grade_distribution, gleason_sums,
+                       throughput, cohen_kappa, pairwise_kappa, fleiss_kappa)
+
+ROWS = [
+    ['2023-12-10 10:00:00', 'alice', 'S001_A.tif', '3', '4', '1.000', '2.000', ''],
+    ['2023-12-10 10:10:00', 'alice', 'S002_A.tif', '4', '4', '1.000', '2.000', ''],
+    ['2023-12-10 10:20:00', 'alice', 'S003_A.tif', '5', '4', '1.000', '2.000', ''],
+    ['2023-12-10 10:25:00', 'alice', 'S003_A.tif', '5', '5', '1.000', '2.000', ''],
+    ['2023-12-10 10:00:00', 'bob', 'S001_A.tif', '3', '4', '1.000', '2.000', ''],
+    ['2023-12-10 10:05:00', 'bob', 'S002_A.tif', '3', '3', '1.000', '2.000', ''],
+    ['2023-12-10 12:00:00', 'bob', 'S003_A.tif', '5', '5', '1.000', '2.000', ''],
+    ['2023-12-10 12:01:00', 'bob', 'S004_A.tif', ' ', ' ', '1.000', '2.000', ''],
+    ['2023-12-10 10:00:00', 'carol', 'S001_A.tif', '4', '3', '1.000', '2.000', ''],
+]
+
+
+class TestAnalytics(unittest.TestCase):
+    """ This class manages the tests for the results analytics"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        CsvResultsSink(self.temp_dir).write_rows(ROWS)
+        self.frame = load_results(self.temp_dir, 'csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_load_csv_and_sqlite(self):
+        """ Smoke test: both backends load into the same typed frame"""
+        self.assertEqual(len(self.frame), len(ROWS))
+        self.assertEqual(str(self.frame['User'].dtype), 'category')
+        self.assertEqual(self.frame['GleasonSum'].iloc[0], 7)
+        self.assertTrue(self.frame['PrimaryGrade'].isna().iloc[7])
+
+        results_db = ResultsDatabase(os.path.join(self.temp_dir, 'results_database.db'))
+        results_db.write_rows(ROWS)
+        results_db.close_connection()
+        frame = load_results(self.temp_dir)
+        self.assertEqual(sorted(frame['GleasonSum'].dropna()),
+                         sorted(self.frame['GleasonSum'].dropna()))
+
+    def test_distribution_and_sums(self):
+        """ Distributions and sums use each user's latest grade"""
+        distribution = grade_distribution(self.frame)
+        self.assertEqual(list(distribution.loc['S001_A.tif']), [2, 1, 0, 1, 2, 0])
+        self.assertEqual(distribution.loc['S003_A.tif', 'Secondary_5'], 2)
+        sums = gleason_sums(self.frame)
+        self.assertEqual(sums.loc['S001_A.tif', 'Raters'], 3)
+        self.assertEqual(sums.loc['S001_A.tif', 'Mode'], 7)
+        self.assertEqual(sums.loc['S003_A.tif', 'Mean'], 10)
+        self.assertNotIn('S004_A.tif', sums.index)
+
+    def test_throughput(self):
+        """ Active time ignores gaps longer than the session gap"""
+        result = throughput(self.frame)
+        self.assertEqual(result.loc['alice', 'Saves'], 4)
+        self.assertEqual(result.loc['alice', 'Slides'], 3)
+        self.assertAlmostEqual(result.loc['alice', 'ActiveHours'], 25 / 60)
+        self.assertAlmostEqual(result.loc['bob', 'ActiveHours'], 6 / 60)
+
+    def test_kappa(self):
+        """ Kappa values match hand computed ones"""
+        self.assertEqual(cohen_kappa([7, 8, 10], [7, 8, 10]), 1.0)
+        # 4 slides, agreement on 2: po = 0.5, pe = 0.25
+        self.assertAlmostEqual(cohen_kappa([1, 2, 1, 2], [1, 1, 2, 2]), 0.0)
+        self.assertAlmostEqual(cohen_kappa([1, 2, 3, 3], [1, 2, 3, 1]),
+                               (0.75 - 0.3125) / (1 - 0.3125))
+        pairs = pairwise_kappa(self.frame)
+        alice_bob = pairs[(pairs.UserA == 'alice') & (pairs.UserB == 'bob')]
+        self.assertEqual(int(alice_bob.Slides.iloc[0]), 3)
+        # Three slides rated 7/7/7, 8/6 and 10/10; sums 6, 7, 8, 10 are
+        # used 1, 3, 1 and 2 times out of 7
+        agreement = [1.0, 0.0, 1.0]
+        expected = sum(p * p for p in (1 / 7, 3 / 7, 1 / 7, 2 / 7))
+        self.assertAlmostEqual(fleiss_kappa(self.frame),
+                               (sum(agreement) / 3 - expected) / (1 - expected))
+
+    def test_no_results(self):
+        """ Edge test: an empty Results folder gives empty tables"""
+        empty = tempfile.mkdtemp()
+        try:
+            frame = load_results(empty, 'csv')
+            self.assertEqual(len(frame), 0)
+            self.assertEqual(len(grade_distribution(frame)), 0)
+            self.assertTrue(pd.isna(fleiss_kappa(frame)))
+        finally:
+            shutil.rmtree(empty)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+Testing annotation_overlay.py for the following function
+1) test_one_collection_for_viewport (smoke test)
+2) test_toggle_10k_regions_fast (one-shot test)
+3) test_other_users_hidden (Edge test)
+"""
+import unittest
+import os
+import time
+import random
+import shutil
+import tempfile
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+pytest.importorskip("PyQt5.QtWidgets")
+
+from PyQt5.QtWidgets import QApplication
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from slide_source import SlideSource
+from render_controller import SlideRenderer
+from annotations import Annotation, AnnotationStore, SlideAnnotations
+from annotation_overlay import AnnotationOverlay
+
+
+class TestAnnotationOverlay(unittest.TestCase):
+    """ This class manages the tests for the annotation overlay"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Create one QApplication, a synthetic slide and 10k regions."""
+        cls.app = QApplication.instance() or QApplication([])
+        cls.temp_dir = tempfile.mkdtemp()
+        image_path = os.path.join(cls.temp_dir, 'S997_A.tif')
+        Image.fromarray(np.zeros((2000, 3000, 3), dtype=np.uint8)).save(image_path)
+        cls.slide = SlideSource(image_path, os.path.join(cls.temp_dir, 'cache'))
+        cls.store = AnnotationStore(os.path.join(cls.temp_dir, 'annotations.db'))
+        rng = random.Random(0)
+        rows = []
+        for number in range(10000):
+            x, y = rng.uniform(0, 2950), rng.uniform(0, 1950)
+            rows.append(Annotation.rectangle('alice' if number % 2 else 'bob',
+                                             'S997_A.tif', (x, x + 50),
+                                             (y, y + 50), rng.choice('345')))
+        for annotation in rows:
+            cls.store.save(annotation)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the synthetic slide and the annotations."""
+        cls.store.close_connection()
+        shutil.rmtree(cls.temp_dir)
+
+    def setUp(self):
+        self.figure = Figure(figsize=(5, 4), dpi=100)
+        self.canvas = FigureCanvas(self.figure)
+        self.renderer = SlideRenderer(self.figure, self.canvas)
+        self.overlay = AnnotationOverlay(self.renderer)
+        self.renderer.set_slide(self.slide, 'Biopsy name: S997_A')
+        self.annotations = SlideAnnotations(self.store, 'S997_A.tif')
+        self.canvas.draw()
+
+    def test_one_collection_for_viewport(self):
+        """ Smoke test: the visible regions are one collection"""
+        self.overlay.set_annotations(self.annotations)
+        self.assertEqual(self.overlay.shown, 10000)
+        self.assertEqual(len(self.renderer.axes.collections), 1)
+        self.renderer.axes.set_xlim(0, 300)
+        self.renderer.axes.set_ylim(300, 0)
+        self.renderer.render()
+        self.assertLess(self.overlay.shown, 500)
+        self.assertEqual(len(self.overlay.collection.get_paths()),
+                         self.overlay.shown)
+
+    def test_toggle_10k_regions_fast(self):
+        """ Toggling the overlay of 10k regions takes milliseconds"""
+        self.overlay.set_annotations(self.annotations)
+        start = time.perf_counter()
+        self.overlay.set_visible(False)
+        self.overlay.set_visible(True)
+        self.assertLess(time.perf_counter() - start, 0.1)
+        self.assertEqual(self.overlay.shown, 10000)
+
+    def test_other_users_hidden(self):
+        """ Edge test: only the regions of the given user are drawn"""
+        self.overlay.set_annotations(self.annotations, 'alice')
+        self.assertEqual(self.overlay.shown, 5000)
+        self.overlay.set_annotations(None)
+        self.assertEqual(self.overlay.shown, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+Testing annotations.py for the following function
+1) test_persisted_per_slide (smoke test)
+2) test_grid_query_matches_scan (one-shot test)
+3) test_visible_query_fast (one-shot test)
+4) test_invalid_annotation (Edge test)
+"""
+import unittest
+import os
+import time
+import random
+import tempfile
+
+from annotations import Annotation, AnnotationStore, GridIndex, SlideAnnotations
+
+
+class TestAnnotations(unittest.TestCase):
+    """ This class manages the tests for the region annotations"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = AnnotationStore(os.path.join(self.tmp.name, 'annotations.db'))
+
+    def tearDown(self):
+        self.store.close_connection()
+        self.tmp.cleanup()
+
+    def test_persisted_per_slide(self):
+        """ Smoke test: annotations are saved and reloaded per slide"""
+        annotations = SlideAnnotations(self.store, 'S001_A.tif')
+        rect = annotations.add(Annotation.rectangle('alice', 'S001_A.tif',
+                                                    (400, 100), (50, 300), '3', '4'))
+        annotations.add(Annotation('alice', 'S001_A.tif', 'polygon',
+                                   [(0, 0), (10, 0), (5, 8)], '5', '5', 'tip'))
+        SlideAnnotations(self.store, 'S002_A.tif').add(
+            Annotation.rectangle('bob', 'S002_A.tif', (0, 1), (0, 1)))
+
+        reloaded = SlideAnnotations(self.store, 'S001_A.tif')
+        self.assertEqual(len(reloaded), 2)
+        first = reloaded.annotations[rect.annotation_id]
+        self.assertEqual(first.bbox, (100.0, 50.0, 400.0, 300.0))
+        self.assertEqual((first.primary_grade, first.secondary_grade), ('3', '4'))
+        self.assertEqual(len(first.vertices()), 4)
+
+        reloaded.remove(rect.annotation_id)
+        self.assertEqual(len(SlideAnnotations(self.store, 'S001_A.tif')), 1)
+
+    def test_grid_query_matches_scan(self):
+        """ Grid queries return exactly the overlapping boxes"""
+        rng = random.Random(0)
+        index = GridIndex(cell_size=100)
+        boxes = {}
+        for key in range(500):
+            x, y = rng.uniform(-50, 2000), rng.uniform(-50, 2000)
+            boxes[key] = (x, y, x + rng.uniform(0, 400), y + rng.uniform(0, 400))
+            index.insert(key, boxes[key])
+        for key in range(0, 500, 3):
+            index.remove(key)
+            del boxes[key]
+        for _ in range(50):
+            x, y = rng.uniform(0, 2000), rng.uniform(0, 2000)
+            x_range, y_range = (x + 300, x), (y, y + 250)
+            expected = {key for key, (x0, y0, x1, y1) in boxes.items()
+                        if x0 <= x + 300 and x1 >= x and y0 <= y + 250 and y1 >= y}
+            self.assertEqual(index.query(x_range, y_range), expected)
+
+    def test_visible_query_fast(self):
+        """ The viewport query over 5000 regions takes well under 1 ms"""
+        rng = random.Random(1)
+        index = GridIndex()
+        for key in range(5000):
+            x, y = rng.uniform(0, 50000), rng.uniform(0, 50000)
+            index.insert(key, (x, y, x + 200, y + 200))
+        start = time.perf_counter()
+        for _ in range(100):
+            index.query((20000, 22000), (31500, 30000))
+        self.assertLess((time.perf_counter() - start) / 100, 1e-3)
+
+    def test_invalid_annotation(self):
+        """ Edge test: unknown kinds and degenerate polygons are rejected"""
+        with self.assertRaises(ValueError):
+            Annotation('alice', 'S001_A.tif', 'circle', [(0, 0), (1, 1)])
+        with self.assertRaises(ValueError):
+            Annotation('alice', 'S001_A.tif', 'polygon', [(0, 0), (1, 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+"""
+Testing batch_ingest.py for the following function
+1) test_ingest_csv (smoke test)
+2) test_ingest_jsonl_sqlite (one-shot test)
+3) test_rejects (Edge test)
+"""
+import unittest
+import io
+import os
+import json
+import shutil
+import tempfile
+
+from batch_ingest import ingest, to_row
+from results_store import CsvResultsSink, ResultsDatabase
+
+IMAGES = {'S128_A.tif', 'S001_D1.tif'}
+
+
+class TestBatchIngest(unittest.TestCase):
+    """ This class manages the tests for the headless batch ingest"""
+
+    def setUp(self):
+        """Work in a temporary folder."""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the temporary folder."""
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, name, text):
+        """Write an input file and return its path."""
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        return path
+
+    def test_ingest_csv(self):
+        """ Smoke test: CSV records in the GUI's own layout are appended"""
+        path = self.write('grades.csv',
+                          'Date&Time,User,Image name,PrimaryGrade,SecondaryGrade,'
+                          'xcoord,ycoord,User comment\n'
+                          '2023-12-10 10:00:00,alice,S128_A.tif,3,4,10,20.5,"a, b"\n'
+                          '2023-12-10 10:01:00,alice,S001_D1,5,5,1,2,\n')
+        results = os.path.join(self.temp_dir, 'Results')
+        stats = ingest(path, CsvResultsSink(results), IMAGES, chunk_size=1)
+        self.assertEqual(stats['rows'], 2)
+        with open(os.path.join(results, 'Grading_result_alice.csv'),
+                  'r', encoding='utf-8') as file:
+            lines = file.read().splitlines()
+        self.assertEqual(lines[1], '2023-12-10 10:00:00,alice,S128_A.tif,'
+                                   '3,4,10.000,20.500,"a, b"')
+        self.assertEqual(lines[2].split(',')[2], 'S001_D1.tif')
+
+    def test_ingest_jsonl_sqlite(self):
+        """ JSONL records go into the SQLite results store"""
+        records = [{'user': 'bob', 'image': 'S128_A.tif', 'primary': 4,
+                    'secondary': 3, 'x': 1.5, 'y': 2, 'comment': 'ok'}] * 3
+        path = self.write('grades.jsonl',
+                          '\n'.join(json.dumps(r) for r in records) + '\n')
+        results_db = ResultsDatabase(os.path.join(self.temp_dir, 'results.db'))
+        stats = ingest(path, results_db, IMAGES, chunk_size=2)
+        self.assertEqual(stats['rows'], 3)
+        self.assertEqual(len(results_db.results_for_image('S128_A.tif')), 3)
+        self.assertGreater(stats['rows_per_second'], 0)
+        results_db.close_connection()
+
+    def test_rejects(self):
+        """ Unknown images, bad grades, bad coordinates and bad lines are rejected"""
+        base = {'user': 'bob', 'image': 'S128_A.tif', 'primary': '3',
+                'secondary': '3', 'x': '1', 'y': '2'}
+        self.assertIsNotNone(to_row(base, IMAGES)[0])
+        self.assertIn('unknown image', to_row(dict(base, image='S999.tif'), IMAGES)[1])
+        self.assertIn('grade', to_row(dict(base, primary='2'), IMAGES)[1])
+        self.assertIn('grade', to_row(dict(base, secondary=' '), IMAGES)[1])
+        self.assertIn('coordinates', to_row(dict(base, x='left'), IMAGES)[1])
+
+        path = self.write('grades.jsonl', json.dumps(dict(base, primary='6')) + '\n'
+                          + '{"user": "bob", "image"\n' + '[1, 2]\n' + json.dumps(base) + '\n')
+        rejects = io.StringIO()
+        stats = ingest(path, CsvResultsSink(self.temp_dir), IMAGES, rejects=rejects)
+        self.assertEqual((stats['rows'], stats['rejected']), (1, 3))
+        rejected = [json.loads(line) for line in rejects.getvalue().splitlines()]
+        self.assertEqual([reject['line'] for reject in rejected], [1, 2, 3])
+        self.assertEqual(rejected[1]['reason'], 'not a JSON object')
+        self.assertEqual(rejected[2]['record'], [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+"""
+Testing grading_journal.py for the following function
+1) test_replay_form_and_rows (smoke test)
+2) test_compaction (one-shot test)
+3) test_torn_record_is_dropped (Edge test)
+4) test_csv_partial_row_repaired (Edge test)
+"""
+import unittest
+import os
+import shutil
+import tempfile
+
+from grading_journal import (GradingJournal, PRIMARY, SECONDARY, COMMENT,
+                             MAGIC, encode_record)
+from results_store import CsvResultsSink, HEADERS
+
+ROW = ['2023-12-10 10:00:00', 'alice', 'S001_A.tif', '3', '4', '1.000', '2.000',
+       'note, "quoted"']
+
+
+class TestGradingJournal(unittest.TestCase):
+    """ This class manages the tests for the grading journal"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'Results', '.journal_alice.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_replay_form_and_rows(self):
+        """ Smoke test: a reopened journal returns the unsaved state"""
+        journal = GradingJournal(self.path)
+        self.assertIsNone(journal.recovered['image'])
+        journal.show_image('S001_A.tif')
+        journal.set_field(PRIMARY, '3')
+        journal.set_field(COMMENT, 'check the apex')
+        journal.set_viewport((0.5, 100.0), (80.0, -0.5))
+        journal.queue_row(ROW)
+        journal.queue_row(ROW[:2] + ['S002_A.tif'] + ROW[3:])
+        journal.confirm_rows(1)
+        journal.show_image('S002_A.tif')
+        journal.set_field(SECONDARY, '5')
+        # No close(): as if the application had crashed
+        state = GradingJournal(self.path).recovered
+        self.assertEqual(state['image'], 'S002_A.tif')
+        self.assertEqual((state['primary'], state['secondary'], state['comment']),
+                         (' ', '5', ''))
+        self.assertIsNone(state['viewport'])
+        self.assertEqual([row[2] for row in state['pending_rows']], ['S002_A.tif'])
+        self.assertEqual(state['pending_rows'][0][7], 'note, "quoted"')
+        journal.close()
+
+    def test_compaction(self):
+        """ The journal is rewritten with the state once it is too big"""
+        journal = GradingJournal(self.path, compact_bytes=4096)
+        journal.show_image('S001_A.tif')
+        for step in range(1000):
+            journal.set_viewport((step, step + 100.0), (step + 80.0, step))
+        # The rewrite happens on the sync thread; records appended while
+        # it runs are carried over
+        journal.queue_row(ROW)
+        journal.close()
+        self.assertLess(os.path.getsize(self.path), 4096)
+        state = GradingJournal(self.path).recovered
+        self.assertEqual(state['pending_rows'], [ROW])
+        self.assertEqual(state['viewport'], ((999, 1099.0), (1079.0, 999)))
+        self.assertEqual(state['image'], 'S001_A.tif')
+
+    def test_torn_record_is_dropped(self):
+        """ Edge test: a half-written last record is ignored and cut off"""
+        record = encode_record(PRIMARY, '4')
+        with open(os.path.join(self.temp_dir, 'journal.bin'), 'wb') as file:
+            file.write(MAGIC + encode_record(COMMENT, 'kept') + record[:-1])
+        journal = GradingJournal(os.path.join(self.temp_dir, 'journal.bin'))
+        self.assertEqual(journal.recovered['comment'], 'kept')
+        self.assertEqual(journal.recovered['primary'], ' ')
+        journal.set_field(PRIMARY, '5')
+        journal.close()
+        self.assertEqual(GradingJournal(os.path.join(self.temp_dir, 'journal.bin'))
+                         .recovered['primary'], '5')
+
+        with open(os.path.join(self.temp_dir, 'other.bin'), 'wb') as file:
+            file.write(b'not a journal')
+        with self.assertRaises(ValueError):
+            GradingJournal(os.path.join(self.temp_dir, 'other.bin'))
+
+    def test_csv_partial_row_repaired(self):
+        """ Edge test: a row cut by a crash is removed before appending"""
+        sink = CsvResultsSink(self.temp_dir)
+        sink.write_rows([ROW])
+        with open(sink.filename('alice'), 'a', encoding='utf-8') as file:
+            file.write('2023-12-10 10:05:00,alice,S002_A.tif,4,"half')
+        sink.write_rows([ROW])
+        with open(sink.filename('alice'), 'r', encoding='utf-8') as file:
+            lines = file.read().splitlines()
+        self.assertEqual(lines[0], ','.join(HEADERS))
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines[1], lines[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
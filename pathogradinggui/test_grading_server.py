@@ -0,0 +1,168 @@
+"""
+Testing grading_server.py and grading_client.py for the following function
+1) test_login_and_slide_list (smoke test)
+2) test_concurrent_graders (one-shot test)
+3) test_remote_slide_matches_local (one-shot test)
+4) test_refused_requests (Edge test)
+"""
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from grading_server import GradingServer, ConnectionPool
+from grading_client import GradingClient
+from slide_source import SlideSource
+from save_pipeline import ResultsWriter
+
+
+def row(user, image, primary='3', secondary='4'):
+    """Build a result row in HEADERS order."""
+    return ['2023-12-10 10:00:00', user, image, primary, secondary,
+            '10.000', '20.000', 'note']
+
+
+class TestGradingServer(unittest.TestCase):
+    """ This class manages the tests for the grading server and its client"""
+
+    def setUp(self):
+        """Serve two synthetic slides on a free loopback port."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_home = os.environ.get('XDG_CACHE_HOME')
+        os.environ['XDG_CACHE_HOME'] = os.path.join(self.temp_dir, 'cache')
+        self.data_path = os.path.join(self.temp_dir, 'Data')
+        os.makedirs(self.data_path)
+        rng = np.random.default_rng(0)
+        for name in ('S001_A.tif', 'S002_A.tif'):
+            Image.fromarray(rng.integers(0, 255, (700, 1100, 3), dtype=np.uint8)).save(
+                os.path.join(self.data_path, name))
+        self.server = GradingServer(self.data_path,
+                                    os.path.join(self.temp_dir, 'Results'),
+                                    os.path.join(self.temp_dir, 'users.db'),
+                                    port=0, pool_size=2,
+                                    hash_params={'iterations': 1000})
+        self.url = self.server.start()
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close_connection()
+        self.server.stop()
+        if self.cache_home is None:
+            del os.environ['XDG_CACHE_HOME']
+        else:
+            os.environ['XDG_CACHE_HOME'] = self.cache_home
+        shutil.rmtree(self.temp_dir)
+
+    def login(self, user):
+        """ Create a user and return a client logged in as that user"""
+        client = GradingClient(self.url)
+        self.clients.append(client)
+        client.add_user(user, user + '-password')
+        self.assertTrue(client.verify_user(user, user + '-password'))
+        return client
+
+    def test_login_and_slide_list(self):
+        """ Smoke test: a user logs in and lists the slides"""
+        client = self.login('alice')
+        self.assertEqual(client.user, 'alice')
+        self.assertEqual(client.slide_names(), ['S001_A.tif', 'S002_A.tif'])
+        # A second client logs in as the same user
+        other = GradingClient(self.url)
+        self.clients.append(other)
+        other.verify_user('alice', 'alice-password')
+        self.assertNotEqual(other.token, client.token)
+
+    def test_concurrent_graders(self):
+        """ Rows saved at once by several graders are all in the shared store"""
+        clients = [self.login('user%d' % number) for number in range(4)]
+
+        def grade(client):
+            writer = ResultsWriter(client, flush_interval=0)
+            for number in range(25):
+                writer.submit(row(client.user, 'S00%d_A.tif' % (number % 2 + 1)))
+            writer.close()
+        threads = [threading.Thread(target=grade, args=(client,)) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        rows = clients[0].results_for_image('S001_A.tif')
+        self.assertEqual(len(rows), 4 * 13)
+        self.assertEqual({result[1] for result in rows},
+                         {'user0', 'user1', 'user2', 'user3'})
+        self.assertEqual(len(clients[1].results_for_user('user3')), 25)
+        # Requests share the pooled connections
+        self.assertLessEqual(self.server.results.opened, 2)
+
+    def test_remote_slide_matches_local(self):
+        """ Tiles and views read from the server are those of the slide"""
+        client = self.login('alice')
+        slide = client.open_slide('S002_A.tif')
+        local = SlideSource(os.path.join(self.data_path, 'S002_A.tif'),
+                            os.path.join(self.temp_dir, 'local_cache'))
+        self.assertEqual((slide.width, slide.height), (1100, 700))
+        self.assertEqual(slide.downsamples, local.downsamples)
+        self.assertEqual(slide.tiles_for_region(1, (0, 1099), (0, 699)),
+                         local.tiles_for_region(1, (0, 1099), (0, 699)))
+        np.testing.assert_array_equal(slide.read_tile(0, 1, 1), local.read_tile(0, 1, 1))
+        img, extent = slide.render_view((99.5, 600.5), (400.5, 50.5), 200, 150)
+        local_img, local_extent = local.render_view((99.5, 600.5), (400.5, 50.5),
+                                                    200, 150)
+        np.testing.assert_array_equal(img, local_img)
+        self.assertEqual(extent, local_extent)
+
+    def test_refused_requests(self):
+        """ Edge test: bad logins, other users' rows, unknown slides and bugs"""
+        client = self.login('alice')
+        anonymous = GradingClient(self.url)
+        self.clients.append(anonymous)
+        with self.assertRaisesRegex(ValueError, 'Not logged in'):
+            anonymous.slide_names()
+        with self.assertRaisesRegex(ValueError, 'Wrong password'):
+            anonymous.verify_user('alice', 'wrong')
+        with self.assertRaisesRegex(ValueError, 'User does not exist'):
+            anonymous.verify_user('bob', 'alice-password')
+        with self.assertRaisesRegex(ValueError, 'already in use'):
+            anonymous.add_user('alice', 'other')
+        with self.assertRaisesRegex(ValueError, 'another user'):
+            client.write_rows([row('bob', 'S001_A.tif')])
+        with self.assertRaisesRegex(ValueError, 'No such'):
+            client.open_slide('../users.db')
+        with self.assertRaisesRegex(ValueError, 'No such slide'):
+            client.open_slide('S404_A.tif')
+        with self.assertRaisesRegex(ValueError, 'No such tile'):
+            client.tile('S001_A.tif', 0, 5, 0)
+        self.assertEqual(client.results_for_user('alice'), [])
+
+        # A pool never opens more than its size
+        pool = ConnectionPool(lambda: object(), size=1)
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            self.assertIs(first, second)
+
+        # An unexpected error of a handler is answered with a 500
+        def broken(request):
+            raise RuntimeError('bug')
+        self.server._routes = [(method, pattern, broken if pattern.pattern == '/slides'
+                                else handler)
+                               for method, pattern, handler in self.server._routes]
+        with self.assertLogs('grading_server', 'ERROR'):
+            with self.assertRaisesRegex(ValueError, 'Internal server error'):
+                client.slide_names()
+        self.assertEqual(client.results_for_user('alice'), [])
+
+        self.server.stop()
+        with self.assertRaises(OSError):
+            client.slide_names()
+
+
+if __name__ == '__main__':
+    unittest.main()
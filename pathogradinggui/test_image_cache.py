@@ -0,0 +1,63 @@
+"""
+Testing image_cache.py and settings.py for the following function
+1) test_get_put (smoke test)
+2) test_evicts_by_bytes (one-shot test)
+3) test_oversized_entry (Edge test)
+4) test_settings_override (one-shot test)
+"""
+import unittest
+import os
+import json
+import tempfile
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from image_cache import DecodedImageCache
+from settings import load_settings
+
+
+class TestDecodedImageCache(unittest.TestCase):
+    """ This class manages the tests for the decoded image cache"""
+
+    def test_get_put(self):
+        """ Smoke test: a cached array is returned and counted as a hit"""
+        cache = DecodedImageCache(1000)
+        cache.put(('a.tif', 1, 0), np.zeros(100, dtype=np.uint8))
+        self.assertEqual(cache.get(('a.tif', 1, 0)).nbytes, 100)
+        self.assertIsNone(cache.get(('a.tif', 2, 0)))
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_evicts_by_bytes(self):
+        """ Least recently used entries are evicted once the budget is hit"""
+        cache = DecodedImageCache(1000)
+        for name in ('a', 'b', 'c'):
+            cache.put((name, 0, 0), np.zeros(400, dtype=np.uint8))
+        self.assertNotIn(('a', 0, 0), cache)
+        cache.get(('b', 0, 0))
+        cache.put(('d', 0, 0), np.zeros(400, dtype=np.uint8))
+        self.assertIn(('b', 0, 0), cache)
+        self.assertNotIn(('c', 0, 0), cache)
+        self.assertEqual(cache.current_bytes, 800)
+        self.assertEqual(cache.stats()['evictions'], 2)
+
+    def test_oversized_entry(self):
+        """ An array larger than the budget is not cached"""
+        cache = DecodedImageCache(100)
+        self.assertFalse(cache.put('big', np.zeros(101, dtype=np.uint8)))
+        self.assertEqual(len(cache), 0)
+
+    def test_settings_override(self):
+        """ Command line options override the config file"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'settings.json')
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump({'cache_mb': 64, 'prefetch_radius': 3}, file)
+            settings = load_settings(['--config', path, '--cache-mb', '128'])
+        self.assertEqual(settings['cache_mb'], 128)
+        self.assertEqual(settings['prefetch_radius'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
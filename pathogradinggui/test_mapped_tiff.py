@@ -0,0 +1,125 @@
+"""
+Testing mapped_tiff.py for the following function
+1) test_strip_tiff_is_memmap (smoke test)
+2) test_tiled_tiff (one-shot test)
+3) test_slide_source_level0 (one-shot test)
+4) test_unmappable (Edge test)
+"""
+import unittest
+import os
+import shutil
+import struct
+import tempfile
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from mapped_tiff import map_tiff, resident_bytes, TiledTiffArray
+from slide_source import SlideSource
+
+
+def write_tiled_tiff(path, pixels, tile):
+    """ Write an uncompressed, tiled little-endian RGB TIFF"""
+    height, width = pixels.shape[:2]
+    down, across = -(-height // tile), -(-width // tile)
+    tiles = []
+    for row in range(down):
+        for column in range(across):
+            block = np.zeros((tile, tile, 3), dtype=np.uint8)
+            part = pixels[row * tile:(row + 1) * tile,
+                          column * tile:(column + 1) * tile]
+            block[:part.shape[0], :part.shape[1]] = part
+            tiles.append(block.tobytes())
+    # Store the tiles in reverse order, so they are not contiguous
+    data_start = 8
+    offsets = []
+    position = data_start
+    for data in reversed(tiles):
+        offsets.insert(0, position)
+        position += len(data)
+    count = len(tiles)
+    extra = position
+    entries = [(256, 4, 1, width), (257, 4, 1, height),
+               (258, 3, 3, extra), (259, 3, 1, 1), (262, 3, 1, 2),
+               (277, 3, 1, 3), (322, 4, 1, tile), (323, 4, 1, tile),
+               (324, 4, count, extra + 6), (325, 4, count,
+                                            extra + 6 + 4 * count)]
+    with open(path, 'wb') as file:
+        file.write(b'II' + struct.pack('<HI', 42, position + 6 + 8 * count))
+        for data in reversed(tiles):
+            file.write(data)
+        file.write(struct.pack('<3H', 8, 8, 8))
+        file.write(struct.pack('<%dI' % count, *offsets))
+        file.write(struct.pack('<%dI' % count, *[len(d) for d in tiles]))
+        file.write(struct.pack('<H', len(entries)))
+        for tag, field_type, values, value in entries:
+            if field_type == 3 and values == 1:
+                file.write(struct.pack('<HHIHH', tag, field_type, values, value, 0))
+            else:
+                file.write(struct.pack('<HHII', tag, field_type, values, value))
+        file.write(struct.pack('<I', 0))
+
+
+class TestMappedTiff(unittest.TestCase):
+    """ This class manages the tests for the memory-mapped TIFF access"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        pixels = np.arange(300 * 200 * 3, dtype=np.uint32) % 251
+        self.pixels = pixels.astype(np.uint8).reshape(200, 300, 3)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_strip_tiff_is_memmap(self):
+        """ Smoke test: an uncompressed strip TIFF maps to its pixels"""
+        path = os.path.join(self.temp_dir, 'S001_A.tif')
+        Image.fromarray(self.pixels).save(path)
+        mapped = map_tiff(path)
+        self.assertIsInstance(mapped, np.memmap)
+        np.testing.assert_array_equal(mapped, self.pixels)
+        np.asarray(mapped[10:20, 30:40]).sum()
+        if os.path.exists('/proc/self/smaps'):
+            self.assertGreater(resident_bytes(path), 0)
+            self.assertGreater(resident_bytes(), 0)
+
+    def test_tiled_tiff(self):
+        """ Tiled TIFFs are read tile by tile, regions span tile edges"""
+        path = os.path.join(self.temp_dir, 'S002_A.tif')
+        write_tiled_tiff(path, self.pixels, 64)
+        mapped = map_tiff(path)
+        self.assertIsInstance(mapped, TiledTiffArray)
+        self.assertEqual(mapped.shape, (200, 300, 3))
+        np.testing.assert_array_equal(mapped[50:150, 60:250],
+                                      self.pixels[50:150, 60:250])
+        np.testing.assert_array_equal(np.asarray(mapped), self.pixels)
+
+    def test_slide_source_level0(self):
+        """ SlideSource serves level 0 from the TIFF, not from the cache"""
+        path = os.path.join(self.temp_dir, 'S003_A.tif')
+        cache_dir = os.path.join(self.temp_dir, 'cache')
+        Image.fromarray(self.pixels).save(path)
+        SlideSource(path, cache_dir)
+        source = SlideSource(path, cache_dir)
+        self.assertIs(source.level(0), source.mapped)
+        self.assertFalse(os.path.exists(source._level_path(0)))
+        np.testing.assert_array_equal(source.level(0), self.pixels)
+        pixels, _ = source.read_region(0, (0, 99), (0, 49))
+        np.testing.assert_array_equal(pixels, self.pixels[:200, :300])
+
+    def test_unmappable(self):
+        """ Edge test: compressed or non-TIFF files are not mapped"""
+        path = os.path.join(self.temp_dir, 'S004_A.tif')
+        Image.fromarray(self.pixels).save(path, compression='tiff_lzw')
+        self.assertIsNone(map_tiff(path))
+        path = os.path.join(self.temp_dir, 'S005_A.png')
+        Image.fromarray(self.pixels).save(path)
+        self.assertIsNone(map_tiff(path))
+        source = SlideSource(path, os.path.join(self.temp_dir, 'cache'))
+        self.assertIsNone(source.mapped)
+        self.assertEqual(source.level(0).shape, self.pixels.shape)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+Testing parquet_export.py for the following function
+1) test_export_types_and_partitions (smoke test)
+2) test_incremental_csv (one-shot test)
+3) test_incremental_sqlite (one-shot test)
+4) test_partial_record_and_rewrite (Edge test)
+"""
+import unittest
+import os
+import glob
+import shutil
+import tempfile
+import pytest
+
+pd = pytest.importorskip("pandas")
+pa = pytest.importorskip("pyarrow")
+ds = pytest.importorskip("pyarrow.dataset")
+
+from results_store import CsvResultsSink, ResultsDatabase, complete_records
+from parquet_export import export_parquet, load_watermark
+
+ROWS = [
+    ['2023-12-10 10:00:00', 'alice', 'S001_A.tif', '3', '4', '1.500', '2.000',
+     'two\nlines, "quoted"'],
+    ['2023-12-10 10:10:00', 'alice', 'S002_A.tif', ' ', ' ', '1.000', '2.000', ''],
+    ['2023-12-11 09:00:00', 'alice', 'S003_A.tif', '5', '4', '1.000', '2.000', ''],
+    ['2023-12-10 10:00:00', 'bob', 'S001_A.tif', '4', '4', '1.000', '2.000', ''],
+]
+MORE_ROWS = [
+    ['2023-12-12 10:00:00', 'alice', 'S004_A.tif', '4', '3', '1.000', '2.000', ''],
+    ['2023-12-12 10:00:00', 'carol', 'S004_A.tif', '3', '3', '1.000', '2.000', ''],
+]
+
+
+class TestParquetExport(unittest.TestCase):
+    """ This class manages the tests for the Parquet export"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.out = os.path.join(self.temp_dir, 'parquet')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def read(self):
+        """Read the exported dataset into a frame, oldest row first."""
+        table = ds.dataset(self.out, partitioning='hive').to_table()
+        return table, table.to_pandas().sort_values(['DateTime', 'User']) \
+            .reset_index(drop=True)
+
+    def test_export_types_and_partitions(self):
+        """ Smoke test: typed columns, one folder per user and date"""
+        CsvResultsSink(self.temp_dir).write_rows(ROWS)
+        self.assertEqual(export_parquet(self.temp_dir, self.out, 'csv'), 4)
+        table, frame = self.read()
+        self.assertEqual(table.schema.field('DateTime').type, pa.timestamp('ms'))
+        self.assertEqual(table.schema.field('PrimaryGrade').type,
+                         pa.dictionary(pa.int8(), pa.string()))
+        self.assertEqual(table.schema.field('XCoord').type, pa.float64())
+        self.assertTrue(os.path.isdir(os.path.join(self.out, 'User=alice',
+                                                   'Date=2023-12-11')))
+        first = frame.iloc[0]
+        self.assertEqual(first['Comment'], 'two\nlines, "quoted"')
+        self.assertEqual(first['XCoord'], 1.5)
+        self.assertEqual(first['PrimaryGrade'], '3')
+        self.assertEqual(str(frame['PrimaryGrade'].dtype), 'category')
+        self.assertTrue(pd.isna(frame.loc[frame.Image == 'S002_A.tif',
+                                          'PrimaryGrade'].iloc[0]))
+
+    def test_incremental_csv(self):
+        """ A second export only appends the rows written since the first"""
+        CsvResultsSink(self.temp_dir).write_rows(ROWS)
+        export_parquet(self.temp_dir, self.out, 'csv')
+        self.assertEqual(export_parquet(self.temp_dir, self.out, 'csv'), 0)
+        CsvResultsSink(self.temp_dir).write_rows(MORE_ROWS)
+        self.assertEqual(export_parquet(self.temp_dir, self.out, 'csv'), 2)
+        _, frame = self.read()
+        self.assertEqual(len(frame), 6)
+        self.assertEqual(sorted(frame['User'].astype(str).unique()),
+                         ['alice', 'bob', 'carol'])
+
+    def test_incremental_sqlite(self):
+        """ The database export continues after the last exported row Id"""
+        results_db = ResultsDatabase(os.path.join(self.temp_dir, 'results_database.db'))
+        results_db.write_rows(ROWS)
+        self.assertEqual(export_parquet(self.temp_dir, self.out), 4)
+        results_db.write_rows(MORE_ROWS)
+        self.assertEqual(export_parquet(self.temp_dir, self.out), 2)
+        results_db.close_connection()
+        self.assertEqual(load_watermark(self.out)['sqlite'], 6)
+        _, frame = self.read()
+        self.assertEqual(len(frame), 6)
+
+    def test_partial_record_and_rewrite(self):
+        """ Edge test: half-written rows wait, rewritten files are replaced"""
+        self.assertEqual(complete_records(b'a,b\n1,"x\ny'), 4)
+        self.assertEqual(complete_records(b'a,b\n1,"x\ny"\n'), 12)
+        sink = CsvResultsSink(self.temp_dir)
+        sink.write_rows(ROWS)
+        with open(sink.filename('alice'), 'a', encoding='utf-8') as file:
+            file.write('2023-12-12 11:00:00,alice,S005_A.tif,3,3,1,2,"half')
+        self.assertEqual(export_parquet(self.temp_dir, self.out, 'csv'), 4)
+
+        # Rewriting the file (smaller than the watermark) exports it again
+        os.remove(sink.filename('alice'))
+        sink.write_rows(MORE_ROWS[:1])
+        self.assertEqual(export_parquet(self.temp_dir, self.out, 'csv'), 1)
+        _, frame = self.read()
+        self.assertEqual(sorted(frame['Image'].astype(str)), ['S001_A.tif', 'S004_A.tif'])
+        self.assertEqual(len(glob.glob(os.path.join(self.out, 'User=alice', '*'))), 1)
+
+        # Rewriting it in place to a larger size is detected as well
+        with open(sink.filename('alice'), 'r+', encoding='utf-8') as file:
+            file.seek(0)
+            file.truncate()
+        sink.write_rows(ROWS[:3])
+        self.assertEqual(export_parquet(self.temp_dir, self.out, 'csv'), 3)
+        _, frame = self.read()
+        self.assertEqual(sorted(frame[frame['User'] == 'alice']['Image'].astype(str)),
+                         ['S001_A.tif', 'S002_A.tif', 'S003_A.tif'])
+
+
+if __name__ == '__main__':
+    unittest.main()
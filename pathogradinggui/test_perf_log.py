@@ -0,0 +1,106 @@
+"""
+Testing perf_log.py for the following function
+1) test_disabled_costs_nothing (smoke test)
+2) test_jsonl_log (one-shot test)
+3) test_rolling_averages (one-shot test)
+4) test_hot_paths_are_timed (Edge test)
+"""
+import unittest
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+import perf_log
+from slide_source import SlideSource
+from results_store import CsvResultsSink
+from save_pipeline import ResultsWriter
+
+
+class TestPerfLog(unittest.TestCase):
+    """ This class manages the tests for the hot-path instrumentation"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.temp_dir, 'perf.jsonl')
+
+    def tearDown(self):
+        perf_log.disable()
+        shutil.rmtree(self.temp_dir)
+
+    def read_log(self):
+        """ Parse the lines of the log file"""
+        with open(self.log_path, 'r', encoding='utf-8') as file:
+            return [json.loads(line) for line in file]
+
+    def test_disabled_costs_nothing(self):
+        """ Smoke test: while off, timed() is a shared no-op"""
+        self.assertFalse(perf_log.enabled())
+        self.assertIs(perf_log.timed('decode'), perf_log.NULL_SPAN)
+        self.assertEqual(perf_log.summary(), '')
+        start = time.perf_counter()
+        for _ in range(100000):
+            with perf_log.timed('decode'):
+                pass
+        self.assertLess((time.perf_counter() - start) / 100000, 2e-6)
+
+    def test_jsonl_log(self):
+        """ Every timed block from any thread is one line of the log"""
+        perf_log.enable(self.log_path)
+        with perf_log.timed('decode'):
+            time.sleep(0.01)
+
+        def work():
+            with perf_log.timed('results_write'):
+                pass
+        thread = threading.Thread(target=work, name='writer')
+        thread.start()
+        thread.join()
+        perf_log.disable()
+        lines = self.read_log()
+        self.assertEqual([line['name'] for line in lines], ['decode', 'results_write'])
+        self.assertGreaterEqual(lines[0]['ms'], 10)
+        self.assertEqual(lines[1]['thread'], 'writer')
+        self.assertIsNone(perf_log.recorder())
+        # Enabling again appends to the same log
+        perf_log.enable(self.log_path)
+        with perf_log.timed('decode'):
+            pass
+        perf_log.disable()
+        self.assertEqual(len(self.read_log()), 3)
+
+    def test_rolling_averages(self):
+        """ The overlay shows the mean of the last timings of each name"""
+        recorder = perf_log.enable(window=3)
+        for ms in (100, 1, 2, 3):
+            recorder.record('canvas.draw', ms)
+        recorder.record('decode', 40)
+        self.assertEqual(recorder.averages(), {'canvas.draw': (2.0, 3, 4),
+                                               'decode': (40.0, 40, 1)})
+        self.assertEqual(perf_log.summary(), 'canvas.draw 2.0 ms   decode 40.0 ms')
+        self.assertFalse(os.path.exists(self.log_path))
+
+    def test_hot_paths_are_timed(self):
+        """ Edge test: decode, downsample and results writes report timings"""
+        perf_log.enable(self.log_path)
+        image_path = os.path.join(self.temp_dir, 'S001_A.png')
+        Image.fromarray(np.zeros((600, 800, 3), dtype=np.uint8)).save(image_path)
+        slide = SlideSource(image_path, os.path.join(self.temp_dir, 'cache'))
+        slide.render_view((-0.5, 799.5), (599.5, -0.5), 200, 150)
+        writer = ResultsWriter(CsvResultsSink(self.temp_dir), flush_interval=0)
+        writer.submit(['2023-12-10 10:00:00', 'alice', 'S001_A.tif', '3', '4',
+                       '1', '2', ''])
+        writer.close()
+        perf_log.disable()
+        names = {line['name'] for line in self.read_log()}
+        self.assertTrue({'decode', 'pyramid', 'downsample', 'results_write'} <= names)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+"""
+Testing prefetch.py for the following function
+1) test_neighbour_indices (one-shot test)
+2) test_take_hit (smoke test)
+3) test_take_miss (one-shot test)
+4) test_stale_work_dropped (Edge test)
+"""
+import unittest
+import threading
+
+from prefetch import SlidePrefetcher, neighbour_indices
+
+
+class TestSlidePrefetcher(unittest.TestCase):
+    """ This class manages the tests for the background slide prefetcher"""
+
+    def setUp(self):
+        """Use a loader that records which keys were loaded."""
+        self.loaded = []
+        self.prefetcher = SlidePrefetcher(self.loader, max_pending=2)
+
+    def tearDown(self):
+        """Stop the worker thread."""
+        self.prefetcher.shutdown()
+
+    def loader(self, key, suffix=''):
+        """Fake slide loader."""
+        self.loaded.append(key)
+        return key + suffix
+
+    def test_neighbour_indices(self):
+        """ Neighbours are nearest first and clipped to the list"""
+        self.assertEqual(neighbour_indices(5, 2, 10), [6, 4, 7, 3])
+        self.assertEqual(neighbour_indices(0, 1, 10), [1])
+        self.assertEqual(neighbour_indices(9, 1, 10), [8])
+
+    def test_take_hit(self):
+        """ A finished prefetch is returned by take and counted as a hit"""
+        self.prefetcher.schedule(['a.tif'], '-decoded')
+        self.assertTrue(self.prefetcher.wait(5))
+        self.assertEqual(self.prefetcher.take('a.tif'), 'a.tif-decoded')
+        self.assertEqual(self.prefetcher.stats()['hits'], 1)
+
+    def test_take_miss(self):
+        """ A slide that was never scheduled is a miss"""
+        self.assertIsNone(self.prefetcher.take('b.tif'))
+        self.assertEqual(self.prefetcher.stats()['misses'], 1)
+
+    def test_stale_work_dropped(self):
+        """ Rescheduling drops slides that are no longer wanted"""
+        gate = threading.Event()
+        blocked = SlidePrefetcher(lambda key: gate.wait(), max_pending=2)
+        blocked.schedule(['a.tif', 'b.tif'])
+        blocked.schedule(['c.tif', 'd.tif', 'e.tif'])
+        self.assertEqual(sorted(blocked._futures), ['c.tif', 'd.tif'])
+        self.assertEqual(blocked.stats()['dropped'], 2)
+        gate.set()
+        blocked.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
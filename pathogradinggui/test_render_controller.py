@@ -0,0 +1,161 @@
+"""
+Testing render_controller.py for the following function
+1) test_set_slide_reuses_axes (smoke test)
+2) test_pan_events_coalesced (one-shot test)
+3) test_overlay_blit (one-shot test)
+4) test_remote_view_read_in_background (one-shot test)
+5) test_render_without_slide (Edge test)
+6) test_unreadable_view_reported (Edge test)
+"""
+import unittest
+import os
+import math
+import time
+import shutil
+import tempfile
+import threading
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+pytest.importorskip("PyQt5.QtWidgets")
+
+from PyQt5.QtWidgets import QApplication
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from slide_source import SlideSource
+from render_controller import SlideRenderer
+
+
+class FakeRemoteSlide(SlideSource):
+    """ A local slide read like a RemoteSlide, failing with `error` if set"""
+
+    remote = True
+
+    def __init__(self, slide, error=None):  # pylint: disable=super-init-not-called
+        self.__dict__.update(slide.__dict__)
+        self.error = error
+        self.threads = set()
+
+    def render_view(self, x_limits, y_limits, out_width, out_height):
+        self.threads.add(threading.current_thread())
+        if self.error is not None:
+            raise self.error
+        return super().render_view(x_limits, y_limits, out_width, out_height)
+
+
+class TestSlideRenderer(unittest.TestCase):
+    """ This class manages the tests for the matplotlib render controller"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Create one QApplication and two synthetic slides."""
+        cls.app = QApplication.instance() or QApplication([])
+        cls.temp_dir = tempfile.mkdtemp()
+        cls.slides = []
+        for name, shape in (('S998_A.tif', (1500, 2000, 3)),
+                            ('S998_B.tif', (600, 800, 3))):
+            image_path = os.path.join(cls.temp_dir, name)
+            pixels = np.random.default_rng(0).integers(0, 255, shape,
+                                                       dtype=np.uint8)
+            Image.fromarray(pixels).save(image_path)
+            cls.slides.append(SlideSource(image_path,
+                                          os.path.join(cls.temp_dir, 'cache')))
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the synthetic slides."""
+        shutil.rmtree(cls.temp_dir)
+
+    def setUp(self):
+        self.figure = Figure(figsize=(5, 4), dpi=100)
+        self.canvas = FigureCanvas(self.figure)
+        self.renderer = SlideRenderer(self.figure, self.canvas, frame_interval=5)
+        self.limits = []
+        self.renderer.viewport_changed.connect(
+            lambda x, y: self.limits.append((x, y)))
+
+    def process_events(self, seconds=0.05):
+        """Run the event loop for a while."""
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            self.app.processEvents()
+
+    def test_set_slide_reuses_axes(self):
+        """ Smoke test: new slides swap the image data, not the axes"""
+        image = self.renderer.axes_image
+        for slide in self.slides:
+            self.renderer.set_slide(slide, 'Biopsy name: test')
+            self.process_events()
+        self.assertEqual(len(self.figure.axes), 1)
+        self.assertIs(self.renderer.axes_image, image)
+        self.assertEqual(self.renderer.axes.get_xlim(), (-0.5, 799.5))
+        self.assertEqual(image.get_extent(), [-0.5, 799.5, 599.5, -0.5])
+        self.assertLessEqual(image.get_array().shape[1],
+                             math.ceil(self.renderer.axes.bbox.width))
+
+    def test_pan_events_coalesced(self):
+        """ A burst of limit changes causes a single render"""
+        self.renderer.set_slide(self.slides[0], 'Biopsy name: test')
+        self.process_events()
+        renders = self.renderer.renders
+        for step in range(20):
+            self.renderer.axes.set_xlim(100 + step, 400 + step)
+            self.renderer.axes.set_ylim(400, 100)
+        self.process_events()
+        self.assertEqual(self.renderer.renders, renders + 1)
+        self.assertEqual(self.limits[-1], ((119.0, 419.0), (400.0, 100.0)))
+        self.assertEqual(self.renderer.axes_image.get_extent()[0], 118.5)
+
+    def test_overlay_blit(self):
+        """ Overlays are animated and repainted over the cached background"""
+        self.renderer.set_slide(self.slides[1], 'Biopsy name: test')
+        marker, = self.renderer.axes.plot([100], [200], 'r+')
+        self.renderer.add_overlay(marker)
+        self.assertTrue(marker.get_animated())
+        self.canvas.draw()
+        marker.set_data([150], [250])
+        self.renderer.blit_overlays()
+        self.renderer.remove_overlay(marker)
+        self.assertEqual(self.renderer.overlays, [])
+
+    def test_remote_view_read_in_background(self):
+        """ Views of remote slides are read off the GUI thread"""
+        slide = FakeRemoteSlide(self.slides[1])
+        self.renderer.set_slide(slide, 'Biopsy name: test')
+        self.renderer.axes.set_xlim(100, 400)
+        self.process_events(0.5)
+        self.assertNotIn(threading.current_thread(), slide.threads)
+        # The pan made while the first view was read is rendered as well
+        self.assertEqual(self.renderer.axes_image.get_extent()[:2], [99.5, 400.5])
+        self.renderer.reader.shutdown()
+
+    def test_render_without_slide(self):
+        """ Edge test: rendering before a slide is shown does nothing"""
+        self.renderer.render()
+        self.assertEqual(self.renderer.renders, 0)
+        self.assertEqual(self.limits, [])
+
+    def test_unreadable_view_reported(self):
+        """ Edge test: views that cannot be read are reported, not raised"""
+        errors = []
+        self.renderer.render_failed.connect(errors.append)
+        self.renderer.set_slide(FakeRemoteSlide(self.slides[1], OSError('server down')),
+                                'Biopsy name: test')
+        self.process_events(0.5)
+        self.renderer.set_slide(FakeRemoteSlide(self.slides[1], ValueError('No such slide')),
+                                'Biopsy name: test')
+        self.process_events(0.5)
+        self.assertEqual(errors[0], 'server down')
+        self.assertEqual(errors[-1], 'No such slide')
+        self.assertEqual(self.renderer.renders, 0)
+        # A local slide that cannot be read is reported the same way
+        broken = FakeRemoteSlide(self.slides[0], OSError('unreadable'))
+        broken.remote = False
+        self.renderer.set_slide(broken, 'Biopsy name: test')
+        self.assertEqual(errors[-1], 'unreadable')
+        self.renderer.reader.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+"""
+Testing results_store.py for the following function
+1) test_write_and_query (smoke test)
+2) test_wal_and_indexes (one-shot test)
+3) test_disagreements (one-shot test)
+4) test_export_csv (one-shot test)
+5) test_write_rows_is_transactional (Edge test)
+"""
+import unittest
+import os
+import sqlite3
+import shutil
+import tempfile
+
+from results_store import ResultsDatabase, HEADERS
+
+
+def row(time, user, image, primary, secondary):
+    """Build a result row in HEADERS order."""
+    return [time, user, image, primary, secondary, '10.000', '20.000', 'note, "quoted"']
+
+
+class TestResultsDatabase(unittest.TestCase):
+    """ This class manages the tests for the SQLite results store"""
+
+    def setUp(self):
+        """Open a results database in a temporary folder."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.results_db = ResultsDatabase(os.path.join(self.temp_dir, 'results.db'))
+        self.results_db.write_rows([
+            row('2023-12-10 10:00:00', 'alice', 'S128_A.tif', '3', '4'),
+            row('2023-12-10 10:01:00', 'bob', 'S128_A.tif', '4', '4'),
+            row('2023-12-10 10:02:00', 'alice', 'S001_D1.tif', '3', '3'),
+            row('2023-12-10 10:03:00', 'bob', 'S001_D1.tif', '4', '3'),
+            row('2023-12-10 10:04:00', 'bob', 'S001_D1.tif', '3', '3'),
+        ])
+
+    def tearDown(self):
+        """Close and remove the database."""
+        self.results_db.close_connection()
+        shutil.rmtree(self.temp_dir)
+
+    def test_write_and_query(self):
+        """ Smoke test: rows come back per slide and per user, oldest first"""
+        rows = self.results_db.results_for_image('S128_A.tif')
+        self.assertEqual([r[1] for r in rows], ['alice', 'bob'])
+        self.assertEqual(rows[0], row('2023-12-10 10:00:00', 'alice',
+                                      'S128_A.tif', '3', '4'))
+        self.assertEqual(len(self.results_db.results_for_user('bob')), 3)
+
+    def test_wal_and_indexes(self):
+        """ The database is in WAL mode and indexed on (image, user, time)"""
+        cursor = self.results_db.connection.cursor()
+        cursor.execute('PRAGMA journal_mode')
+        self.assertEqual(cursor.fetchone()[0], 'wal')
+        cursor.execute("EXPLAIN QUERY PLAN SELECT * FROM Results WHERE Image='x'")
+        self.assertIn('Results_Image_User_DateTime', str(cursor.fetchall()))
+
+    def test_disagreements(self):
+        """ Only each user's latest grade counts towards disagreement"""
+        self.assertEqual(self.results_db.disagreements(), [('S128_A.tif', 2)])
+
+    def test_export_csv(self):
+        """ Export writes the same layout as MainWindow.save_coords"""
+        folder = os.path.join(self.temp_dir, 'Results')
+        self.results_db.export_csv(folder)
+        with open(os.path.join(folder, 'Grading_result_alice.csv'),
+                  'r', encoding='utf-8') as file:
+            lines = file.read().splitlines()
+        self.assertEqual(lines[0], ','.join(HEADERS))
+        self.assertEqual(lines[1], '2023-12-10 10:00:00,alice,S128_A.tif,'
+                                   '3,4,10.000,20.000,"note, ""quoted"""')
+        self.assertEqual(len(lines), 3)
+
+    def test_write_rows_is_transactional(self):
+        """ A batch with a bad row leaves no partial rows behind"""
+        with self.assertRaises(sqlite3.Error):
+            self.results_db.write_rows([
+                row('2023-12-11 09:00:00', 'carol', 'S004_A.tif', '5', '5'),
+                row('2023-12-11 09:01:00', None, 'S004_A.tif', '5', '5'),
+            ])
+        self.assertEqual(self.results_db.results_for_image('S004_A.tif'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+"""
+Testing session_store.py for the following function
+1) test_resume_position_and_viewport (smoke test)
+2) test_next_ungraded (one-shot test)
+3) test_import_results (one-shot test)
+4) test_resume_after_slides_changed (Edge test)
+5) test_import_truncated_rows (Edge test)
+"""
+import unittest
+import os
+import shutil
+import tempfile
+
+from session_store import SessionStore
+from results_store import CsvResultsSink
+
+NAMES = ['S%03d_A.tif' % number for number in range(10)]
+
+
+class TestSessionStore(unittest.TestCase):
+    """ This class manages the tests for the session store"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'Results', 'sessions_database.db')
+        self.session = SessionStore(self.db_path)
+
+    def tearDown(self):
+        self.session.close_connection()
+        shutil.rmtree(self.temp_dir)
+
+    def reopen(self):
+        """Close and reopen the store, as on the next login."""
+        self.session.close_connection()
+        self.session = SessionStore(self.db_path)
+
+    def test_resume_position_and_viewport(self):
+        """ Smoke test: the last slide and its viewport survive a restart"""
+        self.assertFalse(self.session.has_session('alice'))
+        self.assertEqual(self.session.resume_index('alice', NAMES), 0)
+        self.session.set_position('alice', NAMES[7], 7)
+        self.session.save_viewport('alice', NAMES[7], (10.5, 200.0), (150.0, 0.5))
+        self.session.mark_graded('alice', NAMES[7])
+        self.reopen()
+        self.assertTrue(self.session.has_session('alice'))
+        self.assertEqual(self.session.resume_index('alice', NAMES), 7)
+        self.assertEqual(self.session.viewport('alice', NAMES[7]),
+                         ((10.5, 200.0), (150.0, 0.5)))
+        self.assertIsNone(self.session.viewport('alice', NAMES[3]))
+        self.assertIsNone(self.session.viewport('bob', NAMES[7]))
+        self.assertEqual(self.session.graded('alice'), {NAMES[7]})
+        # Saving the viewport keeps the graded flag
+        self.session.save_viewport('alice', NAMES[7], (0, 1), (1, 0))
+        self.reopen()
+        self.assertEqual(self.session.graded('alice'), {NAMES[7]})
+
+    def test_next_ungraded(self):
+        """ The next ungraded slide comes from the flags, wrapping around"""
+        for index in (3, 4, 5, 8, 9):
+            self.session.mark_graded('alice', NAMES[index])
+        self.assertEqual(self.session.next_ungraded('alice', NAMES, 2), 6)
+        self.assertEqual(self.session.next_ungraded('alice', NAMES, 7), 0)
+        self.session.mark_graded('alice', NAMES[6], False)
+        self.assertEqual(self.session.next_ungraded('alice', NAMES, 2), 6)
+        self.assertEqual(self.session.next_ungraded('bob', NAMES, 2), 3)
+        for name in NAMES:
+            self.session.mark_graded('alice', name)
+        self.assertIsNone(self.session.next_ungraded('alice', NAMES, 0))
+
+    def test_import_results(self):
+        """ Slides with both grades in the results are marked graded"""
+        sink = CsvResultsSink(self.temp_dir)
+        sink.write_rows([
+            ['2023-12-10 10:00:00', 'alice', NAMES[0], '3', '4', '1', '2', ''],
+            ['2023-12-10 10:01:00', 'alice', NAMES[1], '3', ' ', '1', '2', ''],
+            ['2023-12-10 10:02:00', 'alice', NAMES[2], '5', '5', '1', '2', 'a, b'],
+        ])
+        rows = sink.results_for_user('alice')
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(self.session.import_results('alice', rows), 2)
+        self.assertEqual(self.session.graded('alice'), {NAMES[0], NAMES[2]})
+        self.assertEqual(self.session.import_results('alice', rows), 0)
+        self.assertEqual(sink.results_for_user('bob'), [])
+
+    def test_resume_after_slides_changed(self):
+        """ Edge test: slides added before the last one move its index"""
+        self.session.set_position('alice', NAMES[5], 5)
+        names = sorted(NAMES + ['S001_B.tif', 'S002_B.tif'])
+        self.assertEqual(names[self.session.resume_index('alice', names)], NAMES[5])
+        # The last slide was removed: resume at the one that follows it
+        names = [name for name in NAMES if name != NAMES[5]]
+        self.assertEqual(names[self.session.resume_index('alice', names)], NAMES[6])
+        self.assertEqual(self.session.resume_index('alice', NAMES[:3]), 2)
+        self.assertEqual(self.session.resume_index('alice', []), 0)
+
+    def test_import_truncated_rows(self):
+        """ Edge test: rows missing the grade columns are skipped, not fatal"""
+        sink = CsvResultsSink(self.temp_dir)
+        sink.write_rows([['2023-12-10 10:00:00', 'alice', NAMES[0], '3', '4',
+                          '1', '2', '']])
+        with open(sink.filename('alice'), 'a', encoding='utf-8') as file:
+            file.write('2023-12-10 10:01:00,alice,%s,3\n' % NAMES[1])
+            file.write('2023-12-10 10:02:00,alice\n')
+        rows = sink.results_for_user('alice')
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(self.session.import_results('alice', rows), 1)
+        self.assertEqual(self.session.graded('alice'), {NAMES[0]})
+
+
+if __name__ == '__main__':
+    unittest.main()
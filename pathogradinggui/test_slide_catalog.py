@@ -0,0 +1,108 @@
+"""
+Testing slide_catalog.py for the following function
+1) test_refresh_lists_slides (smoke test)
+2) test_unchanged_folder_not_rescanned (one-shot test)
+3) test_incremental_refresh (one-shot test)
+4) test_unreadable_slide (Edge test)
+5) test_slide_rewritten_in_place (Edge test)
+"""
+import unittest
+import os
+import shutil
+import tempfile
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from slide_catalog import SlideCatalog, probe_slide
+
+
+class TestSlideCatalog(unittest.TestCase):
+    """ This class manages the tests for the persistent slide catalog"""
+
+    def setUp(self):
+        """Create a Data folder with two slides and an unrelated file."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.data_path = os.path.join(self.temp_dir, 'Data')
+        os.makedirs(self.data_path)
+        self.add_slide('S002_A.tif', (30, 40))
+        self.add_slide('S001_A.tif', (20, 10))
+        self.add_slide('Image4Readme.tif', (5, 5))
+        self.catalog = SlideCatalog(os.path.join(self.temp_dir, 'catalog.db'),
+                                    os.path.join(self.temp_dir, 'pyramids'))
+
+    def tearDown(self):
+        """Close and remove the catalog."""
+        self.catalog.close_connection()
+        shutil.rmtree(self.temp_dir)
+
+    def add_slide(self, name, shape):
+        """Write a small RGB slide."""
+        Image.fromarray(np.zeros(shape + (3,), dtype=np.uint8)).save(
+            os.path.join(self.data_path, name))
+
+    def test_refresh_lists_slides(self):
+        """ Smoke test: slides are listed sorted, with their metadata"""
+        self.assertEqual(self.catalog.refresh(self.data_path), 2)
+        self.assertEqual(self.catalog.names(self.data_path),
+                         ['S001_A.tif', 'S002_A.tif'])
+        info = self.catalog.slide(self.data_path, 'S002_A.tif')
+        self.assertEqual((info['Width'], info['Height'], info['Channels'],
+                          info['Dtype'], info['Pyramid']), (40, 30, 3, 'uint8', 0))
+
+    def test_unchanged_folder_not_rescanned(self):
+        """ A second refresh of an unchanged folder does no work"""
+        self.catalog.refresh(self.data_path)
+        probed = self.catalog.probed
+        self.assertEqual(self.catalog.refresh(self.data_path), 0)
+        self.assertEqual(self.catalog.probed, probed)
+
+    def test_incremental_refresh(self):
+        """ Only added files are probed, removed files are dropped"""
+        self.catalog.refresh(self.data_path)
+        os.remove(os.path.join(self.data_path, 'S001_A.tif'))
+        self.add_slide('S003_A.tif', (8, 8))
+        os.utime(self.data_path, ns=(1, 10 ** 18))
+        probed = self.catalog.probed
+        self.assertEqual(self.catalog.refresh(self.data_path), 2)
+        self.assertEqual(self.catalog.probed, probed + 1)
+        self.assertEqual(self.catalog.names(self.data_path),
+                         ['S002_A.tif', 'S003_A.tif'])
+
+    def test_unreadable_slide(self):
+        """ A file that is not an image is listed with unknown dimensions"""
+        with open(os.path.join(self.data_path, 'S004_A.tif'), 'wb') as file:
+            file.write(b'not a tiff')
+        self.catalog.refresh(self.data_path)
+        self.assertIsNone(self.catalog.slide(self.data_path, 'S004_A.tif')['Width'])
+        # Slides above Pillow's decompression bomb limit are probed as well
+        limit = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = 100
+        try:
+            self.assertEqual(probe_slide(os.path.join(self.data_path, 'S002_A.tif')),
+                             (40, 30, 3, 'uint8'))
+            self.assertEqual(Image.MAX_IMAGE_PIXELS, 100)
+        finally:
+            Image.MAX_IMAGE_PIXELS = limit
+
+    def test_slide_rewritten_in_place(self):
+        """ Edge test: a slide rewritten in place is probed again"""
+        self.catalog.refresh(self.data_path)
+        folder_mtime = os.stat(self.data_path).st_mtime_ns
+        path = os.path.join(self.data_path, 'S002_A.tif')
+        Image.fromarray(np.zeros((50, 70), dtype=np.uint16)).save(path)
+        os.utime(path, ns=(1, 10 ** 18))
+        os.utime(self.data_path, ns=(1, folder_mtime))
+        probed = self.catalog.probed
+        self.assertEqual(self.catalog.refresh(self.data_path), 1)
+        self.assertEqual(self.catalog.probed, probed + 1)
+        info = self.catalog.slide(self.data_path, 'S002_A.tif')
+        self.assertEqual((info['Width'], info['Height'], info['Channels'], info['Dtype'],
+                          info['Size']), (70, 50, 1, 'uint16', os.path.getsize(path)))
+        # A full refresh opens every slide again
+        self.assertEqual(self.catalog.refresh(self.data_path, full=True), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+"""
+Testing slide_reader.py for the following function
+1) test_read_on_worker_thread (smoke test)
+2) test_failed_read (Edge test)
+"""
+import unittest
+import time
+import threading
+import pytest
+
+pytest.importorskip("PyQt5.QtWidgets")
+
+from PyQt5.QtWidgets import QApplication
+from slide_reader import SlideReader
+
+
+class TestSlideReader(unittest.TestCase):
+    """ This class manages the tests for the background slide reader"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Create one QApplication."""
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        self.reader = SlideReader(max_workers=2)
+        self.ready = []
+        self.failed = []
+        self.reader.ready.connect(lambda tag, result: self.ready.append((tag, result)))
+        self.reader.failed.connect(lambda tag, message: self.failed.append((tag, message)))
+
+    def tearDown(self):
+        self.reader.shutdown()
+
+    def wait(self, count, seconds=2.0):
+        """Run the event loop until count reads have reported."""
+        end = time.perf_counter() + seconds
+        while len(self.ready) + len(self.failed) < count and time.perf_counter() < end:
+            self.app.processEvents()
+
+    def test_read_on_worker_thread(self):
+        """ Smoke test: reads run on a worker and report on the GUI thread"""
+        self.reader.read('tile', lambda: threading.current_thread())
+        self.wait(1)
+        self.assertEqual(self.ready[0][0], 'tile')
+        self.assertIsNot(self.ready[0][1], threading.current_thread())
+
+    def test_failed_read(self):
+        """ Edge test: errors of a read are reported with its tag"""
+        def unreachable():
+            raise OSError('Grading server unreachable')
+        self.reader.read(('view', 1), unreachable)
+        self.reader.read(('view', 2), lambda: 1 / 0)
+        self.wait(2)
+        self.assertEqual(sorted(self.failed),
+                         [(('view', 1), 'Grading server unreachable'),
+                          (('view', 2), 'division by zero')])
+        self.assertEqual(self.ready, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+"""
+Testing slide_source.py for the following function
+1) test_pyramid_levels (smoke test)
+2) test_pyramid_reused (one-shot test)
+3) test_read_view_picks_level (one-shot test)
+4) test_read_region_extent (one-shot test)
+5) test_render_view_fits_canvas (one-shot test)
+6) test_block_mean (one-shot test)
+7) test_missing_slide (Edge test)
+8) test_view_outside_slide (Edge test)
+"""
+import unittest
+import os
+import shutil
+import tempfile
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from slide_source import SlideSource, block_mean
+
+
+class TestSlideSource(unittest.TestCase):
+    """ This class manages the tests for the tiled slide source"""
+
+    def setUp(self):
+        """Write a small synthetic slide and use a temporary cache."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.temp_dir, 'cache')
+        self.image_path = os.path.join(self.temp_dir, 'S999_A.tif')
+        pixels = np.arange(1200 * 1000 * 3, dtype=np.uint32) % 251
+        self.pixels = pixels.astype(np.uint8).reshape(1000, 1200, 3)
+        Image.fromarray(self.pixels).save(self.image_path)
+
+    def tearDown(self):
+        """Remove the synthetic slide and its pyramid."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_pyramid_levels(self):
+        """ Smoke test: level 0 is the slide, each level halves the last"""
+        source = SlideSource(self.image_path, self.cache_dir, tile_size=128)
+        self.assertEqual(source.shape, (1000, 1200, 3))
+        self.assertEqual(source.level_shapes[1][:2], (500, 600))
+        self.assertLessEqual(max(source.level_shapes[-1][:2]), 256)
+        np.testing.assert_array_equal(source.level(0), self.pixels)
+
+    def test_pyramid_reused(self):
+        """ The second open of a slide reads the pyramid from the cache"""
+        SlideSource(self.image_path, self.cache_dir)
+        source = SlideSource(self.image_path, self.cache_dir)
+        self.assertEqual(source._levels, {})
+        self.assertIsInstance(source.level(0), np.memmap)
+
+    def test_read_view_picks_level(self):
+        """ A zoomed out view reads a coarse level, a zoomed in one level 0"""
+        source = SlideSource(self.image_path, self.cache_dir, tile_size=128)
+        img, _ = source.read_view((-0.5, 1199.5), (999.5, -0.5), 300, 250)
+        self.assertLess(img.shape[0], 500)
+        img, extent = source.read_view((9.5, 99.5), (99.5, 9.5), 300, 250)
+        self.assertEqual(img.shape, (128, 128, 3))
+        self.assertEqual(extent, (-0.5, 127.5, 127.5, -0.5))
+
+    def test_read_region_extent(self):
+        """ Region extents are tile aligned and stay in level 0 pixels"""
+        source = SlideSource(self.image_path, self.cache_dir, tile_size=128)
+        img, extent = source.read_region(1, (300, 700), (0, 100))
+        self.assertEqual(img.shape, (128, 256, 3))
+        self.assertEqual(extent, (255.5, 767.5, 255.5, -0.5))
+        self.assertEqual(source.tiles_for_region(1, (300, 700), (0, 100)),
+                         [(1, 0), (2, 0)])
+
+    def test_render_view_fits_canvas(self):
+        """ The rendered window never has more pixels than the canvas"""
+        source = SlideSource(self.image_path, self.cache_dir, tile_size=128)
+        img, extent = source.render_view((-0.5, 1199.5), (999.5, -0.5), 500, 400)
+        self.assertLessEqual(img.shape[1], 500)
+        self.assertLessEqual(img.shape[0], 400)
+        self.assertEqual(extent, (-0.5, 1199.5, 999.5, -0.5))
+        # Zoomed in: exactly the visible level 0 pixels, no tile padding
+        img, extent = source.render_view((9.5, 99.5), (99.5, 9.5), 300, 250)
+        self.assertEqual(img.shape, (90, 90, 3))
+        self.assertEqual(extent, (9.5, 99.5, 99.5, 9.5))
+        np.testing.assert_array_equal(img, self.pixels[10:100, 10:100])
+
+    def test_block_mean(self):
+        """ Block means match a loop, partial blocks are dropped"""
+        pixels = self.pixels[:7, :9].astype(np.float32)
+        out = block_mean(pixels, 3)
+        self.assertEqual(out.shape, (2, 3, 3))
+        self.assertAlmostEqual(out[1, 2, 0], pixels[3:6, 6:9, 0].mean(), places=4)
+
+    def test_missing_slide(self):
+        """ Opening a slide that does not exist raises an error"""
+        with self.assertRaises(OSError):
+            SlideSource(os.path.join(self.temp_dir, 'missing.tif'),
+                        self.cache_dir)
+
+    def test_view_outside_slide(self):
+        """ Edge test: views panned past any edge read the edge pixels"""
+        source = SlideSource(self.image_path, self.cache_dir, tile_size=128)
+        for x_limits, y_limits in (((1500.5, 1800.5), (400.5, 100.5)),
+                                   ((100.5, 400.5), (1400.5, 1100.5)),
+                                   ((1500.5, 1800.5), (1400.5, 1100.5)),
+                                   ((-400.5, -100.5), (-100.5, -400.5))):
+            img, extent = source.render_view(x_limits, y_limits, 300, 250)
+            self.assertGreater(img.size, 0)
+            self.assertTrue(-0.5 <= extent[0] < extent[1] <= 1199.5)
+            self.assertTrue(-0.5 <= extent[3] < extent[2] <= 999.5)
+            pixels, _ = source.read_view(x_limits, y_limits, 300, 250)
+            self.assertGreater(pixels.size, 0)
+            for column, row in source.tiles_for_region(0, x_limits, y_limits):
+                self.assertGreater(source.read_tile(0, column, row).size, 0)
+        img, _ = source.render_view((1500.5, 1800.5), (1400.5, 1100.5), 300, 250)
+        np.testing.assert_array_equal(img, self.pixels[-1:, -1:])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+"""
+Testing thumbnail_cache.py and thumbnail_strip.py for the following function
+1) test_make_thumbnail (smoke test)
+2) test_cache_follows_mtime (one-shot test)
+3) test_strip_generates_in_background (one-shot test)
+4) test_strip_of_20k_slides (Edge test)
+"""
+import unittest
+import io
+import os
+import time
+import shutil
+import tempfile
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+pytest.importorskip("PyQt5.QtWidgets")
+
+from PyQt5.QtWidgets import QApplication
+from thumbnail_cache import ThumbnailCache, make_thumbnail
+from thumbnail_strip import ThumbnailGenerator, ThumbnailModel, ThumbnailStrip
+
+
+class TestThumbnails(unittest.TestCase):
+    """ This class manages the tests for the thumbnail cache and strip"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Create one QApplication and three synthetic slides."""
+        cls.app = QApplication.instance() or QApplication([])
+        cls.temp_dir = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        cls.names = ['S001_A.tif', 'S002_A.tif', 'S003_A.tif']
+        pixels = rng.integers(0, 255, (1500, 2000, 3), dtype=np.uint8)
+        # Uncompressed (memory-mapped), compressed and 16-bit grayscale
+        Image.fromarray(pixels).save(cls.path(cls.names[0]))
+        Image.fromarray(pixels).save(cls.path(cls.names[1]), compression='tiff_deflate')
+        gray = rng.integers(0, 4095, (600, 300)).astype(np.uint16)
+        Image.fromarray(gray).save(cls.path(cls.names[2]))
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the synthetic slides."""
+        shutil.rmtree(cls.temp_dir)
+
+    @classmethod
+    def path(cls, name):
+        """ Path of a synthetic slide"""
+        return os.path.join(cls.temp_dir, name)
+
+    def setUp(self):
+        self.cache = ThumbnailCache(os.path.join(self.temp_dir, 'thumbnails.db'))
+
+    def tearDown(self):
+        self.cache.close_connection()
+        os.remove(os.path.join(self.temp_dir, 'thumbnails.db'))
+
+    def test_make_thumbnail(self):
+        """ Smoke test: thumbnails keep the aspect ratio within 128 pixels"""
+        cache_dir = os.path.join(self.temp_dir, 'pyramids')
+        sizes = [make_thumbnail(self.path(name), pyramid_cache_dir=cache_dir)[:2]
+                 for name in self.names]
+        self.assertEqual(sizes[0], (128, 96))
+        self.assertEqual(sizes[1], (128, 96))
+        self.assertEqual(sizes[2], (64, 128))
+        width, height, blob = make_thumbnail(self.path(self.names[0]), 64,
+                                             pyramid_cache_dir=cache_dir)
+        self.assertEqual((width, height), (64, 48))
+        with Image.open(io.BytesIO(blob)) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (64, 48))
+
+    def test_cache_follows_mtime(self):
+        """ A thumbnail is only served for the version of the slide it shows"""
+        path = self.path(self.names[2])
+        self.assertIsNone(self.cache.get(path))
+        self.cache.put(path, b'jpeg')
+        self.assertEqual(self.cache.get(path), b'jpeg')
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertIsNone(self.cache.get(path))
+        self.assertIsNone(self.cache.get(self.path('missing.tif')))
+
+    def test_strip_generates_in_background(self):
+        """ Missing thumbnails show a placeholder until a worker made them"""
+        generator = ThumbnailGenerator(max_workers=2)
+        try:
+            model = ThumbnailModel(self.names, self.path, self.cache, generator)
+            changed = []
+            model.dataChanged.connect(lambda first, last, roles: changed.append(first.row()))
+            for row in range(3):
+                self.assertIs(model.thumbnail(row), model.placeholder)
+            deadline = time.time() + 60
+            while len(changed) < 3 and time.time() < deadline:
+                QApplication.processEvents()
+                time.sleep(0.01)
+            self.assertEqual(sorted(changed), [0, 1, 2])
+            for row, name in enumerate(self.names):
+                self.assertIsNotNone(self.cache.get(self.path(name)))
+                pixmap = model.thumbnail(row)
+                self.assertIsNot(pixmap, model.placeholder)
+                self.assertEqual(max(pixmap.width(), pixmap.height()), 128)
+            self.assertEqual(model.data(model.index(0)), 'S001_A')
+        finally:
+            generator.shutdown()
+
+    def test_strip_of_20k_slides(self):
+        """ Edge test: only the slides in view are looked up"""
+        names = ['S%05d_A.tif' % number for number in range(20000)]
+        generator = ThumbnailGenerator(max_workers=1, max_pending=8)
+        try:
+            # The slides do not exist: each lookup is a failed stat
+            model = ThumbnailModel(names, self.path, self.cache, generator)
+            start = time.perf_counter()
+            strip = ThumbnailStrip(model)
+            strip.resize(800, strip.height())
+            strip.show()
+            strip.set_current(15000)
+            QApplication.processEvents()
+            self.assertLess(time.perf_counter() - start, 2.0)
+            self.assertEqual(model.rowCount(), 20000)
+            self.assertGreater(model.lookups, 0)
+            self.assertLess(model.lookups, 100)
+            self.assertEqual(strip.currentIndex().row(), 15000)
+            selected = []
+            strip.slide_selected.connect(selected.append)
+            strip.clicked.emit(model.index(15001))
+            self.assertEqual(selected, [15001])
+            strip.close()
+        finally:
+            generator.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
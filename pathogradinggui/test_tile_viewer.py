@@ -0,0 +1,157 @@
+"""
+Testing tile_viewer.py for the following function
+1) test_fit_uses_coarse_level (smoke test)
+2) test_visible_limits_match_matplotlib (one-shot test)
+3) test_zoom_loads_finer_tiles (one-shot test)
+4) test_pan_drops_distant_tiles (one-shot test)
+5) test_remote_tiles_read_in_background (one-shot test)
+6) test_array_to_qimage_float (Edge test)
+7) test_unreadable_tiles_reported (Edge test)
+"""
+import unittest
+import os
+import shutil
+import time
+import tempfile
+import threading
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+pytest.importorskip("PyQt5.QtWidgets")
+
+from PyQt5.QtWidgets import QApplication
+from slide_source import SlideSource
+from tile_viewer import TileSlideView, array_to_qimage, TILE_MARGIN
+
+
+class FakeRemoteSlide(SlideSource):
+    """ A local slide read like a RemoteSlide, failing with `error` if set"""
+
+    remote = True
+
+    def __init__(self, slide, error=None):  # pylint: disable=super-init-not-called
+        self.__dict__.update(slide.__dict__)
+        self.error = error
+        self.threads = set()
+
+    def read_tile(self, level, column, row):
+        self.threads.add(threading.current_thread())
+        time.sleep(0.01)    # a round trip to the server
+        if self.error is not None:
+            raise self.error
+        return super().read_tile(level, column, row)
+
+
+class TestTileSlideView(unittest.TestCase):
+    """ This class manages the tests for the native Qt tile viewer"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Create one QApplication and a synthetic 2048x1536 slide."""
+        cls.app = QApplication.instance() or QApplication([])
+        cls.temp_dir = tempfile.mkdtemp()
+        image_path = os.path.join(cls.temp_dir, 'S999_B.tif')
+        pixels = np.random.default_rng(0).integers(0, 255, (1536, 2048, 3),
+                                                   dtype=np.uint8)
+        Image.fromarray(pixels).save(image_path)
+        cls.slide = SlideSource(image_path, os.path.join(cls.temp_dir, 'cache'),
+                                tile_size=256)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the synthetic slide."""
+        shutil.rmtree(cls.temp_dir)
+
+    def setUp(self):
+        """Show the slide in a 512x384 view."""
+        self.view = TileSlideView()
+        self.view.resize(512, 384)
+        self.view.show()
+        self.view.set_slide(self.slide)
+
+    def tearDown(self):
+        """Close the view."""
+        self.view.close()
+
+    def test_fit_uses_coarse_level(self):
+        """ Smoke test: a fitted slide is drawn from a downsampled level"""
+        self.assertGreater(self.view.level, 0)
+        self.assertTrue(all(key[0] == self.view.level for key in self.view._tiles))
+
+    def test_visible_limits_match_matplotlib(self):
+        """ Limits of the fitted slide match imshow's default limits"""
+        x_limits, y_limits = self.view.visible_limits()
+        self.assertAlmostEqual(x_limits[0], -0.5)
+        self.assertAlmostEqual(x_limits[1], 2047.5)
+        self.assertAlmostEqual(y_limits[0], 1535.5)
+        self.assertAlmostEqual(y_limits[1], -0.5)
+
+    def test_zoom_loads_finer_tiles(self):
+        """ Zooming in switches to a finer level and drops coarse tiles"""
+        coarse = self.view.level
+        self.view.zoom(8)
+        self.view.update_tiles()
+        self.assertLess(self.view.level, coarse)
+        self.assertTrue(all(key[0] == self.view.level for key in self.view._tiles))
+
+    def test_pan_drops_distant_tiles(self):
+        """ Tiles far from the view are dropped while panning at one level"""
+        self.view.show_limits((-0.5, 255.5), (191.5, -0.5))
+        level = self.view.level
+        self.assertIn((level, 0, 0), self.view._tiles)
+        self.view.show_limits((1791.5, 2047.5), (1535.5, 1343.5))
+        self.assertEqual(self.view.level, level)
+        self.assertNotIn((level, 0, 0), self.view._tiles)
+        visible = self.slide.tiles_for_region(level, *self.view.visible_limits())
+        for _, column, row in self.view._tiles:
+            self.assertTrue(any(abs(column - c) <= TILE_MARGIN and abs(row - r) <= TILE_MARGIN
+                                for c, r in visible))
+
+    def process_events(self, seconds=0.3):
+        """Run the event loop for a while."""
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            self.app.processEvents()
+
+    def test_remote_tiles_read_in_background(self):
+        """ Tiles of remote slides are read off the GUI thread"""
+        slide = FakeRemoteSlide(self.slide)
+        self.view.set_slide(slide)
+        self.process_events()
+        self.assertNotIn(threading.current_thread(), slide.threads)
+        coarse = set(self.view._tiles)
+        self.assertEqual(coarse, {(self.view.level, column, row) for column, row in
+                                  slide.tiles_for_region(self.view.level,
+                                                         *self.view.visible_limits())})
+        # Zoomed in, the coarse tiles stay until the finer ones are read
+        self.view.zoom(8)
+        self.view.update_tiles()
+        self.assertTrue(coarse <= set(self.view._tiles))
+        self.process_events()
+        self.assertTrue(all(key[0] == self.view.level for key in self.view._tiles))
+        self.view.reader.shutdown()
+
+    def test_array_to_qimage_float(self):
+        """ Float RGBA arrays (e.g. decoded PNGs) are converted to 8 bit"""
+        image = array_to_qimage(np.ones((4, 6, 4), dtype=np.float32))
+        self.assertEqual((image.width(), image.height()), (6, 4))
+        self.assertEqual(image.pixelColor(0, 0).red(), 255)
+
+    def test_unreadable_tiles_reported(self):
+        """ Edge test: tiles that cannot be read are reported, not raised"""
+        errors = []
+        self.view.read_failed.connect(errors.append)
+        self.view.set_slide(FakeRemoteSlide(self.slide, OSError('server down')))
+        self.process_events()
+        self.assertEqual(set(errors), {'server down'})
+        self.assertEqual(self.view._tiles, {})
+        broken = FakeRemoteSlide(self.slide, ValueError('No such tile'))
+        broken.remote = False
+        self.view.set_slide(broken)
+        self.assertEqual(errors[-1], 'No such tile')
+        self.view.reader.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+"""
+Testing user_auth.py for the following function
+1) test_entry_point_imports_are_light (smoke test)
+2) test_gui_imports_on_its_own (one-shot test)
+3) test_preloader_loads_main_window (one-shot test)
+4) test_preloader_without_data_folder (Edge test)
+"""
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+pytest.importorskip("PyQt5.QtWidgets")
+
+from user_auth import GuiPreloader
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_python(code):
+    """ Run code in a fresh interpreter in this folder, return its output"""
+    return subprocess.run([sys.executable, '-c', code], cwd=HERE, check=True,
+                          capture_output=True, text=True).stdout.split()
+
+
+class TestUserAuth(unittest.TestCase):
+    """ This class manages the tests for the application entry point"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_home = os.environ.get('XDG_CACHE_HOME')
+        os.environ['XDG_CACHE_HOME'] = os.path.join(self.temp_dir, 'cache')
+
+    def tearDown(self):
+        if self.cache_home is None:
+            del os.environ['XDG_CACHE_HOME']
+        else:
+            os.environ['XDG_CACHE_HOME'] = self.cache_home
+        shutil.rmtree(self.temp_dir)
+
+    def test_entry_point_imports_are_light(self):
+        """ Smoke test: the login path does not import NumPy or matplotlib"""
+        loaded = run_python('import sys, user_auth, login_dialog; print(*[name in '
+                            'sys.modules for name in ("numpy", "matplotlib", '
+                            '"GUI_pyqt5")])')
+        self.assertEqual(loaded, ['False', 'False', 'False'])
+
+    def test_gui_imports_on_its_own(self):
+        """ GUI_pyqt5 no longer needs user_auth to be imported first"""
+        self.assertEqual(run_python('import GUI_pyqt5; print(GUI_pyqt5.MainWindow.__name__)'),
+                         ['MainWindow'])
+
+    def test_preloader_loads_main_window(self):
+        """ The preloader imports the main window and catalogs the slides"""
+        data_path = os.path.join(self.temp_dir, 'Data')
+        os.makedirs(data_path)
+        Image.fromarray(np.zeros((20, 30, 3), dtype=np.uint8)).save(
+            os.path.join(data_path, 'S001_A.tif'))
+        preloader = GuiPreloader(data_path)
+        preloader.start()
+        main_window = preloader.main_window_class()
+        self.assertEqual(main_window.__name__, 'MainWindow')
+        self.assertIsNotNone(preloader.finished_at)
+        from slide_catalog import SlideCatalog
+        catalog = SlideCatalog()
+        self.assertEqual(catalog.names(data_path), ['S001_A.tif'])
+        self.assertEqual(catalog.refresh(data_path), 0)
+        catalog.close_connection()
+
+    def test_preloader_without_data_folder(self):
+        """ Edge test: a missing Data folder is left to the main window"""
+        preloader = GuiPreloader(os.path.join(self.temp_dir, 'missing'))
+        preloader.start()
+        self.assertEqual(preloader.main_window_class().__name__, 'MainWindow')
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, 'cache')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+"""
+Testing users/User.py for the following function
+1) test_add_and_verify (smoke test)
+2) test_rehash_on_login (one-shot test)
+3) test_legacy_database (one-shot test)
+4) test_unknown_algorithm (Edge test)
+"""
+import unittest
+import os
+import sqlite3
+import tempfile
+from hashlib import pbkdf2_hmac
+
+from users.User import UserDatabase
+
+
+class TestUserDatabase(unittest.TestCase):
+    """ This class manages the tests for the password hash parameters"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, 'users.db')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def stored(self, username):
+        """ Return the stored hash columns of a user"""
+        connection = sqlite3.connect(self.db_path)
+        row = connection.execute('SELECT Hash, Algorithm, Params, KeyLength \
+                                 FROM Users WHERE Username=?', (username,)).fetchone()
+        connection.close()
+        return row
+
+    def test_add_and_verify(self):
+        """ Smoke test: users are stored with their hash parameters"""
+        user_db = UserDatabase(self.db_path, params={'iterations': 1000})
+        user_db.add_user('alice', 'secret')
+        self.assertTrue(user_db.verify_user('alice', 'secret'))
+        with self.assertRaises(ValueError):
+            user_db.verify_user('alice', 'wrong')
+        self.assertEqual(self.stored('alice')[1:],
+                         ('pbkdf2_sha256', 'iterations=1000', 16))
+        user_db.close_connection()
+
+    def test_rehash_on_login(self):
+        """ A login with old parameters upgrades the stored hash"""
+        user_db = UserDatabase(self.db_path, params={'iterations': 1000})
+        user_db.add_user('alice', 'secret')
+        user_db.close_connection()
+
+        user_db = UserDatabase(self.db_path, algorithm='scrypt',
+                               params={'n': 2 ** 10}, key_length=32)
+        self.assertTrue(user_db.verify_user('alice', 'secret'))
+        stored_hash, algorithm, params, key_length = self.stored('alice')
+        self.assertEqual((algorithm, params, key_length),
+                         ('scrypt', 'n=1024,p=1,r=8', 32))
+        self.assertEqual(len(stored_hash), 32)
+        self.assertTrue(user_db.verify_user('alice', 'secret'))
+        with self.assertRaises(ValueError):
+            user_db.verify_user('alice', 'wrong')
+        user_db.close_connection()
+
+    def test_legacy_database(self):
+        """ A database without hash parameter columns is migrated"""
+        connection = sqlite3.connect(self.db_path)
+        connection.execute('CREATE TABLE Users (Username varchar(255) PRIMARY KEY, \
+                           Salt BINARY(16), Hash BINARY(16))')
+        salt = b'0123456789abcdef'
+        connection.execute('INSERT INTO Users VALUES (?, ?, ?)',
+                           ('bob', salt, pbkdf2_hmac('sha256', b'secret', salt,
+                                                     100000, 16)))
+        connection.commit()
+        connection.close()
+
+        user_db = UserDatabase(self.db_path)
+        self.assertTrue(user_db.verify_user('bob', 'secret'))
+        self.assertEqual(self.stored('bob')[1:],
+                         ('pbkdf2_sha256', 'iterations=100000', 16))
+        user_db.close_connection()
+
+    def test_unknown_algorithm(self):
+        """ Edge test: an unsupported algorithm is rejected"""
+        with self.assertRaises(ValueError):
+            UserDatabase(self.db_path, algorithm='md5')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+"""
+ThumbnailCache Module
+
+This module makes small JPEG thumbnails of slides and keeps them in one
+SQLite file of blobs, keyed by slide path, size and modification time,
+so a thumbnail is made once per version of a slide and a strip of tens
+of thousands of slides reads a few kB per visible slide.
+
+make_thumbnail reads as little of a slide as it can: the smallest level
+of its cached SlideSource pyramid if there is one, otherwise every n-th
+row and column of a memory-mapped uncompressed TIFF, and only for other
+files the decoded image. It needs no Qt, so it can run in the worker
+processes of a ThumbnailGenerator (see thumbnail_strip.py).
+
+Usage:
+    # Example usage:
+    cache = ThumbnailCache()                  # in the per-user cache dir
+    blob = cache.get(path)
+    if blob is None:
+        width, height, blob = make_thumbnail(path)
+        cache.put(path, blob)
+    cache.close_connection()
+"""
+
+import io
+import os
+import json
+import math
+import sqlite3
+
+import numpy as np
+
+from mapped_tiff import map_tiff, TiledTiffArray
+from slide_source import default_cache_dir, pyramid_path
+
+THUMBNAIL_SIZE = 128
+JPEG_QUALITY = 85
+
+
+def file_key(path):
+    """Return the (size, mtime_ns) a cached thumbnail of a file is valid for."""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def to_uint8(array):
+    """Scale an image to uint8 for display (16 bit and float images)."""
+    if array.dtype == np.uint8:
+        return array
+    array = array.astype(np.float32)
+    high = float(np.nanmax(array)) if array.size else 0.0
+    if high > 0:
+        array = array * (255.0 / high)
+    return np.clip(np.nan_to_num(array), 0, 255).astype(np.uint8)
+
+
+def sample(array, step):
+    """Return every step-th row and column of a (possibly tiled) image."""
+    if isinstance(array, TiledTiffArray):
+        # Tiled images only slice with steps of 1: read the kept rows
+        rows = [array[row:row + 1, :][:, ::step]
+                for row in range(0, array.shape[0], step)]
+        return np.concatenate(rows, axis=0)
+    return np.asarray(array[::step, ::step])
+
+
+def _source_pixels(path, max_size, pyramid_cache_dir):
+    """Return a small enough array of the slide's pixels."""
+    from PIL import Image  # pylint: disable=import-outside-toplevel
+    size, mtime_ns = file_key(path)
+    pyramid = pyramid_path(os.path.basename(path), size, mtime_ns,
+                           pyramid_cache_dir)
+    try:
+        with open(os.path.join(pyramid, 'meta.json'), 'r', encoding='utf-8') as file:
+            levels = len(json.load(file)['downsamples'])
+        if levels > 1:
+            return np.load(os.path.join(pyramid, 'level_%d.npy' % (levels - 1)),
+                           mmap_mode='r')
+    except (OSError, ValueError, KeyError):
+        pass
+    mapped = map_tiff(path)
+    if mapped is not None:
+        # Keep 2x the thumbnail size, the final resize averages it down
+        step = max(1, int(math.floor(max(mapped.shape[:2]) / (2 * max_size))))
+        return sample(mapped, step)
+    with Image.open(path) as image:
+        image.draft('RGB', (max_size, max_size))
+        image.thumbnail((max_size, max_size))
+        return np.asarray(image)
+
+
+def make_thumbnail(path, max_size=THUMBNAIL_SIZE, pyramid_cache_dir=None):
+    """
+    Make the JPEG thumbnail of a slide.
+
+    Args:
+    - path (str): The slide.
+    - max_size (int): Largest side of the thumbnail in pixels.
+    - pyramid_cache_dir (str, optional): Where SlideSource pyramids are
+        cached, the default cache directory if not given.
+
+    Returns:
+    - tuple: (width, height, JPEG bytes).
+    """
+    from PIL import Image  # pylint: disable=import-outside-toplevel
+    pixels = to_uint8(np.asarray(_source_pixels(path, max_size, pyramid_cache_dir)))
+    if pixels.ndim == 3 and pixels.shape[2] == 1:
+        pixels = pixels[:, :, 0]
+    elif pixels.ndim == 3 and pixels.shape[2] != 3:
+        # RGBA and other channel counts: keep the first three
+        pixels = pixels[:, :, :3] if pixels.shape[2] > 3 else pixels[:, :, 0]
+    image = Image.fromarray(np.ascontiguousarray(pixels))
+    image.thumbnail((max_size, max_size))
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=JPEG_QUALITY)
+    return image.size[0], image.size[1], output.getvalue()
+
+
+class ThumbnailCache:
+    """
+    ThumbnailCache Class
+
+    SQLite file of slide thumbnails.
+
+    Methods:
+        __init__(self, db_path=None):
+            Opens (or creates) the cache, by default in the per-user cache
+            directory.
+
+        get(self, path, key=None):
+            Returns the JPEG bytes of the thumbnail of the current version
+            of a slide, or None.
+
+        put(self, path, blob, key=None):
+            Stores the thumbnail of a slide, replacing older versions.
+
+        close_connection(self):
+            Closes the SQLite database connection.
+    """
+
+    def __init__(self, db_path=None):
+        if db_path is None:
+            db_path = os.path.join(default_cache_dir(), 'thumbnails.db')
+        folder = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.cursor = self.connection.cursor()
+        with self.connection:
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS Thumbnails (
+                    Path TEXT PRIMARY KEY,
+                    Size INTEGER,
+                    MTime INTEGER,
+                    Data BLOB
+                )
+            ''')
+
+    def get(self, path, key=None):
+        """
+        Return the thumbnail (JPEG bytes) of a slide, or None if there is
+        none for its current size and mtime (key, if already known).
+        """
+        try:
+            size, mtime_ns = key or file_key(path)
+        except OSError:
+            return None
+        self.cursor.execute('SELECT Data FROM Thumbnails WHERE Path=? AND Size=? '
+                            'AND MTime=?', (os.path.abspath(path), size, mtime_ns))
+        row = self.cursor.fetchone()
+        return row[0] if row else None
+
+    def put(self, path, blob, key=None):
+        """Store the thumbnail of a slide for its current size and mtime."""
+        size, mtime_ns = key or file_key(path)
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO Thumbnails (Path, Size, MTime, Data) '
+                'VALUES (?, ?, ?, ?)',
+                (os.path.abspath(path), size, mtime_ns, sqlite3.Binary(blob)))
+
+    def close_connection(self):
+        """Close the SQLite database connection."""
+        self.connection.close()
@@ -0,0 +1,244 @@
+"""
+ThumbnailStrip Module
+
+This module provides a strip of slide thumbnails for jumping straight to
+any slide, built on Qt's model/view classes so that it stays fast with
+tens of thousands of slides:
+- ThumbnailModel is a list model over the slide names. It holds no
+  per-slide data up front; a thumbnail is only looked up when the view
+  asks for it, i.e. when the slide scrolls into view. Decoded thumbnails
+  are kept in a small LRU of QPixmaps.
+- Thumbnails come from a ThumbnailCache (one SQLite file of JPEG blobs).
+  Missing ones are made by a ThumbnailGenerator in a pool of worker
+  processes, newest requests first, so slides scrolled past are skipped;
+  the item shows a placeholder until its thumbnail is ready.
+- ThumbnailStrip is a QListView with uniform item sizes, so laying out
+  the strip does not touch the items.
+
+Usage:
+    # Example usage:
+    generator = ThumbnailGenerator()
+    model = ThumbnailModel(image_paths, slide_path, ThumbnailCache(), generator)
+    strip = ThumbnailStrip(model)
+    strip.slide_selected.connect(show_slide_at)
+    strip.set_current(image_index)
+
+    # When done
+    generator.shutdown()
+"""
+
+import os
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from PyQt5.QtCore import (QAbstractListModel, QModelIndex, QObject, QSize, Qt,
+                          pyqtSignal)
+from PyQt5.QtGui import QColor, QPixmap
+from PyQt5.QtWidgets import QAbstractItemView, QListView
+
+from thumbnail_cache import THUMBNAIL_SIZE, file_key, make_thumbnail
+
+
+class ThumbnailGenerator(QObject):
+    """
+    Makes thumbnails in a pool of worker processes.
+
+    Args:
+    - max_workers (int, optional): Worker processes, by default one less
+        than the number of CPUs.
+    - max_pending (int): Most requests kept waiting; the oldest waiting
+        ones are cancelled beyond that.
+    - max_size (int): Largest side of the thumbnails.
+
+    Signals:
+    - ready(object, str, bytes): Emitted with the tag, path and JPEG bytes
+        of each thumbnail made.
+    - failed(object, str, str): Emitted with the tag, path and error
+        message if a thumbnail could not be made.
+
+    Methods:
+    - request(path, tag=None): Ask for the thumbnail of a slide.
+    - shutdown(): Cancel waiting requests and stop the workers.
+    """
+
+    ready = pyqtSignal(object, str, bytes)
+    failed = pyqtSignal(object, str, str)
+    # Worker results, delivered to the GUI thread
+    _finished = pyqtSignal(object, str, object)
+
+    def __init__(self, max_workers=None, max_pending=64, max_size=THUMBNAIL_SIZE,
+                 parent=None):
+        super().__init__(parent)
+        if max_workers is None:
+            max_workers = max(1, (os.cpu_count() or 2) - 1)
+        self.max_pending = max_pending
+        self.max_size = max_size
+        # Workers are started, not forked, from the multi-threaded GUI
+        self._executor = ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+        self._pending = OrderedDict()
+        self._finished.connect(self._on_finished)
+
+    def request(self, path, tag=None):
+        """Ask for the thumbnail of a slide (again: move it to the front)."""
+        if path in self._pending:
+            self._pending.move_to_end(path)
+            return
+        future = self._executor.submit(make_thumbnail, path, self.max_size)
+        self._pending[path] = (future, tag)
+        future.add_done_callback(
+            lambda done, path=path: self._finished.emit(done, path, tag))
+        # Drop the oldest requests that have not started, the user has
+        # scrolled past them
+        for old_path in list(self._pending):
+            if len(self._pending) <= self.max_pending:
+                break
+            if self._pending[old_path][0].cancel():
+                del self._pending[old_path]
+
+    def _on_finished(self, future, path, tag):
+        if self._pending.get(path, (None,))[0] is future:
+            del self._pending[path]
+        if future.cancelled():
+            return
+        try:
+            _, _, blob = future.result()
+        except Exception as err:  # pylint: disable=broad-except
+            self.failed.emit(tag, path, str(err))
+            return
+        self.ready.emit(tag, path, blob)
+
+    def shutdown(self):
+        """Cancel waiting requests and stop the worker processes."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._pending.clear()
+
+
+class ThumbnailModel(QAbstractListModel):
+    """
+    List model of slide names with their thumbnails as decoration.
+
+    Args:
+    - names (list): Slide file names.
+    - path_of (callable): Returns the path of a slide from its name.
+    - cache (ThumbnailCache): Stored thumbnails.
+    - generator (ThumbnailGenerator): Makes the missing thumbnails.
+    - max_pixmaps (int): Decoded thumbnails kept in memory.
+
+    Attributes:
+    - lookups (int): Number of thumbnails looked up, i.e. of items the
+        view has materialized.
+    """
+
+    def __init__(self, names, path_of, cache, generator, max_pixmaps=512,
+                 parent=None):
+        super().__init__(parent)
+        self.names = names
+        self.path_of = path_of
+        self.cache = cache
+        self.generator = generator
+        self.max_pixmaps = max_pixmaps
+        self.lookups = 0
+        self._pixmaps = OrderedDict()
+        self._failed = set()
+        self.placeholder = QPixmap(generator.max_size, generator.max_size)
+        self.placeholder.fill(QColor('#e0e0e0'))
+        generator.ready.connect(self._on_ready)
+        generator.failed.connect(self._on_failed)
+
+    def rowCount(self, parent=QModelIndex()):
+        """Number of slides."""
+        return 0 if parent.isValid() else len(self.names)
+
+    def data(self, index, role=Qt.DisplayRole):
+        """Name, tooltip and thumbnail of a slide."""
+        if not index.isValid() or index.row() >= len(self.names):
+            return None
+        name = self.names[index.row()]
+        if role == Qt.DisplayRole:
+            return os.path.splitext(name)[0]
+        if role == Qt.ToolTipRole:
+            return name
+        if role == Qt.DecorationRole:
+            return self.thumbnail(index.row())
+        return None
+
+    def thumbnail(self, row):
+        """Return the thumbnail of a slide, or the placeholder while it is made."""
+        pixmap = self._pixmaps.get(row)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(row)
+            return pixmap
+        if row in self._failed:
+            return self.placeholder
+        self.lookups += 1
+        path = self.path_of(self.names[row])
+        try:
+            key = file_key(path)
+        except OSError:
+            self._failed.add(row)
+            return self.placeholder
+        blob = self.cache.get(path, key)
+        if blob is None:
+            self.generator.request(path, (row, key))
+            return self.placeholder
+        pixmap = QPixmap()
+        pixmap.loadFromData(blob, 'JPEG')
+        self._pixmaps[row] = pixmap
+        if len(self._pixmaps) > self.max_pixmaps:
+            self._pixmaps.popitem(last=False)
+        return pixmap
+
+    def _on_ready(self, tag, path, blob):
+        row, key = tag
+        self.cache.put(path, blob, key)
+        if row < len(self.names):
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def _on_failed(self, tag, _path, _message):
+        self._failed.add(tag[0])
+
+
+class ThumbnailStrip(QListView):
+    """
+    Horizontal, virtualized strip of slide thumbnails.
+
+    Args:
+    - model (ThumbnailModel): The slides.
+
+    Signals:
+    - slide_selected(int): Emitted with the index of a clicked slide.
+
+    Methods:
+    - set_current(index): Select a slide and scroll it into view.
+    """
+
+    slide_selected = pyqtSignal(int)
+
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        size = model.generator.max_size
+        self.setViewMode(QListView.IconMode)
+        self.setFlow(QListView.LeftToRight)
+        self.setWrapping(False)
+        self.setMovement(QListView.Static)
+        self.setResizeMode(QListView.Adjust)
+        # Every item has the size of the first one: no per-item layout
+        self.setUniformItemSizes(True)
+        self.setIconSize(QSize(size, size))
+        self.setGridSize(QSize(size + 16, size + 28))
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.setHorizontalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setFixedHeight(size + 28 + self.horizontalScrollBar().sizeHint().height()
+                            + 2 * self.frameWidth() + 4)
+        self.setModel(model)
+        self.clicked.connect(lambda index: self.slide_selected.emit(index.row()))
+        self.activated.connect(lambda index: self.slide_selected.emit(index.row()))
+
+    def set_current(self, index):
+        """Select a slide and scroll it to the centre of the strip."""
+        model_index = self.model().index(index)
+        self.setCurrentIndex(model_index)
+        self.scrollTo(model_index, QAbstractItemView.PositionAtCenter)
@@ -0,0 +1,228 @@
+"""
+TileSlideView Module
+
+This module provides a native Qt viewer for large slides, as an
+alternative to the matplotlib FigureCanvas. The slide is drawn as a
+QGraphicsScene of QPixmap tiles taken from a SlideSource pyramid; panning
+and zooming only change the view transform, and new tiles are read only
+when the visible region or the matching pyramid level changes. Nothing is
+re-rasterized through Agg. Tiles more than TILE_MARGIN tiles away from
+the visible region are dropped, so panning over a slide at full
+resolution does not accumulate its whole level as pixmaps.
+
+Tiles of a slide on a grading server (RemoteSlide) are read by a
+SlideReader on worker threads and added as they arrive; the tiles of the
+previous level stay until the new ones are in. Tiles that cannot be read
+are reported with read_failed and tried again on the next update.
+
+Scene coordinates are level 0 image pixels shifted by half a pixel, so
+the coordinates reported by the view follow the same convention as the
+matplotlib viewer: pixel i covers [i - 0.5, i + 0.5].
+
+Usage:
+    # Example usage:
+    view = TileSlideView()
+    view.viewport_changed.connect(on_viewport_changed)
+    view.set_slide(SlideSource('../Data/S001_D1.tif'))
+
+    # (x_left, x_right), (y_bottom, y_top) in image pixels, as returned by
+    # matplotlib's axes.get_xlim() / axes.get_ylim()
+    x_limits, y_limits = view.visible_limits()
+"""
+
+import numpy as np
+from PyQt5.QtCore import Qt, QRectF, QTimer, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap, QPainter
+from PyQt5.QtWidgets import QGraphicsView, QGraphicsScene
+
+from slide_reader import SlideReader
+
+ZOOM_STEP = 1.25
+TILE_MARGIN = 1     # tiles kept loaded around the visible region
+
+
+def array_to_qimage(array):
+    """
+    Convert an image array (grayscale, RGB or RGBA; integer or 0-1 float)
+    to a QImage that owns a copy of its pixels.
+    """
+    if np.issubdtype(array.dtype, np.floating):
+        array = np.clip(array * 255.0, 0, 255)
+    array = np.ascontiguousarray(array, dtype=np.uint8)
+    height, width = array.shape[:2]
+    if array.ndim == 2:
+        image_format, channels = QImage.Format_Grayscale8, 1
+    elif array.shape[2] == 4:
+        image_format, channels = QImage.Format_RGBA8888, 4
+    else:
+        array = np.ascontiguousarray(array[:, :, :3])
+        image_format, channels = QImage.Format_RGB888, 3
+    image = QImage(array.data, width, height, width * channels, image_format)
+    return image.copy()
+
+
+class TileSlideView(QGraphicsView):
+    """
+    QGraphicsView showing one SlideSource as pyramid tiles.
+
+    Attributes:
+    - reader (SlideReader): Reads the tiles of remote slides; shut it
+        down when done.
+
+    Signals:
+    - viewport_changed(tuple, tuple): Emitted with the visible x and y
+        limits (matplotlib convention) after the user finishes a pan or
+        zoom.
+    - read_failed(str): Emitted with the error message if a tile could
+        not be read (e.g. the grading server is down).
+
+    Methods:
+    - set_slide(slide): Show a new slide, fitted to the view.
+    - visible_limits(): Return the visible (x_left, x_right) and
+        (y_bottom, y_top) limits in image pixels, clipped to the slide.
+    - zoom(factor): Zoom around the centre of the view.
+    - show_limits(x_limits, y_limits): Fit a region (as returned by
+        visible_limits) in the view.
+    """
+
+    viewport_changed = pyqtSignal(tuple, tuple)
+    read_failed = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setScene(QGraphicsScene(self))
+        self.setDragMode(QGraphicsView.ScrollHandDrag)
+        self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
+        self.setRenderHint(QPainter.SmoothPixmapTransform, True)
+        self.setBackgroundBrush(Qt.white)
+        self.slide = None
+        self.level = None
+        self._tiles = {}
+        # Tiles of remote slides being read
+        self._loading = set()
+        self.reader = SlideReader(parent=self)
+        self.reader.ready.connect(self._on_tile_read)
+        self.reader.failed.connect(self._on_tile_failed)
+        # Coalesce bursts of scroll/zoom events into one tile update
+        self._update_timer = QTimer(self)
+        self._update_timer.setSingleShot(True)
+        self._update_timer.setInterval(0)
+        self._update_timer.timeout.connect(self.update_tiles)
+        self.horizontalScrollBar().valueChanged.connect(self._update_timer.start)
+        self.verticalScrollBar().valueChanged.connect(self._update_timer.start)
+
+    def set_slide(self, slide):
+        """Show a new slide, fitted to the view."""
+        self.scene().clear()
+        self._tiles = {}
+        self._loading = set()
+        self.level = None
+        self.slide = slide
+        rect = QRectF(0, 0, slide.width, slide.height)
+        self.scene().setSceneRect(rect)
+        self.fitInView(rect, Qt.KeepAspectRatio)
+        self.update_tiles()
+
+    def visible_limits(self):
+        """Return the visible x and y limits in image pixels."""
+        rect = self.mapToScene(self.viewport().rect()).boundingRect()
+        rect = rect.intersected(self.sceneRect())
+        return ((rect.left() - 0.5, rect.right() - 0.5),
+                (rect.bottom() - 0.5, rect.top() - 0.5))
+
+    def show_limits(self, x_limits, y_limits):
+        """Fit the region with the given x and y limits in the view."""
+        x_lo, x_hi = sorted(x_limits)
+        y_lo, y_hi = sorted(y_limits)
+        self.fitInView(QRectF(x_lo + 0.5, y_lo + 0.5, x_hi - x_lo, y_hi - y_lo),
+                       Qt.KeepAspectRatio)
+        self.update_tiles()
+        self.viewport_changed.emit(*self.visible_limits())
+
+    def zoom(self, factor):
+        """Zoom in (factor > 1) or out around the centre of the view."""
+        self.scale(factor, factor)
+        self._update_timer.start()
+
+    def update_tiles(self):
+        """
+        Add the tiles covering the visible region at the matching level
+        (or start reading them, for a remote slide), and drop those of
+        other levels or beyond TILE_MARGIN of it.
+        """
+        if self.slide is None:
+            return
+        screen_per_pixel = self.transform().m11()
+        self.level = self.slide.best_level(1.0 / max(screen_per_pixel, 1e-9))
+        for column, row in self._visible_tiles():
+            key = (self.level, column, row)
+            if key in self._tiles or key in self._loading:
+                continue
+            if self.slide.remote:
+                self._loading.add(key)
+                self.reader.read((self.slide, key), self.slide.read_tile, *key)
+                continue
+            try:
+                pixels = self.slide.read_tile(*key)
+            except (OSError, ValueError) as err:
+                self.read_failed.emit(str(err))
+                break
+            self._add_tile(key, pixels)
+        self._drop_stale()
+
+    def _visible_tiles(self):
+        return self.slide.tiles_for_region(self.level, *self.visible_limits())
+
+    def _add_tile(self, key, pixels):
+        level, column, row = key
+        downsample = self.slide.downsamples[level]
+        item = self.scene().addPixmap(QPixmap.fromImage(array_to_qimage(pixels)))
+        item.setTransformationMode(Qt.SmoothTransformation)
+        item.setPos(column * self.slide.tile_size * downsample,
+                    row * self.slide.tile_size * downsample)
+        item.setScale(downsample)
+        self._tiles[key] = item
+
+    def _drop_stale(self):
+        # Tiles of other levels go once the visible ones exist
+        visible = self._visible_tiles()
+        columns = [column for column, _ in visible] or [0]
+        rows = [row for _, row in visible] or [0]
+        stale = [key for key in self._tiles
+                 if key[0] != self.level and not self._loading
+                 or key[0] == self.level and (
+                     not min(columns) - TILE_MARGIN <= key[1] <= max(columns) + TILE_MARGIN
+                     or not min(rows) - TILE_MARGIN <= key[2] <= max(rows) + TILE_MARGIN)]
+        for key in stale:
+            self.scene().removeItem(self._tiles.pop(key))
+
+    def _on_tile_read(self, tag, pixels):
+        slide, key = tag
+        if slide is not self.slide:
+            return
+        self._loading.discard(key)
+        if key[0] == self.level and key not in self._tiles:
+            self._add_tile(key, pixels)
+        self._drop_stale()
+
+    def _on_tile_failed(self, tag, message):
+        slide, key = tag
+        if slide is self.slide:
+            self._loading.discard(key)
+            self.read_failed.emit(message)
+
+    def wheelEvent(self, event):
+        """Zoom with the mouse wheel."""
+        factor = ZOOM_STEP if event.angleDelta().y() > 0 else 1 / ZOOM_STEP
+        self.zoom(factor)
+        self.viewport_changed.emit(*self.visible_limits())
+
+    def mouseReleaseEvent(self, event):
+        """Report the new viewport when a pan is finished."""
+        super().mouseReleaseEvent(event)
+        self.viewport_changed.emit(*self.visible_limits())
+
+    def resizeEvent(self, event):
+        """Load any tiles uncovered by a resize."""
+        super().resizeEvent(event)
+        self._update_timer.start()
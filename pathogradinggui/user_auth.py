@@ -5,39 +5,140 @@ This module provides a simple PyQt5-based application that includes user authent
 It utilizes a UserDatabase class for managing user information and a GUI with a main window
 and a login dialog for user authentication.
 
+Startup is split so the login dialog appears as soon as PyQt5 is loaded:
+only PyQt5, the login dialog, the settings and the user database are
+imported up front. While the user types their password, a GuiPreloader
+thread imports the main window (NumPy, matplotlib and its Qt5Agg
+backend) and refreshes the slide catalog, so both are ready, or nearly
+so, when the login succeeds. benchmarks/bench_startup.py measures it.
+
 Dependencies:
 - PyQt5: The Qt toolkit for Python.
 - users.User: A module containing the UserDatabase class for managing user information.
-- GUI_pyqt5.MainWindow: A module containing the MainWindow class for the main application window.
+- GUI_pyqt5.MainWindow: A module containing the MainWindow class for the main application
+  window, imported in the background.
 - login_dialog: A module containing the show_login_dialog function for displaying the login dialog.
 
 Usage:
 1. Run this module as the main script to start the application.
 2. The application initializes a PyQt5 QApplication.
-3. It creates an instance of the UserDatabase class to manage user information.
-4. The login dialog is shown using the show_login_dialog function, which takes the user database
+3. It creates an instance of the UserDatabase class to manage user information
+   or, with `--server URL`, a GradingClient of a grading server
+   (grading_server.py), which then also provides the slides and stores the results.
+4. The GuiPreloader thread starts importing the main window and refreshing the
+   slide catalog.
+5. The login dialog is shown using the show_login_dialog function, which takes the user database
    as a parameter and returns the authenticated user if successful.
-5. If authentication is successful, the main window is created with the authenticated user.
-6. The login dialog is shown again with the main window as a parent, ensuring it is modal.
+6. If authentication is successful, the main window is created with the authenticated user
+   once the preloader has finished.
 7. The application runs the event loop until the user exits the main window.
 
+Set the PATHOGUI_STARTUP_PROBE environment variable to print when the login
+dialog is shown and when the preloader is done, then exit (used by the
+startup benchmarks).
+
 Note: Make sure to customize the UserDatabase class to fit the
 specific requirements of your application.
 """
-from PyQt5.QtWidgets import QApplication
-import sys
-#sys.path.append("./users")
 import os
+import sys
+import time
+import threading
+import multiprocessing
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from users.User import UserDatabase
-from GUI_pyqt5 import MainWindow
-from login_dialog import show_login_dialog
+from settings import load_settings
+import perf_log
+
+
+def base_path():
+    """Return the folder holding Data and Results (the bundle when frozen)."""
+    if getattr(sys, 'frozen', False):
+        return sys._MEIPASS  # pylint: disable=protected-access
+    return os.path.abspath("..")
+
+
+class GuiPreloader(threading.Thread):
+    """
+    Background thread importing the main window and refreshing the slide
+    catalog, while the login dialog waits for the password.
+
+    Args:
+    - data_path (str): The Data folder whose catalog is refreshed.
+
+    Methods:
+    - main_window_class(): Wait for the thread and return MainWindow;
+        errors of the import are raised here.
+    """
+
+    def __init__(self, data_path):
+        super().__init__(name='preload', daemon=True)
+        self.data_path = data_path
+        self.finished_at = None
+        self._main_window = None
+        self._error = None
+
+    def run(self):
+        """Import the GUI modules and refresh the catalog."""
+        # pylint: disable=import-outside-toplevel
+        try:
+            from GUI_pyqt5 import MainWindow
+            from slide_catalog import SlideCatalog
+            self._main_window = MainWindow
+            if os.path.isdir(self.data_path):
+                # Same database as the window's own catalog, which then
+                # has no slide left to open
+                catalog = SlideCatalog()
+                catalog.refresh(self.data_path)
+                catalog.close_connection()
+        except Exception as err:  # pylint: disable=broad-except
+            self._error = err
+        self.finished_at = time.time()
+
+    def main_window_class(self):
+        """Wait for the preloader and return the MainWindow class."""
+        self.join()
+        if self._error is not None:
+            raise self._error
+        return self._main_window
+
+
+def startup_probe(preloader):
+    """Print the startup milestones and exit (PATHOGUI_STARTUP_PROBE)."""
+    print('login_dialog_shown %.6f' % time.time(), flush=True)
+    print('-- login dialog shown --', file=sys.stderr, flush=True)
+    preloader.join()
+    print('preload_done %.6f' % preloader.finished_at, flush=True)
+    os._exit(0)  # pylint: disable=protected-access
+
 
 if __name__ == '__main__':
+    # Thumbnail workers of a frozen bundle start through this entry point
+    multiprocessing.freeze_support()
+
+    from PyQt5.QtCore import QTimer
+    from PyQt5.QtWidgets import QApplication
+    from login_dialog import show_login_dialog
+
     app = QApplication([])
 
     # Initialize the user database
-    user_db = UserDatabase()
+    settings = load_settings(sys.argv[1:])
+    if settings['perf_log']:
+        perf_log.enable(settings['perf_log'])
+    if settings['server']:
+        # Thin client: users, slides and results are on the grading server
+        from grading_client import GradingClient
+        user_db = GradingClient(settings['server'])
+    else:
+        user_db = UserDatabase(algorithm=settings['hash_algorithm'],
+                               params=settings['hash_params'])
+
+    # Load the main window while the user types their password
+    preloader = GuiPreloader(os.path.join(base_path(), 'Data'))
+    QTimer.singleShot(0, preloader.start)
+    if os.environ.get('PATHOGUI_STARTUP_PROBE'):
+        QTimer.singleShot(0, lambda: startup_probe(preloader))
 
     # Show the login dialog
     current_user = show_login_dialog(user_db)
@@ -45,6 +146,9 @@ if __name__ == '__main__':
     # Now, only if authentication is successful,
     # create and show the main window
     if current_user:
-        w = MainWindow(current_user)
-        show_login_dialog(user_db, w)
+        MainWindow = preloader.main_window_class()
+        w = MainWindow(current_user, settings,
+                       user_db if settings['server'] else None)
+        w.current_user = current_user
+        w.show()
         sys.exit(app.exec_())
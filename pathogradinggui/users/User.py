@@ -35,10 +35,16 @@ Usage:
     user_db.close_connection()
 
 Note:
-    The passwords are securely hashed using PBKDF2-HMAC-SHA256 with a
-    randomly generated salt for each user. This enhances the security
-    of stored passwords by preventing common attacks like rainbow
-    table attacks.
+    The passwords are securely hashed using PBKDF2-HMAC-SHA256 (or,
+    optionally, the memory-hard scrypt KDF) with a randomly generated
+    salt for each user. This enhances the security of stored passwords
+    by preventing common attacks like rainbow table attacks.
+
+    The algorithm, its parameters and the key length are stored with
+    every user, so the work factor can be raised at any time: existing
+    users keep logging in with their stored parameters and their hash is
+    upgraded to the current ones on their next successful login. See
+    benchmarks/bench_kdf.py for the cost of each setting.
 
     It is recommended to customize the database name when creating an
     instance of the UserDatabase class to avoid potential conflicts
@@ -47,9 +53,50 @@ Note:
 
 import sqlite3
 import os
-from hashlib import pbkdf2_hmac
+import hmac
+import threading
+from hashlib import pbkdf2_hmac, scrypt
 from secrets import token_bytes
 
+# Parameters of each supported key derivation function. Users created
+# before parameters were stored use the first entry.
+DEFAULT_HASH_PARAMS = {
+    'pbkdf2_sha256': {'iterations': 100000},
+    'scrypt': {'n': 2 ** 14, 'r': 8, 'p': 1},
+}
+DEFAULT_ALGORITHM = 'pbkdf2_sha256'
+DEFAULT_KEY_LENGTH = 16  # 128 bits
+
+
+def encode_params(params):
+    """Encode KDF parameters for storage, e.g. 'n=16384,p=1,r=8'."""
+    return ','.join('%s=%d' % item for item in sorted(params.items()))
+
+
+def decode_params(text):
+    """Decode KDF parameters stored by encode_params."""
+    return {name: int(value) for name, value in
+            (item.split('=') for item in text.split(',') if item)}
+
+
+def derive_key(algorithm, password, salt, params, key_length):
+    """
+    Derive a password hash with one of the supported algorithms.
+
+    Raises:
+    - ValueError: If the algorithm is not supported.
+    """
+    password = password.encode('utf-8')
+    if algorithm == 'pbkdf2_sha256':
+        return pbkdf2_hmac('sha256', password, salt, params['iterations'],
+                           key_length)
+    if algorithm == 'scrypt':
+        # scrypt needs 128 * r * n bytes; allow that plus some headroom
+        maxmem = 129 * params['r'] * params['n'] + 2 ** 20
+        return scrypt(password, salt=salt, n=params['n'], r=params['r'],
+                      p=params['p'], dklen=key_length, maxmem=maxmem)
+    raise ValueError('Unsupported password hash algorithm: %s' % algorithm)
+
 
 class UserDatabase:
     """
@@ -88,10 +135,12 @@ class UserDatabase:
         user_db.close_connection()
 
     Methods:
-        __init__(self, db_name='user_database.db'):
+        __init__(self, db_name='user_database.db', algorithm='pbkdf2_sha256',
+                 params=None, key_length=16):
             Initializes the UserDatabase object and establishes a connection
             to the SQLite database. If the database does not exist, it creates
-            the necessary table.
+            the necessary table. algorithm ('pbkdf2_sha256' or 'scrypt'),
+            params and key_length set how new and upgraded hashes are made.
 
         create_table(self):
             Creates the 'Users' table if it does not exist. The table schema
@@ -102,11 +151,17 @@ class UserDatabase:
             securely hashed password. Raises a ValueError if the username
             already exists.
 
-        _hash_password(self, password, salt):
-            Hashes the provided password using PBKDF2-HMAC-SHA256 with the
-            given salt. This private method is used internally for securely
+        _hash_password(self, password, salt, algorithm=None, params=None,
+                       key_length=None):
+            Hashes the provided password with the given salt, using the
+            given algorithm and parameters or, by default, the current
+            ones. This private method is used internally for securely
             storing passwords.
 
+        _rehash(self, username, password):
+            Replaces a user's stored hash with one made with the current
+            algorithm and parameters.
+
         verify_user(self, username, password):
             Verifies the provided username and password combination against
             the stored credentials. Raises a ValueError if the username or
@@ -120,17 +175,31 @@ class UserDatabase:
             Closes the SQLite database connection.
 
     Note:
-        The passwords are securely hashed using PBKDF2-HMAC-SHA256 with a
-        randomly generated salt for each user. This enhances the security
-        of stored passwords by preventing common attacks like rainbow
-        table attacks.
+        The passwords are securely hashed using PBKDF2-HMAC-SHA256 (or,
+        optionally, the memory-hard scrypt KDF) with a randomly generated
+        salt for each user. This enhances the security of stored passwords
+        by preventing common attacks like rainbow table attacks.
+
+        The algorithm, its parameters and the key length are stored with
+        every user. Users hashed with other settings than the instance's
+        keep logging in with their stored ones, and their hash is upgraded
+        to the instance's settings on their next successful login.
 
         It is recommended to customize the database name when creating an
         instance of the UserDatabase class to avoid potential conflicts
         with other databases in the same directory.
     """
 
-    def __init__(self, db_name='user_database.db'):
+    def __init__(self, db_name='user_database.db', algorithm=DEFAULT_ALGORITHM,
+                 params=None, key_length=DEFAULT_KEY_LENGTH):
+        if algorithm not in DEFAULT_HASH_PARAMS:
+            raise ValueError('Unsupported password hash algorithm: %s'
+                             % algorithm)
+        # Hash parameters for new users and for upgrading old hashes
+        self.algorithm = algorithm
+        self.params = dict(DEFAULT_HASH_PARAMS[algorithm], **(params or {}))
+        self.key_length = key_length
+
         # Get the directory of the current script
         script_dir = os.path.dirname(os.path.abspath(__file__))
 
@@ -140,8 +209,11 @@ class UserDatabase:
 
         # Get the absolute path of the constructed db_path
         abs_db_path = os.path.abspath(db_path)
-        self.connection = sqlite3.connect(abs_db_path)
+        # The login dialog verifies passwords on a worker thread, so the
+        # connection is shared between threads and guarded by a lock
+        self.connection = sqlite3.connect(abs_db_path, check_same_thread=False)
         self.cursor = self.connection.cursor()
+        self.lock = threading.RLock()
         self.create_table()
 
     def create_table(self):
@@ -149,7 +221,8 @@ class UserDatabase:
     create_table method
 
     Creates the 'Users' table in the SQLite database if it does not already exist.
-    The table schema includes fields for the username, salt, and hashed password.
+    The table schema includes fields for the username, salt, hashed password,
+    and the algorithm, parameters and key length the hash was made with.
 
     Parameters:
         self: UserDatabase
@@ -161,16 +234,31 @@ class UserDatabase:
     Note:
         This method is called during the initialization of the UserDatabase
         object to ensure that the required 'Users' table is present in the
-        database. If the table already exists, no action is taken.
+        database. If the table already exists, columns missing from a
+        database created by an older version are added, with the defaults
+        the old hashes were made with.
     """
 
         self.cursor.execute('''
             CREATE TABLE IF NOT EXISTS Users (
                 Username varchar(255) PRIMARY KEY,
                 Salt BINARY(16),
-                Hash BINARY(16)
+                Hash BINARY(16),
+                Algorithm varchar(32),
+                Params varchar(255),
+                KeyLength INTEGER
             )
         ''')
+        self.cursor.execute('PRAGMA table_info(Users)')
+        columns = [row[1] for row in self.cursor.fetchall()]
+        legacy = {'Algorithm': "varchar(32) DEFAULT '%s'" % DEFAULT_ALGORITHM,
+                  'Params': "varchar(255) DEFAULT '%s'"
+                            % encode_params(DEFAULT_HASH_PARAMS[DEFAULT_ALGORITHM]),
+                  'KeyLength': 'INTEGER DEFAULT %d' % DEFAULT_KEY_LENGTH}
+        for column, definition in legacy.items():
+            if column not in columns:
+                self.cursor.execute('ALTER TABLE Users ADD COLUMN %s %s'
+                                    % (column, definition))
         self.connection.commit()
 
     def add_user(self, username, password):
@@ -206,19 +294,37 @@ class UserDatabase:
 
         salt = token_bytes(16)
         hashed_password = self._hash_password(password, salt)
-        self.cursor.execute('INSERT INTO Users (Username, Salt, Hash) \
-                            VALUES (?, ?, ?)',
-                            (username, salt, hashed_password))
-        self.connection.commit()
-
-    def _hash_password(self, password, salt):
-        iterations = 100000
-        key_length = 16  # 128 bits
-        hash_function = 'sha256'
-        hashed_password = pbkdf2_hmac(hash_function,
-                                      password.encode('utf-8'),
-                                      salt, iterations, key_length)
-        return hashed_password
+        with self.lock:
+            if self._user_exists(username):
+                raise ValueError('Username already in use. \
+                                 Choose a different username.')
+            self.cursor.execute('INSERT INTO Users (Username, Salt, Hash, \
+                                Algorithm, Params, KeyLength) \
+                                VALUES (?, ?, ?, ?, ?, ?)',
+                                (username, salt, hashed_password,
+                                 self.algorithm, encode_params(self.params),
+                                 self.key_length))
+            self.connection.commit()
+
+    def _hash_password(self, password, salt, algorithm=None, params=None,
+                       key_length=None):
+        # Without explicit parameters, hash with the current ones
+        if algorithm is None:
+            algorithm, params, key_length = \
+                self.algorithm, self.params, self.key_length
+        return derive_key(algorithm, password, salt, params, key_length)
+
+    def _rehash(self, username, password):
+        # Replace an outdated hash with one made with the current parameters
+        salt = token_bytes(16)
+        hashed_password = self._hash_password(password, salt)
+        with self.lock:
+            self.cursor.execute('UPDATE Users SET Salt=?, Hash=?, Algorithm=?, \
+                                Params=?, KeyLength=? WHERE Username=?',
+                                (salt, hashed_password, self.algorithm,
+                                 encode_params(self.params), self.key_length,
+                                 username))
+            self.connection.commit()
 
     def verify_user(self, username, password):
         """
@@ -244,22 +350,30 @@ class UserDatabase:
     Note:
         The method retrieves user data from the 'Users' table based on the
         provided username. It then hashes the provided password using the
-        stored salt and compares it with the stored hash. If the provided
-        password is correct, the method returns True; otherwise, it raises
+        stored salt, algorithm, parameters and key length and compares it
+        with the stored hash. If the provided password is correct, the
+        method returns True, after upgrading the stored hash if it was made
+        with parameters other than the current ones; otherwise, it raises
         a ValueError with an appropriate error message.
     """
 
-        self.cursor.execute('SELECT * FROM Users WHERE Username=?',
-                            (username,))
-        user_data = self.cursor.fetchone()
+        with self.lock:
+            self.cursor.execute('SELECT Salt, Hash, Algorithm, Params, \
+                                KeyLength FROM Users WHERE Username=?',
+                                (username,))
+            user_data = self.cursor.fetchone()
 
         if user_data:
-            stored_salt = user_data[1]
-            stored_hash = user_data[2]
-            hashed_password = self._hash_password(password, stored_salt)
+            stored_salt, stored_hash, algorithm, params, key_length = user_data
+            params = decode_params(params)
+            hashed_password = self._hash_password(password, stored_salt,
+                                                  algorithm, params, key_length)
 
             # Check if the provided password is correct
-            if hashed_password == stored_hash:
+            if hmac.compare_digest(hashed_password, stored_hash):
+                if (algorithm, params, key_length) != \
+                        (self.algorithm, self.params, self.key_length):
+                    self._rehash(username, password)
                 return True
             else:
                 raise ValueError('Wrong password. Please try again.')
@@ -267,9 +381,10 @@ class UserDatabase:
             raise ValueError('User does not exist. Please check the username.')
 
     def _user_exists(self, username):
-        self.cursor.execute('SELECT * FROM Users WHERE Username=?',
-                            (username,))
-        return self.cursor.fetchone() is not None
+        with self.lock:
+            self.cursor.execute('SELECT * FROM Users WHERE Username=?',
+                                (username,))
+            return self.cursor.fetchone() is not None
 
     def close_connection(self):
         """
@@ -2,5 +2,8 @@ CREATE TABLE Users (
     Username varchar(255),
     Salt BINARY(16),
     Hash BINARY(16),
+    Algorithm varchar(32),
+    Params varchar(255),
+    KeyLength INTEGER,
     PRIMARY KEY (Username)
 );
\ No newline at end of file